@@ -0,0 +1,70 @@
+"""Time-bucket aggregation shared by the chart scripts.
+
+    from aggregate import aggregate_bookings
+    monthly = aggregate_bookings(load_bookings(), 'month')
+
+Groups rows by an integer period code computed straight from the dates, so no
+per-row string formatting is needed and periods sort chronologically. Means of
+the bookings and of both prediction-interval bounds come out of one groupby.
+"""
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = ('day', 'week', 'month', 'quarter', 'year')
+
+def period_codes(dates, freq):
+    # Integer code per row; consecutive periods have consecutive codes
+    if freq == 'year':
+        return dates.dt.year.to_numpy()
+    if freq == 'quarter':
+        return dates.dt.year.to_numpy() * 4 + (dates.dt.month.to_numpy() - 1) // 3
+    if freq == 'month':
+        return dates.dt.year.to_numpy() * 12 + dates.dt.month.to_numpy() - 1
+    days = dates.to_numpy().astype('datetime64[D]').astype('int64')
+    if freq == 'week':
+        # 1970-01-01 was a Thursday; shifting by 3 days starts each week on Monday
+        return (days + 3) // 7
+    if freq == 'day':
+        return days
+    raise ValueError(f"Unknown frequency {freq!r}, expected one of {', '.join(FREQUENCIES)}")
+
+def period_starts(codes, freq):
+    # First day of each coded period
+    codes = np.asarray(codes, dtype='int64')
+    if freq in ('year', 'quarter', 'month'):
+        months = {'year': codes * 12, 'quarter': codes // 4 * 12 + codes % 4 * 3, 'month': codes}[freq]
+        starts = np.datetime64('1970-01', 'M') + (months - 1970 * 12).astype('timedelta64[M]')
+    elif freq == 'week':
+        starts = np.datetime64('1970-01-01', 'D') + (codes * 7 - 3).astype('timedelta64[D]')
+    else:
+        starts = np.datetime64('1970-01-01', 'D') + codes.astype('timedelta64[D]')
+    return pd.DatetimeIndex(starts.astype('datetime64[ns]'))
+
+def period_labels(starts, freq):
+    # Axis labels, formatted once per period rather than once per row
+    if freq == 'year':
+        return starts.strftime('%Y')
+    if freq == 'quarter':
+        return starts.year.astype(str) + 'Q' + starts.quarter.astype(str)
+    if freq == 'month':
+        return starts.strftime('%m %Y')
+    return starts.strftime('%Y-%m-%d')
+
+def aggregate_bookings(df, freq, value_column='Bookings Unified'):
+    # One row per (period, source) with average bookings and average interval bounds
+    columns = [value_column, 'Lower Bound', 'Upper Bound']
+    grouped = (
+        df[columns]
+        .groupby([period_codes(df['Date'], freq), df['Source']], observed=True, sort=True)
+        .mean()
+    )
+    codes = grouped.index.get_level_values(0)
+    starts = period_starts(codes, freq)
+    return pd.DataFrame({
+        'Period': starts,
+        'Label': period_labels(starts, freq),
+        'Source': grouped.index.get_level_values(1),
+        'Average Bookings': grouped[value_column].to_numpy(),
+        'Lower Bound': grouped['Lower Bound'].to_numpy(),
+        'Upper Bound': grouped['Upper Bound'].to_numpy(),
+    })
@@ -0,0 +1,44 @@
+"""Compare chart4 render time and output size with and without decimation.
+
+    python bench_decimate.py --points 1000 10000 100000 1000000 --width 1400
+
+Builds a synthetic daily-style series of each size (80% historic, 20% forecast
+with a prediction interval), draws it through chart4.draw() with no
+decimation, LTTB and min/max, and saves it to PNG and SVG in memory. Prints
+draw+save time and output bytes for each combination.
+"""
+import argparse
+import io
+import time
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import chart4
+from loader import prepare
+from synthetic import synthetic_sheets
+
+def measure(df, image_format, width, method):
+    started = time.perf_counter()
+    fig = chart4.draw(df, width=width, method=method)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format)
+    plt.close(fig)
+    return time.perf_counter() - started, buffer.tell()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--width', type=int, default=1400, help='target points per line when decimating')
+    parser.add_argument('--formats', nargs='+', choices=['png', 'svg'], default=['png', 'svg'])
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'format':>6} {'method':>7} {'seconds':>8} {'bytes':>11}")
+    for points in args.points:
+        df = prepare(*synthetic_sheets(points))
+        for image_format in args.formats:
+            for method in (None, 'lttb', 'minmax'):
+                seconds, size = measure(df, image_format, args.width if method else None, method or 'lttb')
+                print(f"{points:>9} {image_format:>6} {method or 'none':>7} {seconds:>8.2f} {size:>11,}")
+
+if __name__ == '__main__':
+    main()
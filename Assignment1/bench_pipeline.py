@@ -0,0 +1,141 @@
+"""Time and peak memory of each chart pipeline stage at synthetic scale.
+
+    python bench_pipeline.py --rows 10000 100000 1000000 --output results.json
+    python bench_pipeline.py --rows 10000000 --stages combine derive aggregate
+
+Generates synthetic bookings/predictions sheets (see synthetic.py) of each
+size and measures every stage on its own: Excel and Parquet loads, combining
+the sheets, deriving calendar columns, period aggregation at each frequency,
+building and appending to the incremental aggregate store, and drawing and
+saving each chart. Time is the best of --repeat runs; peak memory comes from
+a separate run under tracemalloc so tracing does not skew the timings.
+
+Writes JSON (to stdout, or --output) for comparing runs, and a table to stderr.
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+from aggregate import FREQUENCIES, aggregate_bookings
+from incremental import AggregateStore
+from loader import combine, derive_columns
+from render import CHARTS
+from synthetic import synthetic_sheets
+
+STAGES = ['load_excel', 'load_parquet', 'combine', 'derive', 'aggregate', 'store_build', 'store_append', 'render']
+
+def measure(run, setup=lambda: None, repeat=1, memory=True):
+    # Best wall time over `repeat` runs, then one traced run for peak bytes
+    best = float('inf')
+    for _ in range(repeat):
+        argument = setup()
+        started = time.perf_counter()
+        run(argument)
+        best = min(best, time.perf_counter() - started)
+    peak = None
+    if memory:
+        argument = setup()
+        tracemalloc.start()
+        try:
+            run(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+def render_chart(chart, df, width):
+    draw = importlib.import_module(chart).draw
+    fig = draw(df, width=width) if chart == 'chart4' else draw(df)
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+def bench(rows, stages, args, workdir):
+    # Yields (stage, seconds, peak bytes) for one data size
+    bookings, predictions = synthetic_sheets(rows)
+    combined = combine(bookings, predictions)
+    df = derive_columns(combined.copy())
+
+    def timed(run, setup=lambda: None):
+        return measure(run, setup, args.repeat, not args.no_memory)
+
+    if 'load_excel' in stages and rows <= args.excel_max_rows:
+        path = os.path.join(workdir, f'bookings-{rows}.xlsx')
+        with pd.ExcelWriter(path) as writer:
+            bookings.to_excel(writer, sheet_name='bookings', index=False)
+            predictions.to_excel(writer, sheet_name='predictions', index=False)
+        yield 'load_excel', *timed(lambda _: pd.read_excel(path, sheet_name=['bookings', 'predictions']))
+    if 'load_parquet' in stages:
+        path = os.path.join(workdir, f'bookings-{rows}.parquet')
+        df.to_parquet(path, index=False)
+        yield 'load_parquet', *timed(lambda _: pd.read_parquet(path))
+    if 'combine' in stages:
+        yield 'combine', *timed(lambda _: combine(bookings, predictions))
+    if 'derive' in stages:
+        yield 'derive', *timed(derive_columns, combined.copy)
+    if 'aggregate' in stages:
+        for freq in FREQUENCIES:
+            yield f'aggregate:{freq}', *timed(lambda _: aggregate_bookings(df, freq))
+    if 'store_build' in stages:
+        yield 'store_build', *timed(lambda _: AggregateStore(workdir).update(df))
+    if 'store_append' in stages:
+        # Fold the newest 1% of rows into a store that already holds the rest
+        cutoff = df['Date'].quantile(0.99)
+        history = df[df['Date'] <= cutoff]
+
+        def seeded_store():
+            store = AggregateStore(workdir)
+            store.update(history)
+            return store
+        yield 'store_append', *timed(lambda store: store.update(df), seeded_store)
+    if 'render' in stages:
+        for chart in args.charts:
+            yield f'render:{chart}', *timed(lambda _: render_chart(chart, df, args.width))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10 ** 4, 10 ** 5, 10 ** 6])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--charts', nargs='+', choices=CHARTS, default=CHARTS)
+    parser.add_argument('--width', type=int, default=1400, help='decimation width for chart4 when rendering')
+    parser.add_argument('--excel-max-rows', type=int, default=10 ** 5,
+                        help='skip load_excel above this size (writing large workbooks is slow)')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run for peak memory')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>10} {'stage':<20} {'seconds':>9} {'peak MB':>9}", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            for stage, seconds, peak in bench(rows, args.stages, args, workdir):
+                results.append({'rows': rows, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak})
+                peak_mb = f'{peak / 2 ** 20:9.1f}' if peak is not None else f"{'-':>9}"
+                print(f"{rows:>10} {stage:<20} {seconds:>9.4f} {peak_mb}", file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == '__main__':
+    main()
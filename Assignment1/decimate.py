@@ -0,0 +1,83 @@
+"""Visual decimation for long time series before plotting.
+
+    keep = lttb_indices(dates, values, 1400)
+    plt.plot(dates[keep], values[keep])
+
+A line drawn into a few hundred pixels cannot show more than a few points per
+pixel column, so these pick a small subset of points that looks the same:
+Largest-Triangle-Three-Buckets keeps the overall shape, min/max keeps every
+spike, and envelope() reduces a prediction-interval band to its per-bucket
+outer bounds.
+"""
+import numpy as np
+
+def _as_float(values):
+    # Datetimes become int64 nanoseconds so they can take part in the area sums
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ns]').astype('int64')
+    return values.astype('float64')
+
+def lttb_indices(x, y, n_out):
+    # Indices of n_out points chosen by Largest-Triangle-Three-Buckets; x must be sorted
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_float(x), _as_float(y)
+    # First and last points are always kept; the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    indices = np.empty(n_out, dtype='int64')
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay))
+        selected = start + int(areas.argmax())
+        indices[bucket + 1] = selected
+    return indices
+
+def _bucket_starts(n, n_buckets):
+    # Start offset of each of n_buckets contiguous, near-equal buckets
+    return np.unique(np.linspace(0, n, n_buckets + 1).astype('int64')[:-1])
+
+def minmax_indices(x, y, n_buckets):
+    # Indices of the lowest and highest point in each bucket, in x order
+    n = len(x)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    y = _as_float(y)
+    starts = _bucket_starts(n, n_buckets)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    # Sorting by (bucket, y) puts each bucket's minimum first and maximum last
+    order = np.lexsort((y, bucket))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+def envelope(x, lower, upper, n_buckets):
+    # Outer bounds of a band per bucket, as (x, lower, upper) with a step at each bucket edge
+    n = len(x)
+    if 2 * n_buckets >= n:
+        return np.asarray(x), np.asarray(lower), np.asarray(upper)
+    starts = _bucket_starts(n, n_buckets)
+    ends = np.append(starts[1:], n) - 1
+    lows = np.minimum.reduceat(np.asarray(lower, dtype='float64'), starts)
+    highs = np.maximum.reduceat(np.asarray(upper, dtype='float64'), starts)
+    x = np.asarray(x)
+    return (
+        np.column_stack([x[starts], x[ends]]).ravel(),
+        np.repeat(lows, 2),
+        np.repeat(highs, 2),
+    )
+
+def decimate(x, y, n_out, method='lttb'):
+    # Reduce a line to about n_out points with the chosen method
+    if method == 'lttb':
+        return lttb_indices(x, y, n_out)
+    if method == 'minmax':
+        return minmax_indices(x, y, max(n_out // 2, 1))
+    raise ValueError(f"Unknown decimation method {method!r}, expected 'lttb' or 'minmax'")
@@ -0,0 +1,148 @@
+"""Incrementally maintained period aggregates for the charts.
+
+    python incremental.py                   # fold new rows of airbnb.xlsx into the store
+    python incremental.py --verify          # also compare against a full recompute
+    python incremental.py --reset --verify  # rebuild the store from scratch
+
+Keeps running sums and counts of Bookings, Bookings Forecast, Lower Bound and
+Upper Bound per (frequency, period, source), plus a per-source watermark of the
+newest date already folded in. update() only aggregates rows past the
+watermark, so a daily refresh costs the new rows rather than the whole history.
+aggregate() returns the same frame as aggregate.aggregate_bookings(). Rows at
+or before a watermark are assumed unchanged, so run with --reset after a
+forecast is revised in place.
+"""
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from aggregate import FREQUENCIES, aggregate_bookings, period_codes, period_labels, period_starts
+from loader import CACHE_DIR, CACHE_FORMAT, WORKBOOK, load_bookings
+
+VALUE_COLUMNS = ['Bookings', 'Bookings Forecast', 'Lower Bound', 'Upper Bound']
+KEY_COLUMNS = ['Frequency', 'Code', 'Source']
+
+class AggregateStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.table_path = os.path.join(directory, f'aggregates.{CACHE_FORMAT}')
+        self.table = pd.DataFrame(
+            columns=KEY_COLUMNS + [f'{kind} {column}' for column in VALUE_COLUMNS for kind in ('Sum', 'Count')]
+        ).set_index(KEY_COLUMNS)
+        self.watermarks = {}
+
+    @classmethod
+    def for_workbook(cls, workbook=WORKBOOK, cache_dir=CACHE_DIR):
+        # One store per workbook, next to the loader's frame cache
+        name = os.path.splitext(os.path.basename(workbook))[0]
+        return cls(os.path.join(cache_dir, f'aggregates-{name}')).load()
+
+    def load(self):
+        if os.path.exists(self.table_path):
+            read = pd.read_parquet if CACHE_FORMAT == 'parquet' else pd.read_pickle
+            self.table = read(self.table_path)
+            self.watermarks = {
+                source: pd.Timestamp(value) for source, value in self.table.attrs.pop('watermarks', {}).items()
+            }
+        return self
+
+    def save(self):
+        # Watermarks travel in the table's metadata so sums and watermark are replaced together
+        os.makedirs(self.directory, exist_ok=True)
+        table = self.table.copy()
+        table.attrs['watermarks'] = {source: value.isoformat() for source, value in self.watermarks.items()}
+        partial_path = f'{self.table_path}.{os.getpid()}.tmp'
+        if CACHE_FORMAT == 'parquet':
+            table.to_parquet(partial_path)
+        else:
+            table.to_pickle(partial_path)
+        os.replace(partial_path, self.table_path)
+
+    def new_rows(self, df):
+        # Rows dated after their source's watermark
+        mask = np.ones(len(df), dtype=bool)
+        for source, watermark in self.watermarks.items():
+            mask &= ~((df['Source'] == source).to_numpy() & (df['Date'] <= watermark).to_numpy())
+        return df[mask]
+
+    def update(self, df):
+        # Fold rows past the watermark into the running sums; returns how many were new
+        new = self.new_rows(df)
+        if new.empty:
+            return 0
+        values = new[VALUE_COLUMNS]
+        partials = []
+        for freq in FREQUENCIES:
+            keys = [np.full(len(new), freq), period_codes(new['Date'], freq), new['Source'].astype(str).to_numpy()]
+            grouped = values.groupby(keys).agg(['sum', 'count'])
+            grouped.columns = [f"{'Sum' if kind == 'sum' else 'Count'} {column}" for column, kind in grouped.columns]
+            grouped.index.names = KEY_COLUMNS
+            partials.append(grouped)
+        combined = pd.concat([self.table, *partials]) if len(self.table) else pd.concat(partials)
+        self.table = combined.groupby(level=KEY_COLUMNS).sum()
+        for source, dates in new.groupby(new['Source'].astype(str))['Date']:
+            self.watermarks[source] = max(dates.max(), self.watermarks.get(source, dates.min()))
+        return len(new)
+
+    def aggregate(self, freq):
+        # Same shape as aggregate_bookings(df, freq) on every row folded in so far
+        table = self.table.xs(freq, level='Frequency').sort_index()
+        bookings = table['Sum Bookings'] + table['Sum Bookings Forecast']
+        bookings_count = table['Count Bookings'] + table['Count Bookings Forecast']
+        starts = period_starts(table.index.get_level_values('Code'), freq)
+        sources = pd.Categorical(table.index.get_level_values('Source'), categories=['Historic', 'Forecast'])
+        result = pd.DataFrame({
+            'Period': starts,
+            'Label': period_labels(starts, freq),
+            'Source': sources,
+            'Average Bookings': (bookings / bookings_count.where(bookings_count > 0)).to_numpy(),
+            'Lower Bound': (table['Sum Lower Bound'] / table['Count Lower Bound'].where(table['Count Lower Bound'] > 0)).to_numpy(),
+            'Upper Bound': (table['Sum Upper Bound'] / table['Count Upper Bound'].where(table['Count Upper Bound'] > 0)).to_numpy(),
+        })
+        return result.sort_values(['Period', 'Source']).reset_index(drop=True)
+
+def verify(store, df):
+    # Compare every frequency against a full recompute; returns the frequencies that differ
+    mismatched = []
+    for freq in FREQUENCIES:
+        expected = aggregate_bookings(df, freq)
+        actual = store.aggregate(freq)
+        same = (
+            len(expected) == len(actual)
+            and (expected['Period'].to_numpy() == actual['Period'].to_numpy()).all()
+            and (expected['Source'].astype(str).to_numpy() == actual['Source'].astype(str).to_numpy()).all()
+            and all(
+                np.allclose(expected[column], actual[column], equal_nan=True)
+                for column in ('Average Bookings', 'Lower Bound', 'Upper Bound')
+            )
+        )
+        if not same:
+            mismatched.append(freq)
+    return mismatched
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workbook', default=WORKBOOK)
+    parser.add_argument('--reset', action='store_true', help='discard the stored aggregates first')
+    parser.add_argument('--verify', action='store_true', help='check the store against a full recompute')
+    args = parser.parse_args()
+
+    df = load_bookings(args.workbook)
+    store = AggregateStore.for_workbook(args.workbook)
+    if args.reset:
+        store = AggregateStore(store.directory)
+    started = time.perf_counter()
+    applied = store.update(df)
+    store.save()
+    elapsed = time.perf_counter() - started
+    watermarks = ', '.join(f'{source} {value:%Y-%m-%d}' for source, value in sorted(store.watermarks.items()))
+    print(f"folded {applied} new rows in {elapsed * 1000:.1f} ms (watermarks: {watermarks})")
+    if args.verify:
+        mismatched = verify(store, df)
+        if mismatched:
+            raise SystemExit(f"store differs from full recompute for: {', '.join(mismatched)}")
+        print("OK: store matches full recompute")
+
+if __name__ == '__main__':
+    main()
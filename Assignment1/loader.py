@@ -0,0 +1,115 @@
+"""Shared data loading for the chart scripts.
+
+    from loader import load_bookings
+    df = load_bookings()
+
+Parses airbnb.xlsx once, derives the calendar columns, and caches the prepared
+frame as Parquet (or a pickle when pyarrow is not installed) under .cache/.
+The cache is keyed on a hash of the workbook contents, with the file's mtime
+and size remembered so warm runs skip both Excel and the hash.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'airbnb.xlsx')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+CACHE_VERSION = 1
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SOURCES = ['Historic', 'Forecast']
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'parquet'
+except ImportError:
+    CACHE_FORMAT = 'pickle'
+
+# Prepared frames already loaded in this process, by cache key
+_loaded = {}
+
+def combine(bookings, predictions):
+    # Stack the two sheets with a Source column
+    bookings = bookings[['Date', 'Bookings']].copy()
+    predictions = predictions[['Date', 'Bookings Forecast', 'Lower Bound', 'Upper Bound']].copy()
+    bookings['Source'] = pd.Categorical.from_codes(np.zeros(len(bookings), dtype='int8'), categories=SOURCES)
+    predictions['Source'] = pd.Categorical.from_codes(np.ones(len(predictions), dtype='int8'), categories=SOURCES)
+    df = pd.concat([bookings, predictions], ignore_index=True)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+def derive_columns(df):
+    # Typed calendar columns and the unified bookings series, added in place
+    dates = df['Date'].dt
+    df['Month'] = pd.Categorical.from_codes(dates.month - 1, categories=MONTHS, ordered=True)
+    df['Year'] = dates.year.astype('int16')
+    df['Week'] = dates.isocalendar().week.to_numpy().astype('int8')
+    df['Day'] = pd.Categorical.from_codes(dates.dayofweek, categories=DAYS, ordered=True)
+    df['Bookings Unified'] = df['Bookings'].fillna(df['Bookings Forecast'])
+    return df
+
+def prepare(bookings, predictions):
+    # Combine the two sheets into one frame with typed calendar columns
+    return derive_columns(combine(bookings, predictions))
+
+def read_workbook(path=WORKBOOK):
+    # One parse of the workbook for both sheets
+    sheets = pd.read_excel(path, sheet_name=['bookings', 'predictions'])
+    return prepare(sheets['bookings'], sheets['predictions'])
+
+def _content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as workbook:
+        for block in iter(lambda: workbook.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def cache_key(path=WORKBOOK, cache_dir=CACHE_DIR):
+    # Reuse the recorded hash while mtime and size are unchanged, rehash otherwise
+    stat = os.stat(path)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+    entry = manifest.get(os.path.abspath(path))
+    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry['hash']
+    content_hash = _content_hash(path)
+    manifest[os.path.abspath(path)] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': content_hash}
+    os.makedirs(cache_dir, exist_ok=True)
+    partial_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(partial_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(partial_path, manifest_path)
+    return content_hash
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, f'bookings-v{CACHE_VERSION}-{key}.{CACHE_FORMAT}')
+
+def load_bookings(path=WORKBOOK, cache_dir=CACHE_DIR, use_cache=True):
+    # Returns the shared prepared frame; callers filter or copy before modifying it
+    if not use_cache:
+        return read_workbook(path)
+    key = cache_key(path, cache_dir)
+    if key in _loaded:
+        return _loaded[key]
+    cache_path = _cache_path(key, cache_dir)
+    if os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path) if CACHE_FORMAT == 'parquet' else pd.read_pickle(cache_path)
+    else:
+        df = read_workbook(path)
+        # Write to a temporary name first so a concurrent reader never sees a partial file
+        partial_path = f'{cache_path}.{os.getpid()}.tmp'
+        if CACHE_FORMAT == 'parquet':
+            df.to_parquet(partial_path, index=False)
+        else:
+            df.to_pickle(partial_path)
+        os.replace(partial_path, cache_path)
+    _loaded[key] = df
+    return df
@@ -0,0 +1,97 @@
+"""Render the charts to image files without a display.
+
+    python render.py                                   # every chart, PNG, into output/<workbook>/
+    python render.py chart2 chart4 --format svg --workers 4
+    python render.py --workbook east.xlsx --workbook west.xlsx
+    python render.py chart4 --format svg --width 1400   # decimate the daily series
+    python render.py --incremental                      # period charts from the aggregate store
+
+Uses the non-interactive Agg backend and spreads (workbook, chart) jobs over a
+process pool. Each workbook's prepared frame is loaded once before the pool
+starts (see loader.py), so workers reuse it instead of re-reading the data.
+Prints the draw and save time of every chart.
+"""
+import argparse
+import importlib
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from incremental import AggregateStore
+from loader import WORKBOOK, load_bookings
+
+CHARTS = ['chart1', 'chart2', 'chart3', 'chart4', 'chart5']
+
+def render(job):
+    workbook, chart, output_dir, image_format, dpi, options = job
+    started = time.perf_counter()
+    df = load_bookings(workbook)
+    loaded = time.perf_counter()
+    draw = importlib.import_module(chart).draw
+    # Pass only the options this chart understands, e.g. decimation for the daily plot
+    accepted = inspect.signature(draw).parameters
+    fig = draw(df, **{name: value for name, value in options.items() if name in accepted})
+    drawn = time.perf_counter()
+    path = os.path.join(output_dir, f'{chart}.{image_format}')
+    fig.savefig(path, format=image_format, dpi=dpi)
+    plt.close(fig)
+    saved = time.perf_counter()
+    return workbook, chart, path, loaded - started, drawn - loaded, saved - drawn
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {value}')
+    return number
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('charts', nargs='*', metavar='chart',
+                        help=f"charts to render (default: all of {', '.join(CHARTS)})")
+    parser.add_argument('--workbook', action='append', help='workbook to chart, may be repeated (default: airbnb.xlsx)')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output'))
+    parser.add_argument('--format', choices=['png', 'svg'], default='png')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--width', type=int, help='decimate daily series to about this many points per line')
+    parser.add_argument('--method', choices=['lttb', 'minmax'], default='lttb', help='decimation method for --width')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fold new rows into the aggregate store and draw period charts from it')
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count() or 1, help='processes to render with; 1 renders inline')
+    args = parser.parse_args()
+
+    charts = args.charts or CHARTS
+    unknown = sorted(set(charts) - set(CHARTS))
+    if unknown:
+        parser.error(f"unknown chart {', '.join(unknown)}; choose from {', '.join(CHARTS)}")
+    workbooks = args.workbook or [WORKBOOK]
+    jobs = []
+    for workbook in workbooks:
+        # Warm the cache here so forked workers inherit the frame rather than loading it each
+        df = load_bookings(workbook)
+        output_dir = os.path.join(args.output, os.path.splitext(os.path.basename(workbook))[0])
+        os.makedirs(output_dir, exist_ok=True)
+        options = {'width': args.width, 'method': args.method}
+        if args.incremental:
+            store = AggregateStore.for_workbook(workbook)
+            store.update(df)
+            store.save()
+            options['store'] = store
+        jobs.extend((workbook, chart, output_dir, args.format, args.dpi, options) for chart in charts)
+
+    started = time.perf_counter()
+    if args.workers == 1:
+        results = [render(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs))) as pool:
+            results = list(pool.map(render, jobs))
+    for workbook, chart, path, load_time, draw_time, save_time in results:
+        print(f"{chart}  load {load_time * 1000:7.1f} ms  draw {draw_time * 1000:7.1f} ms  "
+              f"save {save_time * 1000:7.1f} ms  -> {path}")
+    elapsed = time.perf_counter() - started
+    print(f"{len(jobs)} charts in {elapsed:.2f}s ({len(jobs) / elapsed:.1f} charts/s)")
+
+if __name__ == '__main__':
+    main()
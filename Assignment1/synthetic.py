@@ -0,0 +1,25 @@
+"""Synthetic bookings and predictions sheets for benchmarks.
+
+Shaped like airbnb.xlsx: a bookings sheet (Date, Bookings) covering the first
+80% of the rows and a predictions sheet (Date, Bookings Forecast, Lower Bound,
+Upper Bound) covering the rest, one row per minute so any size fits in the
+datetime range.
+"""
+import numpy as np
+import pandas as pd
+
+def synthetic_sheets(rows, seed=0):
+    # Bookings and predictions sheets shaped like airbnb.xlsx, one row per minute
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-01', periods=rows, freq='min')
+    level = 300 + 80 * np.sin(np.arange(rows) / max(rows / 12, 1)) + rng.normal(0, 40, rows)
+    split = int(rows * 0.8)
+    bookings = pd.DataFrame({'Date': dates[:split], 'Bookings': level[:split].round()})
+    spread = rng.uniform(30, 60, rows - split)
+    predictions = pd.DataFrame({
+        'Date': dates[split:],
+        'Bookings Forecast': level[split:],
+        'Lower Bound': level[split:] - spread,
+        'Upper Bound': level[split:] + spread,
+    })
+    return bookings, predictions
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Material, Requirement, InstallationRequirement, Widget, Shipment,
-    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder
+    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder, DemandReport, Notification,
+    OrderProgress, Escalation, FeedRun, FeedRowState
 )
 
 # Register all MMS models
@@ -13,4 +14,10 @@ admin.site.register(Shipment)
 admin.site.register(Inspection)
 admin.site.register(MaintenanceRecord)
 admin.site.register(InventoryRecord)
-admin.site.register(CustomerOrder)
\ No newline at end of file
+admin.site.register(CustomerOrder)
+admin.site.register(DemandReport)
+admin.site.register(Notification)
+admin.site.register(OrderProgress)
+admin.site.register(Escalation)
+admin.site.register(FeedRun)
+admin.site.register(FeedRowState)
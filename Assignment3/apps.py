@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class AppsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps' 
\ No newline at end of file
+    name = 'apps'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,179 @@
+"""Compare primary key types for insert rate, join speed and index size on SQLite.
+
+    python bench_keys.py --materials 50000 --requirements 4
+    python bench_keys.py --modes uuid4 uuid7 --output keys.json
+
+Builds a material table and a requirement table that references it (indexed
+foreign key), shaped like Material and Requirement, once per key type:
+
+    uuid4    random UUID primary keys, stored as Django stores UUIDField on
+             SQLite (32-char hex); the current default
+    uuid7    time-ordered UUID primary keys (keys.uuid7, what
+             MMS_TIME_ORDERED_KEYS = True gives new rows); same column type
+    integer  INTEGER PRIMARY KEY surrogates, with the uuid4 kept as a unique
+             external id column; shown for comparison
+
+Rows are inserted in transactions of --batch rows, as bulk loads and busy API
+workers would. Then, per mode: a full join aggregating quantity per requirement
+status, and --lookups joins from one material's requirements back to it by
+public id. Reports rows/sec, join times, file size and the bytes used by each
+table and index (from dbstat, when SQLite was built with it).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+import django
+from django.conf import settings
+
+MODES = ['uuid4', 'uuid7', 'integer']
+STATUSES = ['Draft', 'Feedback', 'Ordered', 'Received']
+
+SCHEMA = {
+    'uuid4': [
+        "CREATE TABLE material (material_id char(32) PRIMARY KEY, type varchar(100) NOT NULL, quantity integer NOT NULL)",
+        "CREATE TABLE requirement (req_id char(32) PRIMARY KEY, material_id char(32) NOT NULL REFERENCES material (material_id), "
+        "quantity integer NOT NULL, status varchar(50) NOT NULL)",
+        "CREATE INDEX requirement_material_id ON requirement (material_id)",
+    ],
+    'integer': [
+        "CREATE TABLE material (id integer PRIMARY KEY, material_id char(32) NOT NULL UNIQUE, type varchar(100) NOT NULL, quantity integer NOT NULL)",
+        "CREATE TABLE requirement (id integer PRIMARY KEY, req_id char(32) NOT NULL UNIQUE, material integer NOT NULL REFERENCES material (id), "
+        "quantity integer NOT NULL, status varchar(50) NOT NULL)",
+        "CREATE INDEX requirement_material ON requirement (material)",
+    ],
+}
+SCHEMA['uuid7'] = SCHEMA['uuid4']
+
+FULL_JOIN = {
+    'uuid4': "SELECT r.status, SUM(m.quantity) FROM requirement r JOIN material m ON m.material_id = r.material_id GROUP BY r.status",
+    'integer': "SELECT r.status, SUM(m.quantity) FROM requirement r JOIN material m ON m.id = r.material GROUP BY r.status",
+}
+FULL_JOIN['uuid7'] = FULL_JOIN['uuid4']
+
+# What GET /api/requirements/?material=<uuid> with the material expanded runs
+LOOKUP_JOIN = {
+    'uuid4': "SELECT r.req_id, r.quantity, m.type FROM requirement r JOIN material m ON m.material_id = r.material_id WHERE m.material_id = %s",
+    'integer': "SELECT r.req_id, r.quantity, m.type FROM requirement r JOIN material m ON m.id = r.material WHERE m.material_id = %s",
+}
+LOOKUP_JOIN['uuid7'] = LOOKUP_JOIN['uuid4']
+
+def configure(directory):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    settings.configure(
+        DATABASES={
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+            **{mode: {'ENGINE': 'sqlite_tuned', 'NAME': os.path.join(directory, f'{mode}.db')} for mode in MODES},
+        },
+        USE_TZ=True,
+    )
+    django.setup()
+
+def key_factory(mode):
+    from keys import uuid7
+    return uuid7 if mode == 'uuid7' else uuid.uuid4
+
+def load(mode, materials, per_material, batch):
+    from django.db import connections, transaction
+    new_key = key_factory(mode)
+    connection = connections[mode]
+    with connection.cursor() as cursor:
+        for statement in SCHEMA[mode]:
+            cursor.execute(statement)
+    material_keys = []
+    started = time.perf_counter()
+    for offset in range(0, materials, batch):
+        rows = [(new_key().hex, 'steel', 100) for _ in range(min(batch, materials - offset))]
+        with transaction.atomic(using=mode), connection.cursor() as cursor:
+            cursor.executemany("INSERT INTO material (material_id, type, quantity) VALUES (%s, %s, %s)", rows)
+        material_keys += [row[0] for row in rows]
+    if mode == 'integer':
+        # Children reference the surrogate, looked up once like a bulk loader would
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT material_id, id FROM material")
+            parents = dict(cursor.fetchall())
+        parent_refs = [parents[key] for key in material_keys]
+        insert = "INSERT INTO requirement (req_id, material, quantity, status) VALUES (%s, %s, %s, %s)"
+    else:
+        parent_refs = material_keys
+        insert = "INSERT INTO requirement (req_id, material_id, quantity, status) VALUES (%s, %s, %s, %s)"
+    # Requirements arrive over time for random materials, not grouped by parent
+    total = materials * per_material
+    for offset in range(0, total, batch):
+        rows = [
+            (new_key().hex, random.choice(parent_refs), 1, random.choice(STATUSES))
+            for _ in range(min(batch, total - offset))
+        ]
+        with transaction.atomic(using=mode), connection.cursor() as cursor:
+            cursor.executemany(insert, rows)
+    elapsed = time.perf_counter() - started
+    return material_keys, materials + total, elapsed
+
+def sizes(mode):
+    from django.db import OperationalError, connections
+    with connections[mode].cursor() as cursor:
+        try:
+            cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+        except OperationalError:
+            return None
+        return {name: size for name, size in cursor.fetchall() if not name.startswith('sqlite_schema')}
+
+def run(mode, materials, per_material, batch, lookups):
+    from django.db import connections
+    material_keys, rows, load_seconds = load(mode, materials, per_material, batch)
+    connection = connections[mode]
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+        started = time.perf_counter()
+        cursor.execute(FULL_JOIN[mode])
+        cursor.fetchall()
+        full_join = time.perf_counter() - started
+        sample = random.sample(material_keys, min(lookups, len(material_keys)))
+        started = time.perf_counter()
+        for key in sample:
+            cursor.execute(LOOKUP_JOIN[mode], [key])
+            cursor.fetchall()
+        lookup = time.perf_counter() - started
+    connection.close()
+    return {
+        'mode': mode,
+        'rows': rows,
+        'rows_per_second': round(rows / load_seconds),
+        'full_join_ms': round(full_join * 1000, 1),
+        'lookup_join_us': round(lookup / len(sample) * 1e6, 1),
+        'file_bytes': os.path.getsize(settings.DATABASES[mode]['NAME']),
+        'object_bytes': sizes(mode),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--materials', type=int, default=50000)
+    parser.add_argument('--requirements', type=int, default=4, help='requirements per material')
+    parser.add_argument('--batch', type=int, default=500, help='rows per insert transaction')
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--output', help='also write the results as JSON here')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        configure(directory)
+        print(f"{'mode':<8} {'rows':>8} {'rows/s':>8} {'join ms':>8} {'lookup us':>10} {'file MB':>8}")
+        for mode in args.modes:
+            result = run(mode, args.materials, args.requirements, args.batch, args.lookups)
+            results.append(result)
+            print(f"{mode:<8} {result['rows']:>8} {result['rows_per_second']:>8} {result['full_join_ms']:>8} "
+                  f"{result['lookup_join_us']:>10} {result['file_bytes'] / 2 ** 20:>8.1f}")
+            for name, size in sorted((result['object_bytes'] or {}).items()):
+                print(f"    {name:<40} {size / 2 ** 20:>8.1f} MB")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'materials': args.materials, 'requirements_per_material': args.requirements, 'results': results},
+                      output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
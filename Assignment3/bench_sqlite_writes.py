@@ -0,0 +1,142 @@
+"""Measure SQLite write throughput at several client counts, default vs tuned backend vs write queue.
+
+    python bench_sqlite_writes.py --clients 1 8 32 --seconds 5
+    python bench_sqlite_writes.py --modes tuned queued --clients 32 --output writes.json
+
+Each client is a thread with its own database connection, like a threaded API
+worker. A write is one transaction shaped like POST /api/materials/issue/:
+read a stock row, decrement it and append a ledger row. Modes:
+
+    default  Django's sqlite3 backend (rollback journal, synchronous=FULL,
+             deferred transactions); "database is locked" errors are retried
+    tuned    apps.sqlite_tuned (WAL, synchronous=NORMAL, busy_timeout,
+             BEGIN IMMEDIATE)
+    queued   tuned, with every write submitted to write_queue.WriteQueue so
+             one thread runs them and commits each batch at once
+
+Every mode starts from a fresh database file. Prints writes/sec, lock errors
+and latency percentiles per (mode, clients); --output also writes JSON.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import django
+from django.conf import settings
+
+MODES = ['default', 'tuned', 'queued']
+STOCK_ROWS = 100
+
+def configure(directory):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    settings.configure(
+        DATABASES={
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'default.db')},
+            'tuned': {'ENGINE': 'sqlite_tuned', 'NAME': os.path.join(directory, 'tuned.db')},
+            'queued': {'ENGINE': 'sqlite_tuned', 'NAME': os.path.join(directory, 'queued.db')},
+        },
+        USE_TZ=True,
+    )
+    django.setup()
+
+def reset(alias):
+    from django.db import connections
+    with connections[alias].cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS ledger")
+        cursor.execute("DROP TABLE IF EXISTS stock")
+        cursor.execute("CREATE TABLE stock (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL)")
+        cursor.execute("CREATE TABLE ledger (id INTEGER PRIMARY KEY, stock_id INTEGER NOT NULL, quantity INTEGER NOT NULL, at REAL NOT NULL)")
+        cursor.executemany("INSERT INTO stock (id, quantity) VALUES (%s, %s)", [(n, 10 ** 9) for n in range(STOCK_ROWS)])
+
+def issue(alias, stock_id):
+    from django.db import connections
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT quantity FROM stock WHERE id = %s", [stock_id])
+        cursor.fetchone()
+        cursor.execute("UPDATE stock SET quantity = quantity - 1 WHERE id = %s", [stock_id])
+        cursor.execute("INSERT INTO ledger (stock_id, quantity, at) VALUES (%s, 1, %s)", [stock_id, time.time()])
+
+def client(mode, index, deadline, write_queue, stats):
+    from django.db import OperationalError, connections, transaction
+    writes = lock_errors = 0
+    latencies = []
+    try:
+        while time.perf_counter() < deadline:
+            stock_id = (index * 7919 + writes) % STOCK_ROWS
+            started = time.perf_counter()
+            while True:
+                try:
+                    if write_queue is not None:
+                        write_queue.submit(issue, mode, stock_id)
+                    else:
+                        with transaction.atomic(using=mode):
+                            issue(mode, stock_id)
+                    break
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    lock_errors += 1
+                    time.sleep(0.001)
+            latencies.append(time.perf_counter() - started)
+            writes += 1
+    finally:
+        connections[mode].close()
+    stats.append((writes, lock_errors, latencies))
+
+def run(mode, clients, seconds):
+    from write_queue import WriteQueue
+    reset(mode)
+    write_queue = WriteQueue(using=mode) if mode == 'queued' else None
+    stats = []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(mode, n, deadline, write_queue, stats)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    batches = None
+    if write_queue is not None:
+        write_queue.close()
+        batches = write_queue.batches
+    writes = sum(row[0] for row in stats)
+    latencies = sorted(latency for row in stats for latency in row[2])
+    return {
+        'mode': mode,
+        'clients': clients,
+        'writes': writes,
+        'writes_per_second': round(writes / elapsed, 1),
+        'lock_errors': sum(row[1] for row in stats),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        'p99_ms': round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 2) if latencies else None,
+        'commits': batches if batches is not None else writes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--seconds', type=float, default=5.0, help='run time per (mode, clients)')
+    parser.add_argument('--output', help='also write the results as JSON here')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        configure(directory)
+        print(f"{'mode':<8} {'clients':>7} {'writes/s':>9} {'commits':>8} {'locked':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in args.modes:
+            for clients in args.clients:
+                result = run(mode, clients, args.seconds)
+                results.append(result)
+                print(f"{mode:<8} {clients:>7} {result['writes_per_second']:>9} {result['commits']:>8} "
+                      f"{result['lock_errors']:>7} {result['p50_ms']:>8} {result['p99_ms']:>8}")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'seconds': args.seconds, 'results': results}, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
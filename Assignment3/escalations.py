@@ -0,0 +1,91 @@
+import datetime
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .keys import new_id
+from .models import Escalation, EscalationKind, MaterialStatus, RequirementStatus, ShipmentStatus, WidgetStatus
+from .outbox import enqueue_task
+
+# Statuses an entity must leave before its deadline; requirements.md sets the hours
+PENDING_STATUSES = {
+    EscalationKind.FEEDBACK: {RequirementStatus.DRAFT},
+    EscalationKind.MATERIAL_INSPECTION: {MaterialStatus.RECEIVED},
+    EscalationKind.WIDGET_INSPECTION: {WidgetStatus.FABRICATED},
+    EscalationKind.SHIPPING: {ShipmentStatus.PREPARED, ShipmentStatus.SHIPPED},
+}
+DEFAULT_DEADLINE_HOURS = {
+    EscalationKind.FEEDBACK: 24,
+    EscalationKind.MATERIAL_INSPECTION: 12,
+    EscalationKind.WIDGET_INSPECTION: 12,
+    EscalationKind.SHIPPING: 24,
+}
+FIRE_BATCH_SIZE = 500
+FIRE_LOCK_KEY = 'mms:escalations:fire-lock'
+FIRE_LOCK_TIMEOUT = 300
+
+def deadline(kind):
+    hours = getattr(settings, 'MMS_ESCALATION_DEADLINE_HOURS', {}).get(kind, DEFAULT_DEADLINE_HOURS[kind])
+    return datetime.timedelta(hours=hours)
+
+def schedule_escalations(kind, entity_ids, since=None):
+    # One upsert for any number of entities; re-entering a pending status restarts the clock
+    due_at = (since or timezone.now()) + deadline(kind)
+    Escalation.objects.bulk_create(
+        [Escalation(kind=kind, entity_id=entity_id, due_at=due_at) for entity_id in entity_ids],
+        update_conflicts=True, unique_fields=['kind', 'entity_id'], update_fields=['due_at', 'fired_at', 'claim_id'],
+    )
+
+def cancel_escalations(kind, entity_ids):
+    Escalation.objects.filter(kind=kind, entity_id__in=entity_ids).delete()
+
+def track_status(kind, entity_id, before_status, after_status, since=None):
+    # Schedule on entering a pending status, cancel on leaving it; other saves cost nothing
+    pending = PENDING_STATUSES[kind]
+    if after_status in pending and before_status not in pending:
+        schedule_escalations(kind, [entity_id], since)
+    elif before_status in pending and after_status not in pending:
+        cancel_escalations(kind, [entity_id])
+
+def schedule_created(kind, instances, pk_field):
+    # Deadlines for rows written with bulk_create, which sends no post_save
+    entity_ids = [getattr(instance, pk_field) for instance in instances if instance.status in PENDING_STATUSES[kind]]
+    if entity_ids:
+        schedule_escalations(kind, entity_ids)
+
+def fire_due_escalations(tasks, now=None, batch_size=FIRE_BATCH_SIZE, max_batches=None):
+    # Walks the partial due_at index from the oldest deadline, so each run reads only
+    # due rows. Each batch is claimed, marked fired and handed to the outbox in one
+    # transaction, one task call per kind; tasks maps each kind to its escalate_* task.
+    # The cache lock saves duplicate work within one cache; the claim is what keeps
+    # runs on separate workers from firing the same row twice.
+    if not cache.add(FIRE_LOCK_KEY, 1, timeout=FIRE_LOCK_TIMEOUT):
+        return {"fired": 0, "batches": 0, "skipped": True}
+    now = now or timezone.now()
+    fired = batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            ids = list(
+                Escalation.objects.filter(fired_at=None, due_at__lte=now)
+                .order_by('due_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            claim_id = new_id()
+            with transaction.atomic():
+                # Rows another run fired since the select no longer match fired_at=None
+                Escalation.objects.filter(pk__in=ids, fired_at=None).update(fired_at=now, claim_id=claim_id)
+                by_kind = defaultdict(list)
+                for kind, entity_id in Escalation.objects.filter(pk__in=ids, claim_id=claim_id).values_list('kind', 'entity_id'):
+                    by_kind[kind].append(str(entity_id))
+                for kind, entity_ids in by_kind.items():
+                    enqueue_task(tasks[kind], kind, entity_ids)
+            batches += 1
+            fired += sum(len(entity_ids) for entity_ids in by_kind.values())
+            if len(ids) < batch_size:
+                break
+    finally:
+        cache.delete(FIRE_LOCK_KEY)
+    return {"fired": fired, "batches": batches, "skipped": False}
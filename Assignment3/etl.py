@@ -0,0 +1,423 @@
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .escalations import schedule_created
+from .history import record_created
+from .inventory import apply_position_deltas, material_locations
+from .models import (
+    EscalationKind, FeedRowState, FeedRun, FeedRunStatus, InstallationRequirement, Material, MaterialStatus,
+    Requirement, TransitionEntity
+)
+from .outbox import enqueue_task
+from .reports import invalidate_all_demand, invalidate_demand_days
+from .serializers import BulkInstallationRequirementSerializer, BulkMaterialSerializer, BulkRequirementSerializer
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Scheduled loads from upstream systems of record. Feeds are configured in
+# settings and run by run_feed_task (see schedules.feed_schedule):
+#   MMS_ETL_FEEDS = {
+#       'engineering-requirements': {
+#           'source': {'type': 'csv', 'path': '/data/engineering/requirements.csv.gz'},
+#           'target': 'requirement',
+#           'columns': {'Line': 'external_id', 'Material': 'material_ref', 'Qty': 'quantity', 'Need By': 'delivery_date'},
+#           'every': 900,
+#       },
+#   }
+# A run streams records from the source through transform() and validates and
+# upserts them a chunk at a time, so memory stays flat however big the file is.
+# Every row carries the upstream system's own id as external_id; the primary key
+# is derived from it, so re-running a feed updates rows instead of duplicating
+# them. A row is only written when its upstream values differ from what the feed
+# loaded last time (FeedRowState), so MMS's own edits survive unchanged re-runs.
+# A row deleted in MMS comes back only once upstream changes it.
+# material_ref names a material by the external_id its material feed used.
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MAX_ERRORS = 100
+DEFAULT_LOCK_TIMEOUT = 6 * 60 * 60
+FEED_NAMESPACE = uuid.UUID('d9603ece-dddd-5447-b433-ed2e93dc84c4')
+
+def feed_key(target, external_id):
+    return uuid.uuid5(FEED_NAMESPACE, f"{target}:{external_id}")
+
+# Parsers turn a text stream into (line, record) pairs; a record that can't be
+# parsed is passed on as an exception and rejected on its own.
+
+def parse_csv(stream):
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+def parse_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, ValueError(f"NDJSON parse error - {exc}")
+            continue
+        yield number, record if isinstance(record, dict) else ValueError("Expected a JSON object")
+
+PARSERS = {'csv': parse_csv, 'ndjson': parse_ndjson}
+
+class FileSource:
+    # CSV or NDJSON file read a line at a time; .gz files are decompressed as they're read
+    def __init__(self, path, format, encoding='utf-8'):
+        self.path = path
+        self.parse = PARSERS[format]
+        self.encoding = encoding
+
+    def __iter__(self):
+        opener = gzip.open if str(self.path).endswith('.gz') else open
+        with opener(self.path, 'rt', encoding=self.encoding, newline='') as stream:
+            yield from self.parse(stream)
+
+class HTTPSource:
+    # CSV or NDJSON from an upstream export endpoint, parsed while it downloads
+    def __init__(self, url, format='ndjson', headers=None, timeout=30, encoding='utf-8'):
+        self.url = url
+        self.parse = PARSERS[format]
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.encoding = encoding
+
+    def __iter__(self):
+        request = urllib.request.Request(self.url, headers=self.headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            yield from self.parse(io.TextIOWrapper(response, encoding=self.encoding, newline=''))
+
+class ExcelSource:
+    # One worksheet of an .xlsx workbook with a header row; openpyxl's read-only
+    # mode streams the rows instead of loading the workbook
+    def __init__(self, path, sheet=None):
+        if openpyxl is None:
+            raise ImproperlyConfigured("Excel feeds need the openpyxl package")
+        self.path = path
+        self.sheet = sheet
+
+    def __iter__(self):
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            rows = (workbook[self.sheet] if self.sheet else workbook.worksheets[0]).iter_rows(values_only=True)
+            header = [str(name).strip() if name is not None else None for name in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                if any(value is not None for value in values):
+                    yield number, {name: _cell(value) for name, value in zip(header, values) if name}
+        finally:
+            workbook.close()
+
+def _cell(value):
+    # Excel has no date type; a date cell comes back as midnight on that day
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        return value.date()
+    return value
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@contextmanager
+def mock_http_feed(directory):
+    # Serves the files in directory on a free local port, standing in for an
+    # upstream export endpoint in development and tests; yields the base URL
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+SOURCE_TYPES = {
+    'csv': partial(FileSource, format='csv'),
+    'ndjson': partial(FileSource, format='ndjson'),
+    'excel': ExcelSource,
+    'http': HTTPSource,
+}
+
+def build_source(spec):
+    # spec: {'type': 'csv' | 'ndjson' | 'excel' | 'http' | dotted path to a source class, **options}
+    options = dict(spec)
+    kind = options.pop('type')
+    factory = SOURCE_TYPES.get(kind) or import_string(kind)
+    return factory(**options)
+
+def transform(records, columns=None, defaults=None):
+    # Renames source columns to field names (dropping the unmapped ones when a
+    # mapping is given), trims text and treats blank cells as missing
+    for line, record in records:
+        if isinstance(record, Exception):
+            yield line, record
+            continue
+        row = dict(defaults or {})
+        for name, value in record.items():
+            name = columns.get(name) if columns else name
+            if isinstance(value, str):
+                value = value.strip() or None
+            if name is not None and value is not None:
+                row[name] = value
+        yield line, row
+
+def chunked(records, size):
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+class Target:
+    # Where a feed's rows go: validated with the model's bulk serializer, then
+    # upserted on the primary key. Only update_fields come from upstream on a
+    # re-run; everything else (status, created_at) stays as MMS left it.
+    name = None
+    model = None
+    serializer_class = None
+    update_fields = ()
+
+    def prepare(self, row):
+        # Returns the primary key for the row; resolves material_ref in place
+        external_id = row.pop('external_id', None)
+        if external_id is None:
+            raise ValueError("external_id is required")
+        reference = row.pop('material_ref', None)
+        if reference is not None and 'material_id' not in row:
+            row['material_id'] = feed_key(MaterialTarget.name, reference)
+        return feed_key(self.name, external_id)
+
+    def kept_fields(self, stored):
+        # Upstream fields MMS owns from now on for this stored row
+        return ()
+
+    def after_write(self, created, changed):
+        # created: new instances; changed: (stored, incoming) pairs. bulk_create
+        # sends no post_save, so the signal-driven bookkeeping happens here.
+        pass
+
+class MaterialTarget(Target):
+    name = 'material'
+    model = Material
+    serializer_class = BulkMaterialSerializer
+    update_fields = ['type', 'quantity']
+
+    def kept_fields(self, stored):
+        # Once stock has been issued the quantity is MMS's count, not upstream's
+        return ('quantity',) if stored.status == MaterialStatus.ISSUED else ()
+
+    def after_write(self, created, changed):
+        deltas = defaultdict(lambda: [0, 0])
+        for instance in created:
+            deltas[(instance.type, instance.status, "")][0] += instance.quantity
+            deltas[(instance.type, instance.status, "")][1] += 1
+        locations = material_locations([stored.pk for stored, _ in changed]) if changed else {}
+        for stored, incoming in changed:
+            location = locations[stored.pk]
+            deltas[(stored.type, stored.status, location)][0] -= stored.quantity
+            deltas[(stored.type, stored.status, location)][1] -= 1
+            deltas[(incoming.type, incoming.status, location)][0] += incoming.quantity
+            deltas[(incoming.type, incoming.status, location)][1] += 1
+        apply_position_deltas(deltas)
+        # bulk_create skips material_pre_save, which drops demand buckets on a type change
+        if any(stored.type != incoming.type for stored, incoming in changed):
+            invalidate_all_demand()
+        record_created(TransitionEntity.MATERIAL, created, 'material_id')
+        schedule_created(EscalationKind.MATERIAL_INSPECTION, created, 'material_id')
+
+class RequirementTarget(Target):
+    name = 'requirement'
+    model = Requirement
+    serializer_class = BulkRequirementSerializer
+    update_fields = ['material_id', 'quantity', 'delivery_date']
+
+    def after_write(self, created, changed):
+        invalidate_demand_days(
+            {instance.delivery_date for instance in created}
+            | {pair.delivery_date for stored, incoming in changed for pair in (stored, incoming)}
+        )
+        schedule_created(EscalationKind.FEEDBACK, created, 'req_id')
+
+class InstallationRequirementTarget(Target):
+    name = 'installation_requirement'
+    model = InstallationRequirement
+    serializer_class = BulkInstallationRequirementSerializer
+    update_fields = ['material_id', 'quantity', 'fab_date']
+
+    def after_write(self, created, changed):
+        invalidate_demand_days(
+            {instance.fab_date for instance in created}
+            | {pair.fab_date for stored, incoming in changed for pair in (stored, incoming)}
+        )
+
+TARGETS = {target.name: target for target in (MaterialTarget(), RequirementTarget(), InstallationRequirementTarget())}
+
+def _rss_bytes():
+    # Private resident memory of this process: resident minus file-backed pages,
+    # which leaves out the database file SQLite maps in (mmap_size) as it grows.
+    # None where /proc isn't available.
+    try:
+        with open('/proc/self/statm') as statm:
+            resident, shared = (int(value) for value in statm.read().split()[1:3])
+    except (OSError, ValueError):
+        return None
+    return (resident - shared) * os.sysconf('SC_PAGE_SIZE')
+
+class _Run:
+    def __init__(self, record, max_errors):
+        self.record = record
+        self.max_errors = max_errors
+        self.start_rss = self.peak_rss = _rss_bytes()
+
+    def reject(self, line, errors):
+        self.record.rejected += 1
+        if len(self.record.errors) < self.max_errors:
+            self.record.errors.append({"line": line, "errors": errors})
+
+    def sample_memory(self):
+        rss = _rss_bytes()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss, rss)
+
+def _digest(instance, attnames):
+    values = json.dumps([str(getattr(instance, name)) for name in attnames])
+    return hashlib.sha1(values.encode()).hexdigest()
+
+def _load_chunk(target, chunk, run):
+    prepared = []
+    for line, row in chunk:
+        if isinstance(row, Exception):
+            run.reject(line, str(row))
+            continue
+        try:
+            prepared.append((line, target.prepare(row), row))
+        except ValueError as exc:
+            run.reject(line, str(exc))
+    serializer = target.serializer_class(data=[row for _, _, row in prepared], many=True)
+    serializer.is_valid()
+    for index, detail in sorted(serializer.row_errors.items()):
+        run.reject(prepared[index][0], detail)
+    model = target.model
+    pk = model._meta.pk
+    # A key repeated within a chunk: the last row wins
+    incoming = {}
+    for index, instance in zip(serializer.row_indexes, serializer.build_instances()):
+        setattr(instance, pk.attname, prepared[index][1])
+        incoming[instance.pk] = instance
+    update_attnames = [model._meta.get_field(name).attname for name in target.update_fields]
+    other_attnames = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname not in update_attnames and not field.primary_key
+    ]
+    digests = {key: _digest(instance, update_attnames) for key, instance in incoming.items()}
+    with transaction.atomic():
+        loaded = dict(
+            FeedRowState.objects.filter(target=target.name, object_id__in=list(incoming))
+            .values_list('object_id', 'digest')
+        )
+        # Same upstream values as last time: nothing to do, whatever MMS did to the row since
+        pending = {key: instance for key, instance in incoming.items() if loaded.get(key) != digests[key]}
+        run.record.unchanged += len(incoming) - len(pending)
+        stored = model.objects.in_bulk(list(pending))
+        created, changed = [], []
+        for key, instance in pending.items():
+            current = stored.get(key)
+            if current is None:
+                created.append(instance)
+                continue
+            for name in other_attnames + [model._meta.get_field(field).attname for field in target.kept_fields(current)]:
+                setattr(instance, name, getattr(current, name))
+            if any(getattr(current, name) != getattr(instance, name) for name in update_attnames):
+                changed.append((current, instance))
+            else:
+                run.record.unchanged += 1
+        if created or changed:
+            model.objects.bulk_create(
+                created + [instance for _, instance in changed],
+                update_conflicts=True, unique_fields=[pk.name], update_fields=target.update_fields,
+            )
+            target.after_write(created, changed)
+        if pending:
+            FeedRowState.objects.bulk_create(
+                [FeedRowState(target=target.name, object_id=key, digest=digests[key]) for key in pending],
+                update_conflicts=True, unique_fields=['target', 'object_id'], update_fields=['digest', 'updated_at'],
+            )
+        run.record.created += len(created)
+        run.record.updated += len(changed)
+        run.record.rows_read += len(chunk)
+        # Progress is committed with the rows, so a long run can be watched
+        run.record.save()
+
+def get_feeds():
+    return getattr(settings, 'MMS_ETL_FEEDS', {})
+
+def run_feed(name, notify_tasks=None):
+    # notify_tasks maps a target name to the notify_* task told about the run's changes
+    feed = get_feeds().get(name)
+    if feed is None:
+        raise ImproperlyConfigured(f"No feed named {name!r} in MMS_ETL_FEEDS")
+    target = TARGETS[feed['target']]
+    lock_key = f'mms:etl:{name}:lock'
+    if not cache.add(lock_key, 1, timeout=getattr(settings, 'MMS_ETL_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)):
+        return {"feed": name, "skipped": True}
+    try:
+        run = _Run(FeedRun.objects.create(feed=name), getattr(settings, 'MMS_ETL_MAX_ERRORS', DEFAULT_MAX_ERRORS))
+        started = time.perf_counter()
+        try:
+            records = transform(build_source(feed['source']), feed.get('columns'), feed.get('defaults'))
+            for chunk in chunked(records, feed.get('chunk_size', DEFAULT_CHUNK_SIZE)):
+                _load_chunk(target, chunk, run)
+                run.sample_memory()
+        except Exception as exc:
+            run.record.errors.append({"line": None, "errors": f"{type(exc).__name__}: {exc}"})
+            _finish(run, FeedRunStatus.FAILED, started)
+            raise
+        with transaction.atomic():
+            _finish(run, FeedRunStatus.SUCCEEDED, started)
+            record = run.record
+            if notify_tasks and (record.created or record.updated):
+                enqueue_task(
+                    notify_tasks[target.name],
+                    f"Feed {name}: {record.created} created, {record.updated} updated, {record.rejected} rejected.",
+                )
+    finally:
+        cache.delete(lock_key)
+    return {
+        "feed": name, "run_id": str(record.run_id), "rows_read": record.rows_read,
+        "created": record.created, "updated": record.updated, "unchanged": record.unchanged,
+        "rejected": record.rejected, "rows_per_second": record.rows_per_second,
+        "peak_memory_bytes": record.peak_memory_bytes, "memory_growth_bytes": record.memory_growth_bytes,
+        "skipped": False,
+    }
+
+def _finish(run, status, started):
+    record = run.record
+    elapsed = time.perf_counter() - started
+    record.status = status
+    record.finished_at = timezone.now()
+    record.rows_per_second = round(record.rows_read / elapsed, 1) if elapsed > 0 else None
+    if run.start_rss is not None:
+        record.peak_memory_bytes = run.peak_rss
+        record.memory_growth_bytes = run.peak_rss - run.start_rss
+    record.save()
@@ -0,0 +1,42 @@
+import datetime
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Day bounds on a datetime field: the date becomes midnight in the current time
+# zone, compared with a plain range so the column's index is used (a __date
+# lookup wraps the column in a function and forces a scan)
+DAY_BOUNDS = {'from_day': ('gte', 0), 'through_day': ('lt', 1)}
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    # Maps whitelisted query params onto ORM lookups declared by the view, e.g.
+    # filter_fields = {'status': 'status', 'delivery_after': 'delivery_date__gte',
+    #                  'created_after': 'created_at__from_day'}
+    def filter_queryset(self, request, queryset, view):
+        lookups = {}
+        for param, lookup in getattr(view, 'filter_fields', {}).items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            field, _, bound = lookup.rpartition('__')
+            try:
+                if bound in DAY_BOUNDS:
+                    operator, days = DAY_BOUNDS[bound]
+                    lookups[f'{field}__{operator}'] = self.day_start(value, days)
+                else:
+                    lookups[lookup] = self.parse_value(queryset.model, lookup, value)
+            except DjangoValidationError as exc:
+                raise ValidationError({param: exc.messages})
+        return queryset.filter(**lookups) if lookups else queryset
+
+    def day_start(self, value, days):
+        day = models.DateField().to_python(value) + datetime.timedelta(days=days)
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+    def parse_value(self, model, lookup, value):
+        parts = lookup.split('__')
+        if 'date' in parts[1:]:
+            return models.DateField().to_python(value)
+        return model._meta.get_field(parts[0]).to_python(value)
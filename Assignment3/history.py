@@ -0,0 +1,69 @@
+from django.db.models import Avg, Count, Max, Min
+from django.utils import timezone
+from .models import StatusTransition
+
+def _entered_at(entity_type, entity_id, default):
+    # When the entity entered its current status: its latest logged transition, else `default`
+    last = (
+        StatusTransition.objects.filter(entity_type=entity_type, entity_id=entity_id)
+        .order_by('-created_at')
+        .values_list('created_at', flat=True)
+        .first()
+    )
+    return last or default
+
+def record_transition(entity_type, entity_id, from_status, to_status, entered_at=None, at=None):
+    # Append one transition. entered_at is used as the start of from_status when nothing
+    # was logged for the entity yet (typically its created_at).
+    at = at or timezone.now()
+    dwell_seconds = None
+    if from_status:
+        since = _entered_at(entity_type, entity_id, entered_at)
+        if since is not None:
+            dwell_seconds = max(int((at - since).total_seconds()), 0)
+    return StatusTransition.objects.create(
+        entity_type=entity_type, entity_id=entity_id, from_status=from_status or "",
+        to_status=to_status, dwell_seconds=dwell_seconds, created_at=at,
+    )
+
+def record_created(entity_type, instances, pk_field):
+    # Initial status of rows written with bulk_create, which sends no post_save
+    StatusTransition.objects.bulk_create([
+        StatusTransition(
+            entity_type=entity_type, entity_id=getattr(instance, pk_field),
+            to_status=instance.status, created_at=instance.created_at or timezone.now(),
+        )
+        for instance in instances
+    ])
+
+def dwell_rows(entity_type, start, end, from_status=None, to_status=None):
+    # Per-status dwell aggregates over transitions out of that status between start and end
+    transitions = StatusTransition.objects.filter(
+        entity_type=entity_type, created_at__gte=start, created_at__lt=end, dwell_seconds__isnull=False,
+    )
+    if from_status:
+        transitions = transitions.filter(from_status=from_status)
+    if to_status:
+        transitions = transitions.filter(to_status=to_status)
+    return (
+        transitions.values('from_status')
+        .annotate(
+            transitions=Count('id'),
+            avg_seconds=Avg('dwell_seconds'),
+            min_seconds=Min('dwell_seconds'),
+            max_seconds=Max('dwell_seconds'),
+        )
+        .order_by('from_status')
+    )
+
+def dwell_stats(entity_type, start, end, from_status=None, to_status=None):
+    return [
+        {
+            "status": row['from_status'],
+            "transitions": row['transitions'],
+            "avg_hours": round(row['avg_seconds'] / 3600, 2),
+            "min_hours": round(row['min_seconds'] / 3600, 2),
+            "max_hours": round(row['max_seconds'] / 3600, 2),
+        }
+        for row in dwell_rows(entity_type, start, end, from_status, to_status)
+    ]
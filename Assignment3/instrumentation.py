@@ -0,0 +1,237 @@
+import contextvars
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Opt-in request instrumentation. Add 'apps.instrumentation.InstrumentationMiddleware'
+# to MIDDLEWARE and set MMS_INSTRUMENTATION = True; with the setting off the
+# middleware removes itself at startup and stage() returns after one lookup.
+# Metrics are kept in this process's memory and served by GET /api/metrics/, so
+# a scrape sees only the worker that answered it. Run the API as a single
+# process (one gunicorn worker, threads for concurrency) when scraping these,
+# or give each worker its own bind and scrape them separately. The endpoint
+# answers only MMS_METRICS_ALLOWED_IPS (loopback by default) and staff users.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+_current = contextvars.ContextVar('mms_request_metrics', default=None)
+
+def enabled():
+    return getattr(settings, 'MMS_INSTRUMENTATION', False)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class MetricsRegistry:
+    # Per-process totals keyed by (method, view name[, status]); view names keep
+    # label cardinality bounded by the URL conf, not by the ids in the path
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.stage_seconds = defaultdict(float)
+            self.stage_calls = defaultdict(int)
+            self.profiles = 0
+
+    def record(self, method, view, status, seconds, stages):
+        with self._lock:
+            self.durations[(method, view, str(status))].observe(seconds)
+            self.queries[(method, view)].observe(stages.get('db', (0.0, 0))[1])
+            for name, (stage_seconds, calls) in stages.items():
+                self.stage_seconds[(method, view, name)] += stage_seconds
+                self.stage_calls[(method, view, name)] += calls
+
+    def profile_written(self):
+        with self._lock:
+            self.profiles += 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+            _histogram(lines, 'mms_request_duration_seconds', 'Request latency by endpoint.',
+                       ('method', 'view', 'status'), self.durations)
+            _histogram(lines, 'mms_request_db_queries', 'SQL queries per request by endpoint.',
+                       ('method', 'view'), self.queries)
+            _counter(lines, 'mms_request_stage_seconds_total',
+                     'Time spent in db, serializer and enqueue stages; serializer time includes the queries it runs.',
+                     ('method', 'view', 'stage'), self.stage_seconds)
+            _counter(lines, 'mms_request_stage_calls_total', 'Calls per stage.',
+                     ('method', 'view', 'stage'), self.stage_calls)
+            _counter(lines, 'mms_profiles_total', 'Slow request profiles written.', (), {(): self.profiles})
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _histogram(lines, name, help_text, label_names, histograms):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(label_names, key, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {cumulative}')
+
+def _counter(lines, name, help_text, label_names, values):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+class RequestMetrics:
+    def __init__(self):
+        self.stages = {}
+        self.active = set()
+
+    def add(self, name, seconds):
+        total, calls = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (total + seconds, calls + 1)
+
+class stage:
+    # Times a block against the current request; a stage nested in itself counts once
+    __slots__ = ('name', 'metrics', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        if self.metrics is not None and self.name not in self.metrics.active:
+            self.metrics.active.add(self.name)
+            self.started = time.perf_counter()
+        else:
+            self.metrics = None
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.active.discard(self.name)
+            self.metrics.add(self.name, time.perf_counter() - self.started)
+
+class TimedSerializerMixin:
+    # Counts serializer validation and representation as the 'serializer' stage
+    def run_validation(self, data=None):
+        if _current.get() is None:
+            return super().run_validation(data)
+        with stage('serializer'):
+            return super().run_validation(data)
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        with stage('serializer'):
+            return super().to_representation(instance)
+
+def _query_timer(metrics):
+    def timer(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.add('db', time.perf_counter() - started)
+    return timer
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # A sampled share of requests runs under the profiler; only the slow ones are kept
+        self.sample_rate = getattr(settings, 'MMS_PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_seconds = getattr(settings, 'MMS_PROFILE_SLOW_MS', 500) / 1000
+        self.profile_dir = getattr(settings, 'MMS_PROFILE_DIR', 'profiles')
+        self.profiler = getattr(settings, 'MMS_PROFILER', 'cprofile')
+        if self.profiler not in ('cprofile', 'pyinstrument'):
+            raise ImproperlyConfigured("MMS_PROFILER must be 'cprofile' or 'pyinstrument'")
+        if self.profiler == 'pyinstrument' and pyinstrument is None:
+            raise ImproperlyConfigured("MMS_PROFILER = 'pyinstrument' needs the pyinstrument package")
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        profiler = self._start_profiler() if self.sample_rate and random.random() < self.sample_rate else None
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_timer(metrics)))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if profiler is not None:
+            self._finish_profile(profiler, seconds, request.method, view)
+        registry.record(request.method, view, response.status_code, seconds, metrics.stages)
+        return response
+
+    def _start_profiler(self):
+        if self.profiler == 'pyinstrument':
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _finish_profile(self, profiler, seconds, method, view):
+        if self.profiler == 'pyinstrument':
+            profiler.stop()
+        else:
+            profiler.disable()
+        if seconds < self.slow_seconds:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stem = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{int(seconds * 1000)}ms-{method}-{view}")
+        if self.profiler == 'pyinstrument':
+            with open(stem + '.html', 'w') as output_file:
+                output_file.write(profiler.output_html())
+        else:
+            # Open with: python -m pstats <file>, or snakeviz
+            profiler.dump_stats(stem + '.prof')
+        registry.profile_written()
+
+def metrics_view(request):
+    if not enabled():
+        return HttpResponseNotFound("Instrumentation is disabled (MMS_INSTRUMENTATION)")
+    user = getattr(request, 'user', None)
+    allowed_ips = getattr(settings, 'MMS_METRICS_ALLOWED_IPS', DEFAULT_METRICS_ALLOWED_IPS)
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not (user is not None and user.is_staff):
+        return HttpResponseForbidden("Metrics are served to MMS_METRICS_ALLOWED_IPS and staff users only")
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
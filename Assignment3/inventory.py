@@ -0,0 +1,186 @@
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .caching import TTLCache
+from .escalations import track_status
+from .history import record_transition
+from .models import EscalationKind, InventoryPosition, InventoryRecord, Material, MaterialStatus, TransitionEntity
+
+POSITION_VERSION_KEY = 'mms:inventory:version'
+_position_cache = TTLCache(
+    maxsize=getattr(settings, 'MMS_INVENTORY_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'MMS_INVENTORY_CACHE_TTL', 30.0),
+)
+
+class InsufficientQuantity(Exception):
+    def __init__(self, material_id):
+        super().__init__(f"Insufficient quantity for material {material_id}")
+        self.material_id = material_id
+
+def parse_quantity(value):
+    # Positive whole number, or None when the value can't be issued
+    if isinstance(value, bool):
+        return None
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    if quantity <= 0 or quantity != float(value):
+        return None
+    return quantity
+
+def _lock_material(material_id):
+    if connection.features.has_select_for_update:
+        queryset = Material.objects.select_for_update()
+    else:
+        # SQLite ignores SELECT ... FOR UPDATE; a write takes its database lock instead
+        Material.objects.filter(material_id=material_id).update(quantity=F('quantity'))
+        queryset = Material.objects
+    return queryset.values('type', 'status', 'quantity', 'created_at').get(material_id=material_id)
+
+def issue_material(material_id, quantity):
+    # The quantity check and the decrement happen in the database, so concurrent
+    # issues can never drive the quantity below zero. The row is locked first so
+    # the inventory position it leaves is known.
+    with transaction.atomic():
+        before = _lock_material(material_id)
+        updated = Material.objects.filter(material_id=material_id, quantity__gte=quantity).update(
+            quantity=F('quantity') - quantity, status=MaterialStatus.ISSUED
+        )
+        if not updated:
+            raise InsufficientQuantity(material_id)
+        location = material_location(material_id)
+        move_material(
+            (before['type'], before['status'], location, before['quantity']),
+            (before['type'], MaterialStatus.ISSUED, location, before['quantity'] - quantity),
+        )
+        if before['status'] != MaterialStatus.ISSUED:
+            # The conditional update bypasses post_save, so log the transition here
+            record_transition(
+                TransitionEntity.MATERIAL, material_id, before['status'], MaterialStatus.ISSUED,
+                entered_at=before['created_at'],
+            )
+            track_status(EscalationKind.MATERIAL_INSPECTION, material_id, before['status'], MaterialStatus.ISSUED)
+
+def issue_materials(items):
+    # All-or-nothing issue of many materials in one transaction. Repeated ids are
+    # summed and rows are updated in a fixed order so concurrent batches can't deadlock.
+    totals = OrderedDict()
+    for material_id, quantity in sorted(items, key=lambda item: str(item[0])):
+        totals[str(material_id)] = totals.get(str(material_id), 0) + quantity
+    with transaction.atomic():
+        for material_id, quantity in totals.items():
+            issue_material(material_id, quantity)
+    return list(totals)
+
+
+def material_location(material_id):
+    # A material sits wherever its most recent inventory record puts it
+    return (
+        InventoryRecord.objects.filter(material_id=material_id)
+        .order_by('-created_at')
+        .values_list('location', flat=True)
+        .first()
+    ) or ""
+
+def material_locations(material_ids):
+    # material_location for many materials in one query, keyed by material id
+    latest_location = (
+        InventoryRecord.objects.filter(material_id=OuterRef('pk'))
+        .order_by('-created_at')
+        .values('location')[:1]
+    )
+    return dict(
+        Material.objects.filter(pk__in=material_ids)
+        .annotate(location=Coalesce(Subquery(latest_location), Value("")))
+        .values_list('pk', 'location')
+    )
+
+def apply_position_deltas(deltas):
+    # deltas: {(material_type, status, location): [quantity, material_count]}
+    changed = False
+    for (material_type, status, location), (quantity, count) in deltas.items():
+        if not quantity and not count:
+            continue
+        changed = True
+        key = {'material_type': material_type, 'status': status, 'location': location}
+        updates = {
+            'quantity': F('quantity') + quantity,
+            'material_count': F('material_count') + count,
+            'updated_at': timezone.now(),
+        }
+        if InventoryPosition.objects.filter(**key).update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                InventoryPosition.objects.create(quantity=quantity, material_count=count, **key)
+        except IntegrityError:
+            InventoryPosition.objects.filter(**key).update(**updates)
+    if changed:
+        transaction.on_commit(invalidate_positions)
+
+def move_material(before, after):
+    # before/after: (material_type, status, location, quantity), or None when the
+    # material is being created or deleted
+    deltas = defaultdict(lambda: [0, 0])
+    if before is not None:
+        deltas[before[:3]][0] -= before[3]
+        deltas[before[:3]][1] -= 1
+    if after is not None:
+        deltas[after[:3]][0] += after[3]
+        deltas[after[:3]][1] += 1
+    apply_position_deltas(deltas)
+
+def invalidate_positions():
+    # Readers key their in-process cache on this shared version number
+    cache.add(POSITION_VERSION_KEY, 0, timeout=None)
+    try:
+        cache.incr(POSITION_VERSION_KEY)
+    except ValueError:
+        cache.set(POSITION_VERSION_KEY, 1, timeout=None)
+
+def inventory_positions(material_type=None, status=None, location=None):
+    key = (cache.get(POSITION_VERSION_KEY, 0), material_type, status, location)
+    positions = _position_cache.get(key)
+    if positions is None:
+        # Always the primary: a lagging replica's rows would be cached under the
+        # current version and outlive the lag by the cache TTL
+        queryset = InventoryPosition.objects.using(DEFAULT_DB_ALIAS).filter(material_count__gt=0)
+        if material_type is not None:
+            queryset = queryset.filter(material_type=material_type)
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        if location is not None:
+            queryset = queryset.filter(location=location)
+        positions = list(
+            queryset.order_by('material_type', 'status', 'location')
+            .values('material_type', 'status', 'location', 'quantity', 'material_count')
+        )
+        _position_cache.set(key, positions)
+    return positions
+
+def rebuild_inventory_positions():
+    # Full recompute from Material, for the initial load and periodic reconciliation
+    latest_location = (
+        InventoryRecord.objects.filter(material_id=OuterRef('pk'))
+        .order_by('-created_at')
+        .values('location')[:1]
+    )
+    rows = (
+        Material.objects.annotate(location=Coalesce(Subquery(latest_location), Value("")))
+        .values('type', 'status', 'location')
+        .annotate(total=Sum('quantity'), count=Count('material_id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        InventoryPosition.objects.all().delete()
+        InventoryPosition.objects.bulk_create([
+            InventoryPosition(material_type=row['type'], status=row['status'], location=row['location'],
+                              quantity=row['total'], material_count=row['count'])
+            for row in rows
+        ], batch_size=1000)
+        transaction.on_commit(invalidate_positions)
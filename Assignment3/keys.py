@@ -0,0 +1,42 @@
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+
+# Primary key generator for every model. Random uuid4 keys land anywhere in the
+# primary key index and in every index over a foreign key, so inserts split
+# pages all over the B-tree. With MMS_TIME_ORDERED_KEYS = True new rows get
+# UUIDv7 keys (RFC 9562): a millisecond timestamp up front, so each insert lands
+# at the end of the index. The column type and the ids clients already hold are
+# unchanged, so the switch needs no schema migration:
+#   1. set MMS_TIME_ORDERED_KEYS = True; rows created from then on are ordered
+#   2. once, in a quiet window, rebuild the indexes the old keys fragmented with
+#      VACUUM (retention.enable_incremental_vacuum does this) or REINDEX
+# Turning the setting off again goes back to uuid4 for new rows.
+# bench_keys.py measures insert rate, join speed and index size per key type.
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+def uuid7():
+    # 48-bit Unix milliseconds, then a 12-bit counter (RFC 9562 method 1) that keeps
+    # keys from one process increasing within a millisecond, then 62 random bits
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            # Random start in the lower half leaves room to count up
+            _last_ms, _counter = now_ms, int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # Same millisecond, or the clock stepped back: stay ahead of the last key
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms, _counter = _last_ms + 1, 0
+        timestamp, counter = _last_ms, _counter
+    random_bits = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(timestamp << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits)
+
+def new_id():
+    return uuid7() if getattr(settings, 'MMS_TIME_ORDERED_KEYS', False) else uuid.uuid4()
@@ -0,0 +1,76 @@
+"""Hammer POST /api/materials/issue/ from several processes against a running MMS server.
+
+    python loadtest_issue.py --url http://localhost:8000/api --processes 8 --requests 200 --stock 500
+
+Creates one material with --stock units, lets every process issue 1 unit at a
+time, then checks that exactly min(stock, attempts) units were issued and the
+stored quantity never went negative. Prints requests/sec and latency percentiles.
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from multiprocessing import Pool
+
+def call(method, url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read() or b"null")
+
+def hammer(args):
+    base_url, material_id, count = args
+    issued = rejected = failed = 0
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        code, _ = call("POST", f"{base_url}/materials/issue/", {"material_id": material_id, "quantity": 1})
+        latencies.append(time.perf_counter() - started)
+        if code == 200:
+            issued += 1
+        elif code == 400:
+            rejected += 1
+        else:
+            failed += 1
+    return issued, rejected, failed, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="issue calls per process")
+    parser.add_argument("--stock", type=int, default=500)
+    args = parser.parse_args()
+
+    code, material = call("POST", f"{args.url}/materials/", {"type": "loadtest", "quantity": args.stock, "status": "Stored"})
+    if code != 201:
+        sys.exit(f"Could not create material: {code} {material}")
+    material_id = material["material_id"]
+
+    started = time.perf_counter()
+    with Pool(args.processes) as pool:
+        results = pool.map(hammer, [(args.url, material_id, args.requests)] * args.processes)
+    elapsed = time.perf_counter() - started
+
+    issued = sum(r[0] for r in results)
+    rejected = sum(r[1] for r in results)
+    failed = sum(r[2] for r in results)
+    latencies = sorted(latency for r in results for latency in r[3])
+    _, final = call("GET", f"{args.url}/materials/{material_id}/")
+    total = args.processes * args.requests
+
+    print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"issued {issued}, rejected {rejected}, errors {failed}, remaining {final['quantity']}")
+    expected = min(args.stock, total - failed)
+    if final["quantity"] < 0 or issued + final["quantity"] != args.stock or issued > expected:
+        sys.exit("Over-issue detected")
+    print("OK: no over-issue")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import csv
+import datetime
+import json
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
+
+BULK_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+class BulkCreateMixin:
+    # Adds POST {prefix}/bulk/ accepting a JSON array or NDJSON body.
+    # Valid rows are written with bulk_create in chunked transactions and
+    # invalid rows are reported back by their index in the payload.
+    bulk_serializer_class = None
+    bulk_chunk_size = BULK_CHUNK_SIZE
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        serializer = self.bulk_serializer_class(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        instances = serializer.build_instances()
+        model = serializer.child.Meta.model
+        row_errors = dict(serializer.row_errors)
+        created = []
+        for start in range(0, len(instances), self.bulk_chunk_size):
+            chunk = instances[start:start + self.bulk_chunk_size]
+            # Each chunk commits with its side effects or rolls back whole; a failed
+            # chunk is reported per row and earlier chunks stay stored
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(chunk)
+                    self.perform_bulk_create(chunk)
+            except Exception as exc:
+                detail = {api_settings.NON_FIELD_ERRORS_KEY: [f"Not stored: {type(exc).__name__}: {exc}"]}
+                for index in serializer.row_indexes[start:start + self.bulk_chunk_size]:
+                    row_errors[index] = detail
+                continue
+            created.extend(chunk)
+        errors = [
+            {"index": index, "errors": detail}
+            for index, detail in sorted(row_errors.items())
+        ]
+        if not created and errors:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            "created": len(created),
+            "ids": [str(instance.pk) for instance in created],
+            "errors": errors,
+        }, status=response_status)
+
+    def perform_bulk_create(self, instances):
+        # Hook for one aggregated side effect per chunk, run in the chunk's transaction
+        pass
+
+
+class ExpandMixin:
+    # ?expand=material,widget nests the related objects in the response. They
+    # are joined with select_related() so a page costs one query at any size.
+    expandable_fields = {'material': 'material_id'}
+
+    def get_expand(self):
+        request = getattr(self, 'request', None)
+        if request is None:
+            return []
+        names = [name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()]
+        unknown = sorted(set(names) - set(self.expandable_fields))
+        if unknown:
+            raise ValidationError({'expand': [f"Cannot expand: {', '.join(unknown)}. Choose from: {', '.join(self.expandable_fields)}."]})
+        return [self.expandable_fields[name] for name in names]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expand = self.get_expand()
+        return queryset.select_related(*expand) if expand else queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, value):
+        return value
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+class ExportMixin:
+    # Adds GET {prefix}/export/?format=ndjson|csv streaming every row of the
+    # filtered queryset. Rows come from values() over a chunked server-side
+    # cursor, so memory stays flat regardless of table size.
+    export_chunk_size = EXPORT_CHUNK_SIZE
+
+    def get_export_fields(self):
+        return list(self.get_serializer_class().Meta.fields)
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        fields = self.get_export_fields()
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .values(*fields)
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+        if request.accepted_renderer.format == 'csv':
+            body = self._stream_csv(fields, rows)
+            filename = f"{self.basename}.csv"
+        else:
+            body = (json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+            filename = f"{self.basename}.ndjson"
+        response = StreamingHttpResponse(body, content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def _stream_csv(self, fields, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([_csv_value(row[field]) for field in fields])
@@ -1,5 +1,7 @@
 from django.db import models
-import uuid
+from django.db.models import Q
+from django.utils import timezone
+from .keys import new_id
 
 class MaterialStatus(models.TextChoices):
     RECEIVED = "Received", "Received"
@@ -27,48 +29,113 @@ class InspectionResult(models.TextChoices):
     PASS = "Pass", "Pass"
     FAIL = "Fail", "Fail"
 
+class ReportStatus(models.TextChoices):
+    GENERATING = "Generating", "Generating"
+    GENERATED = "Generated", "Generated"
+    FAILED = "Failed", "Failed"
+
+class ReportBucket(models.TextChoices):
+    DAY = "day", "Day"
+    WEEK = "week", "Week"
+
+class TransitionEntity(models.IntegerChoices):
+    MATERIAL = 1, "material"
+    WIDGET = 2, "widget"
+    SHIPMENT = 3, "shipment"
+    ORDER = 4, "order"
+
+class EscalationKind(models.TextChoices):
+    FEEDBACK = "feedback", "Requirement awaiting procurement feedback"
+    MATERIAL_INSPECTION = "material_inspection", "Material awaiting inspection"
+    WIDGET_INSPECTION = "widget_inspection", "Widget awaiting inspection"
+    SHIPPING = "shipping", "Shipment awaiting delivery"
+
+class FeedRunStatus(models.TextChoices):
+    RUNNING = "Running", "Running"
+    SUCCEEDED = "Succeeded", "Succeeded"
+    FAILED = "Failed", "Failed"
+
+class OrderStage(models.TextChoices):
+    ORDERED = "Ordered", "Ordered"
+    FABRICATED = "Fabricated", "Fabricated"
+    INSPECTED = "Inspected", "Inspected"
+    PREPARED = "Prepared", "Prepared"
+    SHIPPED = "Shipped", "Shipped"
+    DELIVERED = "Delivered", "Delivered"
+    RECEIVED = "Received", "Received"
+
 class Material(models.Model):
-    material_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    material_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     type = models.CharField(max_length=100)
     quantity = models.IntegerField()
     status = models.CharField(max_length=50, choices=MaterialStatus.choices, default=MaterialStatus.RECEIVED)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # (created_at, pk) serves keyset pagination; the rest back the hot filters,
+        # see QueryPlanTestCase in tests.py
+        indexes = [
+            models.Index(fields=['created_at', 'material_id']),
+            models.Index(fields=['status', 'created_at', 'material_id']),
+            models.Index(fields=['type', 'status']),
+        ]
+
     def __str__(self):
         return f"{self.type} ({self.material_id})"
 
 class Requirement(models.Model):
-    req_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    material_id = models.ForeignKey(Material, on_delete=models.CASCADE)
+    req_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    # Lookups and cascades by material use the (material_id, delivery_date) index
+    material_id = models.ForeignKey(Material, on_delete=models.CASCADE, db_index=False)
     quantity = models.IntegerField()
     delivery_date = models.DateField()
     status = models.CharField(max_length=50, choices=RequirementStatus.choices, default=RequirementStatus.DRAFT)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'req_id']),
+            models.Index(fields=['status', 'created_at', 'req_id']),
+            models.Index(fields=['material_id', 'delivery_date']),
+            models.Index(fields=['delivery_date', 'material_id']),
+        ]
+
     def __str__(self):
         return f"Requirement {self.req_id} for {self.material_id}"
 
 class InstallationRequirement(models.Model):
-    inst_req_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    inst_req_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     fab_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'inst_req_id']),
+            models.Index(fields=['material_id', 'fab_date']),
+            models.Index(fields=['fab_date', 'material_id']),
+        ]
+
     def __str__(self):
         return f"Installation Requirement {self.inst_req_id} for {self.material_id}"
 
 class Widget(models.Model):
-    widget_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    widget_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.CASCADE)
     status = models.CharField(max_length=50, choices=WidgetStatus.choices, default=WidgetStatus.FABRICATED)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'widget_id']),
+        ]
+
     def __str__(self):
         return f"Widget {self.widget_id} from {self.material_id}"
 
 class Shipment(models.Model):
-    shipment_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    shipment_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.SET_NULL, null=True, blank=True)
     widget_id = models.ForeignKey(Widget, on_delete=models.SET_NULL, null=True, blank=True)
     tracking_id = models.CharField(max_length=50)
@@ -76,47 +143,291 @@ class Shipment(models.Model):
     status = models.CharField(max_length=50, choices=ShipmentStatus.choices, default=ShipmentStatus.PREPARED)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'shipment_id']),
+            models.Index(fields=['status', 'created_at', 'shipment_id']),
+            models.Index(fields=['customer_id', 'status']),
+            models.Index(fields=['tracking_id']),
+        ]
+
     def __str__(self):
         return f"Shipment {self.shipment_id} ({self.tracking_id})"
 
 class Inspection(models.Model):
-    inspection_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    inspection_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.SET_NULL, null=True, blank=True)
     widget_id = models.ForeignKey(Widget, on_delete=models.SET_NULL, null=True, blank=True)
     result = models.CharField(max_length=50, choices=InspectionResult.choices)
     defects = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'inspection_id']),
+            models.Index(fields=['result', 'created_at', 'inspection_id']),
+        ]
+
     def __str__(self):
         return f"Inspection {self.inspection_id}"
 
 class MaintenanceRecord(models.Model):
-    maint_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    maint_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.CASCADE)
     date = models.DateField()
     condition = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'maint_id']),
+            models.Index(fields=['material_id', 'date']),
+        ]
+
     def __str__(self):
         return f"Maintenance {self.maint_id} for {self.material_id}"
 
 class InventoryRecord(models.Model):
-    inv_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    inv_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.CASCADE)
     location = models.CharField(max_length=100)
     last_checked = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'inv_id']),
+            models.Index(fields=['location', 'material_id']),
+            models.Index(fields=['last_checked']),
+        ]
+
     def __str__(self):
         return f"Inventory {self.inv_id} for {self.material_id}"
 
 class CustomerOrder(models.Model):
-    order_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     material_id = models.ForeignKey(Material, on_delete=models.SET_NULL, null=True, blank=True)
     widget_id = models.ForeignKey(Widget, on_delete=models.SET_NULL, null=True, blank=True)
     customer_id = models.CharField(max_length=50)
     status = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'order_id']),
+            models.Index(fields=['status', 'created_at', 'order_id']),
+            models.Index(fields=['customer_id', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} for Customer {self.customer_id}"
+
+class DemandReport(models.Model):
+    report_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    bucket = models.CharField(max_length=10, choices=ReportBucket.choices, default=ReportBucket.DAY)
+    status = models.CharField(max_length=50, choices=ReportStatus.choices, default=ReportStatus.GENERATING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Point in time the replica snapshot reflected when the report's sums were read
+    # from it; null when they came from the primary or the bucket cache
+    data_as_of = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Demand Report {self.report_id} ({self.start_date} to {self.end_date})"
+
+class DemandReportRow(models.Model):
+    # One aggregated (period, material type) line of a generated report
+    report_id = models.ForeignKey(DemandReport, on_delete=models.CASCADE, related_name='rows')
+    period = models.DateField()
+    material_type = models.CharField(max_length=100)
+    requirement_quantity = models.BigIntegerField(default=0)
+    installation_quantity = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['report_id', 'period', 'material_type'])]
+
+class DemandDay(models.Model):
+    # Cache state of one day's DemandBucket rows: ready once computed and reusable
+    # across reports. Every invalidation bumps version, so a fill only stores the
+    # totals it read if nothing changed the day in between (reports.fill_demand_buckets).
+    day = models.DateField(unique=True)
+    ready = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+class DemandBucket(models.Model):
+    # Daily demand per material type, shared by every report covering that day
+    day = models.DateField()
+    material_type = models.CharField(max_length=100)
+    requirement_quantity = models.BigIntegerField(default=0)
+    installation_quantity = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'material_type'], name='unique_demand_bucket')]
+
+
+class Notification(models.Model):
+    # Outbound message buffered until flush_notifications_task coalesces it into a digest
+    notification_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    recipient = models.CharField(max_length=100)
+    message = models.TextField()
+    digest_id = models.UUIDField(null=True, blank=True)
+    # When a flush took the message into its digest; stale claims are released
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['delivered_at', 'recipient', 'created_at']),
+            models.Index(fields=['digest_id']),
+        ]
+
+    def __str__(self):
+        return f"Notification {self.notification_id} for {self.recipient}"
+
+
+class TaskOutbox(models.Model):
+    # Celery task call recorded in the same transaction as the write that caused it;
+    # relay_outbox_task forwards it to the broker and deletes the row
+    outbox_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    task_name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set once the row failed MMS_OUTBOX_MAX_ATTEMPTS times; the relay no longer sends it
+    dead_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'outbox_id'])]
+
+    def __str__(self):
+        return f"Outbox {self.outbox_id} ({self.task_name})"
+
+
+class InventoryPosition(models.Model):
+    # Running totals of Material.quantity per (type, status, location), kept
+    # current by inventory.apply_position_deltas so reads never scan Material
+    material_type = models.CharField(max_length=100)
+    status = models.CharField(max_length=50)
+    location = models.CharField(max_length=100, blank=True)
+    quantity = models.BigIntegerField(default=0)
+    material_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material_type', 'status', 'location'], name='unique_inventory_position'),
+        ]
+        indexes = [models.Index(fields=['location', 'material_type'])]
+
+    def __str__(self):
+        return f"{self.quantity} {self.material_type} {self.status} at {self.location or 'unassigned'}"
+
+
+class OrderProgress(models.Model):
+    # Furthest lifecycle stage each order has reached, kept current by progress.refresh_order_progress
+    order = models.OneToOneField(CustomerOrder, on_delete=models.CASCADE, primary_key=True, related_name='progress')
+    stage = models.CharField(max_length=50, choices=OrderStage.choices, default=OrderStage.ORDERED)
+    percentage = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Order {self.order_id} {self.stage} ({self.percentage}%)"
+
+
+class StatusTransition(models.Model):
+    # Append-only log of status changes. Each row carries how long the entity sat in
+    # from_status, so dwell-time queries aggregate single rows and never pair events.
+    entity_type = models.PositiveSmallIntegerField(choices=TransitionEntity.choices)
+    entity_id = models.UUIDField()
+    from_status = models.CharField(max_length=50, blank=True)
+    to_status = models.CharField(max_length=50)
+    dwell_seconds = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity_type', 'entity_id', 'created_at']),
+            # Covers the dwell aggregation: window scan by type and time, grouped by status
+            models.Index(fields=['entity_type', 'created_at', 'from_status', 'to_status', 'dwell_seconds']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Status transitions are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_entity_type_display()} {self.entity_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class Escalation(models.Model):
+    # Deadline for an entity that must leave its pending status in time. Rows exist
+    # only while the entity is pending, so the due-time index holds open deadlines
+    # and escalations.fire_due_escalations reads just the rows that are due.
+    kind = models.CharField(max_length=30, choices=EscalationKind.choices)
+    entity_id = models.UUIDField()
+    due_at = models.DateTimeField()
+    fired_at = models.DateTimeField(null=True, blank=True)
+    # Set with fired_at by the run that fired the row, so it enqueues only its own claims
+    claim_id = models.UUIDField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['kind', 'entity_id'], name='unique_escalation')]
+        indexes = [
+            models.Index(fields=['due_at'], condition=Q(fired_at__isnull=True), name='escalation_pending_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.entity_id} due {self.due_at}"
+
+
+class FeedRowState(models.Model):
+    # Digest of the upstream values a feed (etl.py) last loaded into a row. Re-runs
+    # compare against it, not against the row, so changes MMS made since (stock
+    # issued, workflow status) are not undone by an unchanged upstream file.
+    target = models.CharField(max_length=30)
+    object_id = models.UUIDField()
+    digest = models.CharField(max_length=40)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['target', 'object_id'], name='unique_feed_row_state')]
+
+    def __str__(self):
+        return f"{self.target} {self.object_id}: {self.digest}"
+
+
+class FeedRun(models.Model):
+    # One run of an upstream feed (see etl.py): row counts, throughput, memory
+    # and a sample of the rejected rows
+    run_id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    feed = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=FeedRunStatus.choices, default=FeedRunStatus.RUNNING)
+    rows_read = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    rows_per_second = models.FloatField(null=True, blank=True)
+    peak_memory_bytes = models.BigIntegerField(null=True, blank=True)
+    memory_growth_bytes = models.BigIntegerField(null=True, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'run_id']),
+            models.Index(fields=['feed', 'created_at']),
+        ]
+
     def __str__(self):
-        return f"Order {self.order_id} for Customer {self.customer_id}"
\ No newline at end of file
+        return f"Feed {self.feed} run {self.run_id} ({self.status})"
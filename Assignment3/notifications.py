@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .keys import new_id
+from .models import Notification
+
+PROCUREMENT = "Procurement"
+ENGINEER = "Engineer"
+FABRICATION = "Fabrication"
+WAREHOUSE = "Warehouse"
+SHIPPING = "Shipping"
+INSPECTION_MANAGER = "Inspection Manager"
+SALES = "Sales"
+
+# Tunables, overridable from Django settings
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_MAX_DIGEST_SIZE = 500
+DEFAULT_CONCURRENCY = 50
+DEFAULT_SEND_LATENCY = 1.0
+DEFAULT_CLAIM_TIMEOUT = 600
+
+COUNTER_KEYS = ['queued', 'delivered', 'digests', 'failed_digests']
+COUNTER_PREFIX = 'mms:notifications:'
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def _incr(name, amount=1):
+    key = COUNTER_PREFIX + name
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+def queue_notification(recipient, message, notification_id=None):
+    # Cheap enough to run per event: one insert, no delivery work
+    if notification_id:
+        notification, created = Notification.objects.get_or_create(
+            notification_id=notification_id, defaults={'recipient': recipient, 'message': message}
+        )
+    else:
+        notification, created = Notification.objects.create(recipient=recipient, message=message), True
+    if created:
+        _incr('queued')
+    return notification
+
+async def log_sender(recipient, messages):
+    # Stand-in for an email/chat gateway call; awaits instead of blocking the worker
+    await asyncio.sleep(_setting('MMS_NOTIFICATION_SEND_LATENCY', DEFAULT_SEND_LATENCY))
+    print(f"{recipient} Notification digest ({len(messages)} messages):")
+    for message in messages:
+        print(f"  - {message}")
+
+def get_sender():
+    sender = _setting('MMS_NOTIFICATION_SENDER', None)
+    return import_string(sender) if sender else log_sender
+
+async def _deliver(digests, sender, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(recipient, messages):
+        async with semaphore:
+            await sender(recipient, messages)
+
+    return await asyncio.gather(
+        *(send(recipient, [message for _, message in rows]) for _, recipient, rows in digests),
+        return_exceptions=True,
+    )
+
+def _claim_digests(cutoff, max_size, now, claim_timeout):
+    # Recipients whose oldest pending message has waited a full window get one digest each.
+    # A flush that died between claiming and delivering left its digest claimed; once
+    # the claim is older than claim_timeout the messages go back to the buffer.
+    Notification.objects.filter(
+        delivered_at=None, digest_id__isnull=False, claimed_at__lt=now - datetime.timedelta(seconds=claim_timeout)
+    ).update(digest_id=None, claimed_at=None)
+    due = (
+        Notification.objects.filter(delivered_at=None, digest_id=None)
+        .values('recipient')
+        .annotate(first=Min('created_at'))
+        .filter(first__lte=cutoff)
+        .order_by()
+    )
+    digests = []
+    for row in due:
+        rows = list(
+            Notification.objects.filter(recipient=row['recipient'], delivered_at=None, digest_id=None)
+            .order_by('created_at')
+            .values_list('notification_id', 'message')[:max_size]
+        )
+        digest_id = new_id()
+        claimed = Notification.objects.filter(
+            notification_id__in=[pk for pk, _ in rows], digest_id=None
+        ).update(digest_id=digest_id, claimed_at=now)
+        if claimed == len(rows):
+            digests.append((digest_id, row['recipient'], rows))
+        else:
+            # Another flush claimed part of this batch; let it finish and retry later
+            Notification.objects.filter(digest_id=digest_id).update(digest_id=None, claimed_at=None)
+    return digests
+
+def flush_notifications(window=None, now=None):
+    window = _setting('MMS_NOTIFICATION_WINDOW', DEFAULT_WINDOW_SECONDS) if window is None else window
+    now = now or timezone.now()
+    started = time.monotonic()
+    digests = _claim_digests(now - datetime.timedelta(seconds=window),
+                             _setting('MMS_NOTIFICATION_MAX_DIGEST_SIZE', DEFAULT_MAX_DIGEST_SIZE),
+                             now, _setting('MMS_NOTIFICATION_CLAIM_TIMEOUT', DEFAULT_CLAIM_TIMEOUT))
+    if not digests:
+        return {"digests": 0, "delivered": 0, "failed_digests": 0, "seconds": 0.0, "messages_per_second": None}
+    results = asyncio.run(_deliver(digests, get_sender(), _setting('MMS_NOTIFICATION_CONCURRENCY', DEFAULT_CONCURRENCY)))
+    delivered_ids, failed_ids, delivered = [], [], 0
+    for (digest_id, _, rows), outcome in zip(digests, results):
+        if isinstance(outcome, Exception):
+            failed_ids.append(digest_id)
+        else:
+            delivered_ids.append(digest_id)
+            delivered += len(rows)
+    Notification.objects.filter(digest_id__in=delivered_ids).update(delivered_at=timezone.now())
+    # Failed digests go back to the buffer and are retried on the next flush
+    Notification.objects.filter(digest_id__in=failed_ids).update(digest_id=None, claimed_at=None)
+    _incr('delivered', delivered)
+    _incr('digests', len(delivered_ids))
+    _incr('failed_digests', len(failed_ids))
+    seconds = time.monotonic() - started
+    result = {
+        "digests": len(delivered_ids),
+        "delivered": delivered,
+        "failed_digests": len(failed_ids),
+        "seconds": round(seconds, 3),
+        "messages_per_second": round(delivered / seconds, 1) if seconds else None,
+    }
+    cache.set(COUNTER_PREFIX + 'last_flush', result, timeout=None)
+    return result
+
+def notification_stats():
+    pending = (
+        Notification.objects.filter(delivered_at=None)
+        .values('recipient')
+        .annotate(count=Count('notification_id'), first=Min('created_at'))
+        .order_by('recipient')
+    )
+    depth = {row['recipient']: row['count'] for row in pending}
+    counters = cache.get_many([COUNTER_PREFIX + key for key in COUNTER_KEYS + ['last_flush']])
+    return {
+        "queue_depth": sum(depth.values()),
+        "queue_depth_by_recipient": depth,
+        "oldest_pending_at": min((row['first'] for row in pending), default=None),
+        "counters": {key: counters.get(COUNTER_PREFIX + key, 0) for key in COUNTER_KEYS},
+        "last_flush": counters.get(COUNTER_PREFIX + 'last_flush'),
+    }
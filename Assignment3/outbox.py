@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from kombu.exceptions import OperationalError as BrokerError
+from .instrumentation import stage
+from .models import TaskOutbox
+
+RELAY_BATCH_SIZE = 500
+RELAY_LOCK_KEY = 'mms:outbox:relay-lock'
+RELAY_LOCK_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 5
+# Errors that mean the broker itself is unreachable; anything else is the row's own fault
+BROKER_ERRORS = (BrokerError, OSError)
+
+def enqueue_task(task, *args, **kwargs):
+    # Call inside the transaction that writes the model change: if it rolls
+    # back the task is never sent, and the request never waits on the broker
+    with stage('enqueue'):
+        return TaskOutbox.objects.create(task_name=task.name, args=list(args), kwargs=kwargs)
+
+def relay_outbox(batch_size=RELAY_BATCH_SIZE, max_batches=None):
+    # Forwards pending rows to Celery oldest first. The outbox id doubles as the
+    # Celery task id, so a row re-sent after a crash is recognised downstream.
+    # A row that fails on its own (unknown task, unserializable arguments) is
+    # skipped and retried next run; after MMS_OUTBOX_MAX_ATTEMPTS it is
+    # dead-lettered (dead_at set) and left in the table for inspection.
+    if not cache.add(RELAY_LOCK_KEY, 1, timeout=RELAY_LOCK_TIMEOUT):
+        return {"dispatched": 0, "failed": 0, "dead": 0, "skipped": True}
+    max_attempts = getattr(settings, 'MMS_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    dispatched = failed = dead = batches = 0
+    skipped = []
+    try:
+        while max_batches is None or batches < max_batches:
+            rows = list(
+                TaskOutbox.objects.filter(dead_at=None).exclude(pk__in=skipped)
+                .order_by('created_at', 'outbox_id')[:batch_size]
+            )
+            if not rows:
+                break
+            batches += 1
+            sent = []
+            broker_down = False
+            for row in rows:
+                try:
+                    task = import_string(row.task_name)
+                    task.apply_async(args=row.args, kwargs=row.kwargs, task_id=str(row.outbox_id))
+                except BROKER_ERRORS as exc:
+                    # Broker trouble: keep this and every later row for the next run, in order
+                    TaskOutbox.objects.filter(pk=row.pk).update(attempts=F('attempts') + 1, last_error=str(exc)[:1000])
+                    failed += 1
+                    broker_down = True
+                    break
+                except Exception as exc:
+                    # This row only: later rows still go out
+                    give_up = row.attempts + 1 >= max_attempts
+                    TaskOutbox.objects.filter(pk=row.pk).update(
+                        attempts=F('attempts') + 1, last_error=str(exc)[:1000], dead_at=timezone.now() if give_up else None,
+                    )
+                    failed += 1
+                    dead += give_up
+                    skipped.append(row.pk)
+                    continue
+                sent.append(row.pk)
+            with transaction.atomic():
+                TaskOutbox.objects.filter(pk__in=sent).delete()
+            dispatched += len(sent)
+            if broker_down or len(rows) < batch_size:
+                break
+    finally:
+        cache.delete(RELAY_LOCK_KEY)
+    return {"dispatched": dispatched, "failed": failed, "dead": dead, "skipped": False}
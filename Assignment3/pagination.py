@@ -0,0 +1,83 @@
+import base64
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    # Seeks past the last (created_at, pk) seen instead of using OFFSET, so a
+    # deep page costs the same as the first one and stays stable under inserts.
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = list(self.page_queryset(queryset, request))
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = (page[-1].created_at, page[-1].pk) if self.has_next else None
+        return page
+
+    def page_queryset(self, queryset, request):
+        # The query one page runs, one row past the page to tell whether there is a next
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by('created_at', 'pk')
+        position = self.decode_cursor(request, queryset.model._meta.pk)
+        if position:
+            created_at, pk = position
+            # The leading >= bound lets SQLite seek the (created_at, pk) index range
+            queryset = queryset.filter(Q(created_at__gte=created_at), Q(created_at__gt=created_at) | Q(pk__gt=pk))
+        return queryset[:self.page_size + 1]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request, pk_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = pk_field.to_python(pk) if pk else None
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None or pk is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def cursor_value(self, position):
+        created_at, pk = position
+        return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode('ascii')).decode('ascii')
+
+    def encode_cursor(self, position):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.cursor_value(position))
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from .models import (
+    CustomerOrder, Inspection, InspectionResult, OrderProgress, OrderStage,
+    Shipment, ShipmentStatus, WidgetStatus
+)
+from .routers import pin_primary
+
+STAGE_PERCENTAGES = {
+    OrderStage.ORDERED: 0,
+    OrderStage.FABRICATED: 25,
+    OrderStage.INSPECTED: 50,
+    OrderStage.PREPARED: 60,
+    OrderStage.SHIPPED: 75,
+    OrderStage.DELIVERED: 90,
+    OrderStage.RECEIVED: 100,
+}
+# Widget statuses that mean the widget already passed inspection
+INSPECTED_WIDGET_STATUSES = {WidgetStatus.INSPECTED, "Ready for Shipping"}
+REFRESH_BATCH_SIZE = getattr(settings, 'MMS_ORDER_PROGRESS_BATCH_SIZE', 1000)
+
+def order_stage(order_status, widget_status, inspected, prepared, shipped, delivered):
+    # Furthest point reached along widget fabricated -> inspected -> shipment prepared/shipped/delivered -> received
+    if order_status == OrderStage.RECEIVED:
+        return OrderStage.RECEIVED
+    if delivered:
+        return OrderStage.DELIVERED
+    if shipped or order_status == OrderStage.SHIPPED or widget_status == WidgetStatus.SHIPPED:
+        return OrderStage.SHIPPED
+    if prepared:
+        return OrderStage.PREPARED
+    if inspected or widget_status in INSPECTED_WIDGET_STATUSES:
+        return OrderStage.INSPECTED
+    if widget_status is not None:
+        return OrderStage.FABRICATED
+    return OrderStage.ORDERED
+
+def refresh_order_progress(order_ids=None, widget_ids=None):
+    # Recompute stored progress for the given orders, or for the orders of the given widgets
+    orders = CustomerOrder.objects.all()
+    if order_ids is not None:
+        orders = orders.filter(order_id__in=order_ids)
+    if widget_ids is not None:
+        orders = orders.filter(widget_id__in=widget_ids)
+    shipments = Shipment.objects.filter(widget_id=OuterRef('widget_id'))
+    rows = orders.annotate(
+        inspected=Exists(Inspection.objects.filter(widget_id=OuterRef('widget_id'), result=InspectionResult.PASS)),
+        prepared=Exists(shipments),
+        shipped=Exists(shipments.filter(status=ShipmentStatus.SHIPPED)),
+        delivered=Exists(shipments.filter(status=ShipmentStatus.DELIVERED)),
+    ).values('order_id', 'status', 'widget_id__status', 'inspected', 'prepared', 'shipped', 'delivered')
+    refreshed = 0
+    batch = []
+    for row in rows.iterator(chunk_size=REFRESH_BATCH_SIZE):
+        stage = order_stage(
+            row['status'], row['widget_id__status'],
+            row['inspected'], row['prepared'], row['shipped'], row['delivered'],
+        )
+        batch.append(OrderProgress(order_id=row['order_id'], stage=stage, percentage=STAGE_PERCENTAGES[stage]))
+        if len(batch) >= REFRESH_BATCH_SIZE:
+            refreshed += _store(batch)
+            batch = []
+    return refreshed + _store(batch)
+
+def _store(batch):
+    if batch:
+        OrderProgress.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['order'], update_fields=['stage', 'percentage', 'updated_at']
+        )
+    return len(batch)
+
+def order_progress(order_ids):
+    # Stored progress for many orders in one query, keyed by order id. Orders written
+    # before the table existed are computed on first request; unknown ids are left out.
+    def fetch(ids):
+        rows = CustomerOrder.objects.filter(order_id__in=ids).values(
+            'order_id', 'status', stage=F('progress__stage'), percentage=F('progress__percentage')
+        )
+        return {row['order_id']: row for row in rows}
+    found = fetch(order_ids)
+    missing = [order_id for order_id, row in found.items() if row['stage'] is None]
+    if missing:
+        # Computed from and re-read on the primary, not a replica that may lag it
+        pin_primary()
+        refresh_order_progress(order_ids=missing)
+        found.update(fetch(missing))
+    return found
@@ -0,0 +1,28 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+# Export responses stream their own body; these renderers let DRF negotiate
+# ?format=ndjson / ?format=csv and render error payloads in the same format.
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, cls=DjangoJSONEncoder) + "\n").encode(self.charset)
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            return "".join(f"{key},{value}\n" for key, value in data.items()).encode(self.charset)
+        return str(data).encode(self.charset)
@@ -0,0 +1,195 @@
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+from .models import (
+    Requirement, InstallationRequirement, DemandReport, DemandReportRow,
+    DemandDay, DemandBucket, ReportBucket, ReportStatus
+)
+from .routers import replica_as_of, replica_reads
+
+ROW_BATCH_SIZE = 2000
+# The DemandDay row whose version invalidate_all_demand bumps for every day at once
+ALL_DAYS = datetime.date.min
+
+def _missing_days(start_date, end_date):
+    # Days in the window that have no computed buckets yet
+    computed = set(
+        DemandDay.objects.filter(day__range=(start_date, end_date), ready=True).values_list('day', flat=True)
+    )
+    days = (start_date + datetime.timedelta(days=n) for n in range((end_date - start_date).days + 1))
+    return [day for day in days if day not in computed]
+
+def _day_ranges(days):
+    # Contiguous (first, last) ranges covering the days, for one range filter each
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day - datetime.timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+def _range_filter(field, ranges):
+    query = Q()
+    for first, last in ranges:
+        query |= Q(**{f"{field}__range": (first, last)})
+    return query
+
+def _read_totals(days):
+    # One grouped query per source table. The days' cache versions are read first:
+    # a write landing after that bumps a version, so _store_buckets drops its day
+    ranges = _day_ranges(days)
+    versions = dict(DemandDay.objects.filter(day__in=[ALL_DAYS, *days]).values_list('day', 'version'))
+    totals = {}
+    requirement_rows = (
+        Requirement.objects.filter(_range_filter('delivery_date', ranges))
+        .values('delivery_date', 'material_id__type')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    for row in requirement_rows:
+        key = (row['delivery_date'], row['material_id__type'])
+        totals[key] = [row['total'], 0]
+    installation_rows = (
+        InstallationRequirement.objects.filter(_range_filter('fab_date', ranges))
+        .values('fab_date', 'material_id__type')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    for row in installation_rows:
+        key = (row['fab_date'], row['material_id__type'])
+        totals.setdefault(key, [0, 0])[1] = row['total']
+    return totals, versions
+
+def _lock_days(days):
+    # Current (version, ready) per day, locked against invalidation until the transaction ends
+    DemandDay.objects.bulk_create([DemandDay(day=day) for day in [ALL_DAYS, *days]], ignore_conflicts=True)
+    if connection.features.has_select_for_update:
+        queryset = DemandDay.objects.select_for_update()
+    else:
+        # SQLite ignores SELECT ... FOR UPDATE; a write takes its database lock instead
+        DemandDay.objects.filter(day__in=[ALL_DAYS, *days]).update(version=F('version'))
+        queryset = DemandDay.objects
+    return {row[0]: row[1:] for row in queryset.filter(day__in=[ALL_DAYS, *days]).values_list('day', 'version', 'ready')}
+
+def _store_buckets(days, totals, versions):
+    # Stores the days whose version still matches the read; returns the days that
+    # were invalidated after it and need another read
+    with transaction.atomic():
+        current = _lock_days(days)
+        if current[ALL_DAYS][0] != versions.get(ALL_DAYS, 0):
+            return [day for day in days if not current[day][1]]
+        fresh = {day for day in days if not current[day][1] and current[day][0] == versions.get(day, 0)}
+        DemandBucket.objects.bulk_create(
+            [
+                DemandBucket(day=day, material_type=material_type,
+                             requirement_quantity=req_qty, installation_quantity=inst_qty)
+                for (day, material_type), (req_qty, inst_qty) in totals.items() if day in fresh
+            ],
+            batch_size=ROW_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        DemandDay.objects.filter(day__in=fresh).update(ready=True, computed_at=timezone.now())
+    return [day for day in days if not current[day][1] and day not in fresh]
+
+def _fill(start_date, end_date):
+    # Compute only the days not already cached. The sums are read from the replica
+    # when one is configured and fresh (replica_reads), without holding the primary's
+    # write lock; buckets are written to the primary. A day written to since the
+    # replica snapshot or the read has a newer version and is read again from the
+    # primary under the lock. Returns the days computed and the replica's time.
+    days = _missing_days(start_date, end_date)
+    if not days:
+        return 0, None
+    with replica_reads():
+        as_of = replica_as_of()
+        totals, versions = _read_totals(days)
+    stale = _store_buckets(days, totals, versions)
+    if stale:
+        with transaction.atomic():
+            _lock_days(stale)
+            _store_buckets(stale, *_read_totals(stale))
+    return len(days), as_of
+
+def fill_demand_buckets(start_date, end_date):
+    return _fill(start_date, end_date)[0]
+
+def invalidate_demand_days(days):
+    # Drop cached buckets for days whose requirements changed so the next report
+    # recomputes them; the version bump also voids any fill that read them earlier
+    days = {day for day in days if day}
+    if not days:
+        return
+    with transaction.atomic():
+        DemandDay.objects.bulk_create([DemandDay(day=day) for day in days], ignore_conflicts=True)
+        DemandDay.objects.filter(day__in=days).update(ready=False, version=F('version') + 1)
+        DemandBucket.objects.filter(day__in=days).delete()
+
+def invalidate_all_demand():
+    # Buckets are keyed by material type, so retyping a material invalidates the whole cache
+    with transaction.atomic():
+        DemandDay.objects.bulk_create([DemandDay(day=ALL_DAYS)], ignore_conflicts=True)
+        DemandDay.objects.update(ready=False, version=F('version') + 1)
+        DemandBucket.objects.all().delete()
+
+def demand_rows(start_date, end_date, bucket=ReportBucket.DAY):
+    period = TruncWeek('day') if bucket == ReportBucket.WEEK else F('day')
+    return (
+        DemandBucket.objects.filter(day__range=(start_date, end_date))
+        .annotate(period=period)
+        .values('period', 'material_type')
+        .annotate(
+            requirement_quantity=Sum('requirement_quantity'),
+            installation_quantity=Sum('installation_quantity'),
+        )
+        .order_by('period', 'material_type')
+    )
+
+def build_demand_report(report_id):
+    report = DemandReport.objects.get(report_id=report_id)
+    try:
+        _, report.data_as_of = _fill(report.start_date, report.end_date)
+        rows = demand_rows(report.start_date, report.end_date, report.bucket)
+        with transaction.atomic():
+            DemandReportRow.objects.filter(report_id=report).delete()
+            batch = []
+            for row in rows.iterator(chunk_size=ROW_BATCH_SIZE):
+                batch.append(DemandReportRow(report_id=report, **row))
+                if len(batch) >= ROW_BATCH_SIZE:
+                    DemandReportRow.objects.bulk_create(batch)
+                    batch = []
+            DemandReportRow.objects.bulk_create(batch)
+            report.status = ReportStatus.GENERATED
+            report.completed_at = timezone.now()
+            report.save(update_fields=['status', 'completed_at', 'data_as_of'])
+    except Exception:
+        DemandReport.objects.filter(report_id=report_id).update(status=ReportStatus.FAILED)
+        raise
+    return report
+
+def stream_demand_report(report):
+    # Yields the report as a JSON document without materialising all rows in memory
+    header = {
+        "report_id": str(report.report_id),
+        "start_date": report.start_date,
+        "end_date": report.end_date,
+        "bucket": report.bucket,
+        "status": report.status,
+        "data_as_of": report.data_as_of,
+    }
+    yield json.dumps(header, cls=DjangoJSONEncoder)[:-1] + ', "materials_needed": ['
+    rows = (
+        DemandReportRow.objects.filter(report_id=report)
+        .order_by('period', 'material_type')
+        .values('period', 'material_type', 'requirement_quantity', 'installation_quantity')
+    )
+    separator = ""
+    for row in rows.iterator(chunk_size=ROW_BATCH_SIZE):
+        row['quantity'] = row['requirement_quantity'] + row['installation_quantity']
+        yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+        separator = ", "
+    yield "]}"
@@ -0,0 +1,114 @@
+import datetime
+import gzip
+import json
+import os
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+try:
+    from django_celery_results.models import TaskResult
+except ImportError:
+    TaskResult = None
+
+# Task results (django_celery_results) share mms.db with the business tables.
+# Expired rows are deleted a chunk per transaction with a pause in between, so
+# API writers never wait behind one long delete; freed pages are then handed
+# back to the file system a few at a time with incremental VACUUM.
+
+DEFAULT_RETENTION_HOURS = 24
+DEFAULT_PRUNE_BATCH_SIZE = 1000
+DEFAULT_PRUNE_PAUSE = 0.05
+DEFAULT_VACUUM_PAGES = 2000
+AUTO_VACUUM_INCREMENTAL = 2
+PRUNE_LOCK_KEY = 'mms:retention:prune-lock'
+PRUNE_LOCK_TIMEOUT = 600
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def _archive(path, rows):
+    # gzip members can be appended; the file reads back as one NDJSON stream
+    with gzip.open(path, 'at') as archive:
+        for row in rows:
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+
+def prune_rows(queryset, batch_size=None, pause=None, max_batches=None, archive_path=None):
+    # Deletes the queryset's rows in primary key chunks, each in its own short
+    # transaction on the queryset's database; archive_path keeps a copy of every
+    # deleted row first. Cascades and delete signals run as for any delete; a
+    # model with neither (TaskResult) still gets one plain DELETE per chunk.
+    batch_size = batch_size or _setting('MMS_PRUNE_BATCH_SIZE', DEFAULT_PRUNE_BATCH_SIZE)
+    pause = _setting('MMS_PRUNE_PAUSE', DEFAULT_PRUNE_PAUSE) if pause is None else pause
+    model = queryset.model
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic(using=queryset.db):
+            chunk = model._base_manager.using(queryset.db).filter(pk__in=ids)
+            if archive_path:
+                _archive(archive_path, chunk.values())
+            deleted += chunk.delete()[1].get(model._meta.label, 0)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    return {"deleted": deleted, "batches": batches}
+
+def prune_task_results(now=None, max_batches=None):
+    # Drops results older than MMS_TASK_RESULT_RETENTION_HOURS; with
+    # MMS_TASK_RESULT_ARCHIVE_DIR set they are archived to a gzipped NDJSON file first
+    if TaskResult is None or not cache.add(PRUNE_LOCK_KEY, 1, timeout=PRUNE_LOCK_TIMEOUT):
+        return {"deleted": 0, "batches": 0, "skipped": True}
+    try:
+        hours = _setting('MMS_TASK_RESULT_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)
+        cutoff = (now or timezone.now()) - datetime.timedelta(hours=hours)
+        archive_dir = _setting('MMS_TASK_RESULT_ARCHIVE_DIR', None)
+        archive_path = None
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            archive_path = os.path.join(archive_dir, f"taskresults-{cutoff:%Y%m%d}.ndjson.gz")
+        result = prune_rows(TaskResult.objects.filter(date_done__lt=cutoff), max_batches=max_batches, archive_path=archive_path)
+    finally:
+        cache.delete(PRUNE_LOCK_KEY)
+    return {**result, "skipped": False}
+
+def _pragma(connection, name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
+
+def enable_incremental_vacuum(using=DEFAULT_DB_ALIAS):
+    # One-off for a database created without auto_vacuum: rewrites the whole file
+    # (and locks it while doing so), so run it during a maintenance window
+    with connections[using].cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+
+def incremental_vacuum(max_pages=None, step=None, using=DEFAULT_DB_ALIAS):
+    # Releases up to max_pages free pages, `step` pages per statement, so the
+    # write lock is only held briefly at a time. Runs in autocommit only:
+    # executescript() would commit an open transaction.
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        return {"released_pages": 0, "skipped": True}
+    free_before = _pragma(connection, 'freelist_count')
+    if _pragma(connection, 'auto_vacuum') != AUTO_VACUUM_INCREMENTAL:
+        # Free pages can only be released once enable_incremental_vacuum() has run
+        return {"released_pages": 0, "free_pages": free_before, "skipped": True}
+    max_pages = max_pages or _setting('MMS_VACUUM_PAGES', DEFAULT_VACUUM_PAGES)
+    step = step or max(max_pages // 10, 1)
+    remaining = min(free_before, max_pages)
+    connection.ensure_connection()
+    while remaining > 0:
+        # cursor.execute() steps the pragma once, which frees a single page;
+        # executescript() runs it to completion
+        connection.connection.executescript(f"PRAGMA incremental_vacuum({min(step, remaining)})")
+        remaining -= step
+    free_after = _pragma(connection, 'freelist_count')
+    return {"released_pages": free_before - free_after, "free_pages": free_after, "skipped": False}
@@ -0,0 +1,181 @@
+import contextvars
+import datetime
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .caching import TTLCache
+
+# Read-replica routing. Configure a second database alias and
+#   DATABASE_ROUTERS = ['apps.routers.ReplicaRouter']
+#   MIDDLEWARE += ['apps.routers.ReplicaRoutingMiddleware']
+#   MMS_REPLICA_ALIAS = 'replica'
+# GET/HEAD/OPTIONS requests and blocks wrapped in replica_reads() read from the
+# replica; everything else, any read after the first write of a request, reads
+# inside a primary transaction and reads while the replica is too far behind
+# stay on the primary. For local testing the replica can be a SQLite copy of
+# mms.db refreshed by snapshot_replica_task (see schedules.py).
+
+PIN_COOKIE = 'mms_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = contextvars.ContextVar('mms_db_routing', default=None)
+_lag_cache = TTLCache(maxsize=8, ttl=getattr(settings, 'MMS_REPLICA_LAG_CHECK_SECONDS', 5.0))
+
+class RoutingState:
+    __slots__ = ('replica', 'pinned')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.pinned = False
+
+def replica_alias():
+    alias = getattr(settings, 'MMS_REPLICA_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+def snapshot_lag(alias):
+    # Seconds since the SQLite snapshot was taken; snapshots are swapped in whole,
+    # so the file's mtime is the point in time the replica reflects
+    try:
+        return time.time() - os.path.getmtime(settings.DATABASES[alias]['NAME'])
+    except OSError:
+        return None
+
+def replica_lag(alias):
+    return import_string(getattr(settings, 'MMS_REPLICA_LAG_FUNCTION', 'apps.routers.snapshot_lag'))(alias)
+
+def replica_fresh(alias):
+    # Lag is probed at most every MMS_REPLICA_LAG_CHECK_SECONDS; unknown lag counts as stale
+    fresh = _lag_cache.get(alias)
+    if fresh is None:
+        lag = replica_lag(alias)
+        fresh = lag is not None and lag <= getattr(settings, 'MMS_REPLICA_MAX_LAG_SECONDS', 120)
+        _lag_cache.set(alias, fresh)
+    return fresh
+
+def read_alias():
+    # Where a read made here would go: the replica alias, the primary, or None without a replica
+    alias = replica_alias()
+    if alias is None:
+        return None
+    state = _state.get()
+    if (
+        state is None or not state.replica or state.pinned
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        or not replica_fresh(alias)
+    ):
+        # Explicit, or Django would follow an instance that was read from the replica
+        return DEFAULT_DB_ALIAS
+    return alias
+
+def replica_as_of():
+    # The point in time reads made here see when they go to the replica; None on the primary
+    alias = read_alias()
+    if alias in (None, DEFAULT_DB_ALIAS):
+        return None
+    lag = replica_lag(alias)
+    return None if lag is None else timezone.now() - datetime.timedelta(seconds=lag)
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        alias = replica_alias()
+        if alias is None:
+            return None
+        state = _state.get()
+        if state is not None:
+            # Read your own writes for the rest of the request
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True if replica_alias() else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated itself
+        return False if db == replica_alias() else None
+
+def pin_primary():
+    # For read-then-write paths: the reads that decide a write must see the
+    # primary, not wait for the write to pin the request
+    state = _state.get()
+    if state is not None:
+        state.pinned = True
+
+@contextmanager
+def replica_reads():
+    # Sends reads in the block to the replica until the block writes
+    outer = _state.get()
+    state = RoutingState(replica=outer is None or not outer.pinned)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+        if outer is not None and state.pinned:
+            outer.pinned = True
+
+def _stream_with(state, chunks):
+    # Streamed bodies are iterated after the middleware returns; route them the same way
+    while True:
+        token = _state.set(state)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _state.reset(token)
+        yield chunk
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # How long after a write a client keeps reading from the primary, to cover replica lag
+        self.pin_seconds = getattr(settings, 'MMS_REPLICA_PIN_SECONDS', getattr(settings, 'MMS_REPLICA_MAX_LAG_SECONDS', 120))
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+        state = RoutingState(replica=request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if isinstance(response, StreamingHttpResponse):
+            response.streaming_content = _stream_with(state, iter(response.streaming_content))
+        if state.pinned:
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+def snapshot_sqlite(source, target):
+    # Consistent copy through SQLite's backup API, swapped in with one rename so
+    # readers see either the old snapshot or the new one. Connections opened
+    # before the swap keep reading the old file, so leave the replica alias at
+    # CONN_MAX_AGE = 0.
+    partial = f'{target}.partial'
+    source_db = sqlite3.connect(source)
+    target_db = sqlite3.connect(partial)
+    try:
+        source_db.backup(target_db)
+        target_db.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target_db.close()
+        source_db.close()
+    os.replace(partial, target)
+
+def snapshot_replica():
+    alias = replica_alias()
+    if alias is None or not getattr(settings, 'MMS_REPLICA_SNAPSHOT', False):
+        return {"skipped": True}
+    started = time.monotonic()
+    snapshot_sqlite(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'], settings.DATABASES[alias]['NAME'])
+    _lag_cache.set(alias, True)
+    return {"skipped": False, "seconds": round(time.monotonic() - started, 3)}
@@ -0,0 +1,54 @@
+# Celery beat entries for the MMS app. Merge into the project's settings, e.g.
+#   from apps.schedules import BEAT_SCHEDULE, feed_schedule
+#   CELERY_BEAT_SCHEDULE = {**BEAT_SCHEDULE, **feed_schedule(MMS_ETL_FEEDS)}
+
+BEAT_SCHEDULE = {
+    'relay-outbox': {
+        'task': 'apps.tasks.relay_outbox_task',
+        'schedule': 1.0,
+    },
+    'flush-notifications': {
+        'task': 'apps.tasks.flush_notifications_task',
+        'schedule': 15.0,
+    },
+    # Deadlines are read from an index on due_at, so a frequent tick is cheap when
+    # nothing is due; the interval bounds how late an escalation can fire
+    'fire-escalations': {
+        'task': 'apps.tasks.fire_escalations_task',
+        'schedule': 60.0,
+    },
+    # Only does work with MMS_REPLICA_SNAPSHOT on (a SQLite copy standing in for a replica)
+    'snapshot-replica': {
+        'task': 'apps.tasks.snapshot_replica_task',
+        'schedule': 30.0,
+    },
+    # Expired task results go in short chunks; the vacuum then returns the freed
+    # pages to the file system (see retention.py)
+    'prune-task-results': {
+        'task': 'apps.tasks.prune_task_results_task',
+        'schedule': 60 * 60.0,
+    },
+    'vacuum-database': {
+        'task': 'apps.tasks.vacuum_database_task',
+        'schedule': 6 * 60 * 60.0,
+    },
+    'rebuild-inventory-positions': {
+        'task': 'apps.tasks.rebuild_inventory_positions_task',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'rebuild-order-progress': {
+        'task': 'apps.tasks.rebuild_order_progress_task',
+        'schedule': 24 * 60 * 60.0,
+    },
+}
+
+def feed_schedule(feeds):
+    # One entry per upstream feed (see etl.py) that sets 'every' (seconds)
+    return {
+        f'feed-{name}': {
+            'task': 'apps.tasks.run_feed_task',
+            'schedule': float(feed['every']),
+            'args': (name,),
+        }
+        for name, feed in feeds.items() if feed.get('every')
+    }
@@ -1,60 +1,181 @@
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from .instrumentation import TimedSerializerMixin
 from .models import (
     Material, Requirement, InstallationRequirement, Widget, Shipment,
-    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder,
+    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder, StatusTransition, FeedRun,
     MaterialStatus, RequirementStatus, WidgetStatus, ShipmentStatus, InspectionResult
 )
 
-class MaterialSerializer(serializers.ModelSerializer):
+class BulkListSerializer(serializers.ListSerializer):
+    # Validates every row independently so one bad row doesn't reject the batch;
+    # foreign keys are checked with one query per chunk instead of one per row
+    fk_chunk_size = 500
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ["Expected a list of items."]})
+        self.row_errors = {}
+        rows = []
+        for index, item in enumerate(data):
+            try:
+                rows.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                self.row_errors[index] = exc.detail
+        for field in self.child.Meta.model._meta.concrete_fields:
+            if field.is_relation and field.name in self.child.fields:
+                rows = self._check_foreign_key(field, rows)
+        self.row_indexes = [index for index, _ in rows]
+        return [row for _, row in rows]
+
+    def _check_foreign_key(self, field, rows):
+        values = list({row[field.name] for _, row in rows if row.get(field.name) is not None})
+        existing = set()
+        for start in range(0, len(values), self.fk_chunk_size):
+            chunk = values[start:start + self.fk_chunk_size]
+            existing.update(field.related_model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        valid = []
+        for index, row in rows:
+            value = row.get(field.name)
+            if value is not None and value not in existing:
+                self.row_errors[index] = {field.name: [f'Invalid pk "{value}" - object does not exist.']}
+            else:
+                valid.append((index, row))
+        return valid
+
+    def build_instances(self):
+        # Unsaved model instances for bulk_create; FK values are assigned by attname
+        model = self.child.Meta.model
+        attnames = {
+            field.name: field.attname
+            for field in model._meta.concrete_fields if field.is_relation
+        }
+        return [
+            model(**{attnames.get(name, name): value for name, value in row.items()})
+            for row in self.validated_data
+        ]
+
+class TimedModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Reports its time to the request instrumentation when that is switched on
+    pass
+
+class ExpandableModelSerializer(TimedModelSerializer):
+    # Swaps foreign key ids for nested objects when the view lists the field in
+    # context['expand']; the view select_related()s those fields up front
+    expand_serializers = {}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        nested_context = {**self.context, 'expand': ()}
+        for field in self.context.get('expand', ()):
+            if field in self.expand_serializers:
+                related = getattr(instance, field)
+                data[field] = self.expand_serializers[field](related, context=nested_context).data if related else None
+        return data
+
+class MaterialSerializer(TimedModelSerializer):
     class Meta:
         model = Material
         fields = ['material_id', 'type', 'quantity', 'status', 'created_at']
         read_only_fields = ['material_id', 'created_at']
 
-class RequirementSerializer(serializers.ModelSerializer):
+class RequirementSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer}
+
     class Meta:
         model = Requirement
         fields = ['req_id', 'material_id', 'quantity', 'delivery_date', 'status', 'created_at']
         read_only_fields = ['req_id', 'created_at']
 
-class InstallationRequirementSerializer(serializers.ModelSerializer):
+class InstallationRequirementSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer}
+
     class Meta:
         model = InstallationRequirement
         fields = ['inst_req_id', 'material_id', 'quantity', 'fab_date', 'created_at']
         read_only_fields = ['inst_req_id', 'created_at']
 
-class WidgetSerializer(serializers.ModelSerializer):
+class WidgetSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer}
+
     class Meta:
         model = Widget
         fields = ['widget_id', 'material_id', 'status', 'created_at']
         read_only_fields = ['widget_id', 'created_at']
 
-class ShipmentSerializer(serializers.ModelSerializer):
+class ShipmentSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer, 'widget_id': WidgetSerializer}
+
     class Meta:
         model = Shipment
         fields = ['shipment_id', 'material_id', 'widget_id', 'tracking_id', 'customer_id', 'status', 'created_at']
         read_only_fields = ['shipment_id', 'created_at']
 
-class InspectionSerializer(serializers.ModelSerializer):
+class InspectionSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer, 'widget_id': WidgetSerializer}
+
     class Meta:
         model = Inspection
         fields = ['inspection_id', 'material_id', 'widget_id', 'result', 'defects', 'created_at']
         read_only_fields = ['inspection_id', 'created_at']
 
-class MaintenanceRecordSerializer(serializers.ModelSerializer):
+class MaintenanceRecordSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer}
+
     class Meta:
         model = MaintenanceRecord
         fields = ['maint_id', 'material_id', 'date', 'condition', 'created_at']
         read_only_fields = ['maint_id', 'created_at']
 
-class InventoryRecordSerializer(serializers.ModelSerializer):
+class InventoryRecordSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer}
+
     class Meta:
         model = InventoryRecord
         fields = ['inv_id', 'material_id', 'location', 'last_checked', 'created_at']
         read_only_fields = ['inv_id', 'created_at']
 
-class CustomerOrderSerializer(serializers.ModelSerializer):
+class CustomerOrderSerializer(ExpandableModelSerializer):
+    expand_serializers = {'material_id': MaterialSerializer, 'widget_id': WidgetSerializer}
+
     class Meta:
         model = CustomerOrder
         fields = ['order_id', 'material_id', 'widget_id', 'customer_id', 'status', 'created_at']
-        read_only_fields = ['order_id', 'created_at']
\ No newline at end of file
+        read_only_fields = ['order_id', 'created_at']
+
+class BulkMaterialSerializer(TimedModelSerializer):
+    class Meta:
+        model = Material
+        fields = ['type', 'quantity', 'status']
+        list_serializer_class = BulkListSerializer
+
+class BulkRequirementSerializer(TimedModelSerializer):
+    material_id = serializers.UUIDField()
+
+    class Meta:
+        model = Requirement
+        fields = ['material_id', 'quantity', 'delivery_date']
+        list_serializer_class = BulkListSerializer
+
+class BulkInstallationRequirementSerializer(TimedModelSerializer):
+    material_id = serializers.UUIDField()
+
+    class Meta:
+        model = InstallationRequirement
+        fields = ['material_id', 'quantity', 'fab_date']
+        list_serializer_class = BulkListSerializer
+
+class StatusTransitionSerializer(TimedModelSerializer):
+    entity = serializers.CharField(source='get_entity_type_display', read_only=True)
+
+    class Meta:
+        model = StatusTransition
+        fields = ['id', 'entity', 'entity_id', 'from_status', 'to_status', 'dwell_seconds', 'created_at']
+
+class FeedRunSerializer(TimedModelSerializer):
+    class Meta:
+        model = FeedRun
+        fields = [
+            'run_id', 'feed', 'status', 'rows_read', 'created', 'updated', 'unchanged', 'rejected',
+            'rows_per_second', 'peak_memory_bytes', 'memory_growth_bytes', 'errors', 'created_at', 'finished_at',
+        ]
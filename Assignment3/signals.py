@@ -0,0 +1,214 @@
+import threading
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .escalations import cancel_escalations, track_status
+from .inventory import material_location, move_material
+from .history import record_transition
+from .models import (
+    Material, Requirement, InstallationRequirement, InventoryRecord,
+    CustomerOrder, Widget, Shipment, Inspection, TransitionEntity, EscalationKind
+)
+from .progress import refresh_order_progress
+from .reports import invalidate_all_demand, invalidate_demand_days
+
+# Keep cached demand buckets consistent with requirement writes (old and new dates on update)
+
+@receiver(pre_save, sender=Requirement)
+def requirement_pre_save(sender, instance, **kwargs):
+    instance._before = None
+    if not instance._state.adding:
+        instance._before = Requirement.objects.filter(pk=instance.pk).values('delivery_date', 'status').first()
+        invalidate_demand_days([instance._before['delivery_date'] if instance._before else None])
+
+@receiver(post_save, sender=Requirement)
+@receiver(post_delete, sender=Requirement)
+def requirement_changed(sender, instance, **kwargs):
+    invalidate_demand_days([instance.delivery_date])
+
+@receiver(pre_save, sender=InstallationRequirement)
+def installation_requirement_pre_save(sender, instance, **kwargs):
+    if not instance._state.adding:
+        old_date = InstallationRequirement.objects.filter(pk=instance.pk).values_list('fab_date', flat=True).first()
+        invalidate_demand_days([old_date])
+
+@receiver(post_save, sender=InstallationRequirement)
+@receiver(post_delete, sender=InstallationRequirement)
+def installation_requirement_changed(sender, instance, **kwargs):
+    invalidate_demand_days([instance.fab_date])
+
+@receiver(pre_save, sender=Material)
+def material_pre_save(sender, instance, update_fields=None, **kwargs):
+    instance._inventory_before = None
+    if instance._state.adding:
+        return
+    before = Material.objects.filter(pk=instance.pk).values('type', 'status', 'quantity').first()
+    instance._inventory_before = before
+    if before and before['type'] != instance.type and (update_fields is None or 'type' in update_fields):
+        invalidate_all_demand()
+
+@receiver(post_save, sender=Material)
+def material_saved(sender, instance, created, update_fields=None, **kwargs):
+    before = getattr(instance, '_inventory_before', None)
+    after = {field: getattr(instance, field) for field in ('type', 'status', 'quantity')}
+    if before and update_fields is not None:
+        # Columns left out of update_fields keep their stored values
+        after = {field: after[field] if field in update_fields else before[field] for field in after}
+    location = "" if created else material_location(instance.pk)
+    move_material(
+        (before['type'], before['status'], location, before['quantity']) if before else None,
+        (after['type'], after['status'], location, after['quantity']),
+    )
+    if created:
+        record_transition(TransitionEntity.MATERIAL, instance.pk, "", instance.status, at=instance.created_at)
+    elif before and before['status'] != after['status']:
+        record_transition(
+            TransitionEntity.MATERIAL, instance.pk, before['status'], after['status'], entered_at=instance.created_at
+        )
+
+@receiver(post_delete, sender=Material)
+def material_deleted(sender, instance, **kwargs):
+    move_material((instance.type, instance.status, material_location(instance.pk), instance.quantity), None)
+
+# Inventory records decide where a material sits; moving one moves the material's quantity
+
+def _material_ids(instance):
+    ids = {instance.material_id_id}
+    if not instance._state.adding:
+        ids.update(InventoryRecord.objects.filter(pk=instance.pk).values_list('material_id', flat=True))
+    return ids
+
+# Location each material's position sits at, captured before an inventory record
+# changes and applied once afterwards. A cascade or queryset delete sends every
+# pre_delete before any post_delete, so the records of one material all capture
+# the same location; the first post_delete moves the position and the rest find
+# nothing pending.
+_pending = threading.local()
+
+def _pending_locations():
+    if not hasattr(_pending, 'locations'):
+        _pending.locations = {}
+    return _pending.locations
+
+def _relocate(material_ids):
+    pending = _pending_locations()
+    for material_id in material_ids:
+        if material_id not in pending:
+            continue
+        before = pending.pop(material_id)
+        after = material_location(material_id)
+        if after == before:
+            continue
+        material = Material.objects.filter(pk=material_id).values('type', 'status', 'quantity').first()
+        if material:
+            move_material(
+                (material['type'], material['status'], before, material['quantity']),
+                (material['type'], material['status'], after, material['quantity']),
+            )
+
+@receiver(pre_save, sender=InventoryRecord)
+@receiver(pre_delete, sender=InventoryRecord)
+def inventory_record_pre_change(sender, instance, **kwargs):
+    instance._relocated_ids = _material_ids(instance)
+    pending = _pending_locations()
+    for material_id in instance._relocated_ids:
+        pending[material_id] = material_location(material_id)
+
+@receiver(post_save, sender=InventoryRecord)
+@receiver(post_delete, sender=InventoryRecord)
+def inventory_record_changed(sender, instance, **kwargs):
+    _relocate(getattr(instance, '_relocated_ids', ()))
+
+# Order progress follows the order's widget, its inspections and its shipments
+
+@receiver(post_save, sender=CustomerOrder)
+def customer_order_saved(sender, instance, **kwargs):
+    refresh_order_progress(order_ids=[instance.pk])
+
+@receiver(post_save, sender=Widget)
+def widget_saved(sender, instance, created, **kwargs):
+    if not created:
+        refresh_order_progress(widget_ids=[instance.pk])
+
+@receiver(pre_delete, sender=Widget)
+def widget_pre_delete(sender, instance, **kwargs):
+    # Deleting the widget nulls the orders' widget_id with a bulk update that sends no signals
+    instance._order_ids = list(CustomerOrder.objects.filter(widget_id=instance.pk).values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Widget)
+def widget_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_order_ids', None):
+        refresh_order_progress(order_ids=instance._order_ids)
+
+# Stored values the receivers below compare against, read in one query per save
+BEFORE_FIELDS = {
+    Widget: ['status'],
+    Shipment: ['status', 'widget_id'],
+    Inspection: ['widget_id'],
+    CustomerOrder: ['status'],
+}
+
+@receiver(pre_save, sender=Widget)
+@receiver(pre_save, sender=Shipment)
+@receiver(pre_save, sender=Inspection)
+@receiver(pre_save, sender=CustomerOrder)
+def stash_before(sender, instance, **kwargs):
+    instance._before = None
+    if not instance._state.adding:
+        instance._before = sender.objects.filter(pk=instance.pk).values(*BEFORE_FIELDS[sender]).first()
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_delete, sender=Shipment)
+@receiver(post_save, sender=Inspection)
+@receiver(post_delete, sender=Inspection)
+def widget_event_changed(sender, instance, **kwargs):
+    before = getattr(instance, '_before', None) or {}
+    widget_ids = {instance.widget_id_id, before.get('widget_id')} - {None}
+    if widget_ids:
+        refresh_order_progress(widget_ids=widget_ids)
+
+# Status changes are appended to the transition log in the writer's transaction
+
+TRANSITION_ENTITIES = {
+    Widget: TransitionEntity.WIDGET,
+    Shipment: TransitionEntity.SHIPMENT,
+    CustomerOrder: TransitionEntity.ORDER,
+}
+
+@receiver(post_save, sender=Widget)
+@receiver(post_save, sender=Shipment)
+@receiver(post_save, sender=CustomerOrder)
+def status_saved(sender, instance, created, update_fields=None, **kwargs):
+    entity_type = TRANSITION_ENTITIES[sender]
+    before = getattr(instance, '_before', None)
+    if created:
+        record_transition(entity_type, instance.pk, "", instance.status, at=instance.created_at)
+    elif before and before['status'] != instance.status and (update_fields is None or 'status' in update_fields):
+        record_transition(entity_type, instance.pk, before['status'], instance.status, entered_at=instance.created_at)
+
+# Escalation deadlines follow the status that is waiting on someone else
+
+ESCALATION_KINDS = {
+    Requirement: EscalationKind.FEEDBACK,
+    Material: EscalationKind.MATERIAL_INSPECTION,
+    Widget: EscalationKind.WIDGET_INSPECTION,
+    Shipment: EscalationKind.SHIPPING,
+}
+
+@receiver(post_save, sender=Requirement)
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Widget)
+@receiver(post_save, sender=Shipment)
+def escalation_status_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Material stashes its prior state for inventory upkeep, the others in _before
+    before = getattr(instance, '_inventory_before' if sender is Material else '_before', None)
+    before_status = before['status'] if before else None
+    after_status = instance.status if update_fields is None or 'status' in update_fields else before_status
+    track_status(ESCALATION_KINDS[sender], instance.pk, before_status, after_status,
+                 since=instance.created_at if created else None)
+
+@receiver(post_delete, sender=Requirement)
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Widget)
+@receiver(post_delete, sender=Shipment)
+def escalation_entity_deleted(sender, instance, **kwargs):
+    cancel_escalations(ESCALATION_KINDS[sender], [instance.pk])
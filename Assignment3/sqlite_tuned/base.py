@@ -0,0 +1,38 @@
+from django.db.backends.sqlite3 import base
+
+# SQLite tuned for mms.db, which API workers, admin and the Celery result
+# backend all write to. Use as the database ENGINE:
+#   DATABASES = {'default': {'ENGINE': 'apps.sqlite_tuned', 'NAME': BASE_DIR / 'mms.db'}}
+# Every new connection switches the file to WAL, so readers never block the
+# writer, and applies the pragmas below; OPTIONS['pragmas'] overrides any of
+# them. Transactions start with BEGIN IMMEDIATE unless OPTIONS['transaction_mode']
+# says otherwise: a deferred transaction that reads and then writes can fail with
+# "database is locked" at once, because busy_timeout can't resolve a lock upgrade.
+DEFAULT_PRAGMAS = {
+    # Takes effect when the file is created (or by retention.enable_incremental_vacuum),
+    # and only ahead of the switch to WAL; lets retention.incremental_vacuum hand the
+    # pages freed by pruning back a few at a time
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    # WAL with NORMAL stays consistent after a crash; only the last commits can be lost
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # Negative sizes are KiB: a 64 MB page cache per connection
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **params.pop('pragmas', {})}
+        if 'transaction_mode' not in self.settings_dict['OPTIONS']:
+            self.transaction_mode = 'IMMEDIATE'
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
@@ -1,37 +1,125 @@
 from celery import shared_task
-import time
+from .escalations import fire_due_escalations
+from .etl import run_feed
+from .models import EscalationKind
+from .notifications import (
+    PROCUREMENT, ENGINEER, FABRICATION, WAREHOUSE, SHIPPING, INSPECTION_MANAGER, SALES,
+    flush_notifications, queue_notification
+)
+from .inventory import rebuild_inventory_positions
+from .outbox import relay_outbox
+from .progress import refresh_order_progress
+from .reports import build_demand_report
+from .retention import incremental_vacuum, prune_task_results
+from .routers import snapshot_replica
 
-@shared_task
-def notify_procurement_task(message):
-    time.sleep(1)  # Simulate processing
-    print(f"Procurement Notification: {message}")
+# notify_* tasks only buffer the message; flush_notifications_task (see
+# schedules.py) coalesces each recipient's backlog into one digest per window.
+# The Celery task id (the outbox id) keys the buffered row, so a task the
+# outbox relay re-sends is stored once. Nobody reads their return values, so
+# these and the frequent beat tasks skip the result backend (ignore_result).
+
+@shared_task(bind=True, ignore_result=True)
+def notify_procurement_task(self, message):
+    queue_notification(PROCUREMENT, message, notification_id=self.request.id)
+
+@shared_task(bind=True, ignore_result=True)
+def notify_engineer_task(self, message):
+    queue_notification(ENGINEER, message, notification_id=self.request.id)
+
+@shared_task(bind=True, ignore_result=True)
+def notify_fabrication_task(self, message):
+    queue_notification(FABRICATION, message, notification_id=self.request.id)
+
+@shared_task(bind=True, ignore_result=True)
+def notify_warehouse_task(self, message):
+    queue_notification(WAREHOUSE, message, notification_id=self.request.id)
+
+@shared_task(bind=True, ignore_result=True)
+def notify_shipping_task(self, message):
+    queue_notification(SHIPPING, message, notification_id=self.request.id)
 
 @shared_task
-def notify_engineer_task(message):
-    time.sleep(1)  # Simulate processing
-    print(f"Engineer Notification: {message}")
+def generate_demand_report_task(report_id, start_date, end_date):
+    build_demand_report(report_id)
+    print(f"Generated report {report_id} for dates {start_date} to {end_date}")
+
+@shared_task(bind=True, ignore_result=True)
+def send_notification_task(self, recipient_id, message):
+    queue_notification(recipient_id, message, notification_id=self.request.id)
+
+@shared_task(ignore_result=True)
+def flush_notifications_task():
+    result = flush_notifications()
+    print(f"Flushed {result['delivered']} notifications in {result['digests']} digests")
+    return result
+
+
+@shared_task(ignore_result=True)
+def relay_outbox_task():
+    return relay_outbox()
 
 @shared_task
-def notify_fabrication_task(message):
-    time.sleep(1)  # Simulate processing
-    print(f"Fabrication Notification: {message}")
+def rebuild_inventory_positions_task():
+    rebuild_inventory_positions()
 
 @shared_task
-def notify_warehouse_task(message):
-    time.sleep(1)  # Simulate processing
-    print(f"Warehouse Notification: {message}")
+def rebuild_order_progress_task():
+    refresh_order_progress()
+
+@shared_task(ignore_result=True)
+def snapshot_replica_task():
+    return snapshot_replica()
 
 @shared_task
-def notify_shipping_task(message):
-    time.sleep(1)  # Simulate processing
-    print(f"Shipping Notification: {message}")
+def prune_task_results_task():
+    return prune_task_results()
 
 @shared_task
-def generate_demand_report_task(report_id, start_date, end_date):
-    time.sleep(2)  # Simulate report generation
-    print(f"Generated report {report_id} for dates {start_date} to {end_date}")
+def vacuum_database_task():
+    return incremental_vacuum()
+
+# Escalations are fired in batches by fire_escalations_task; each call carries every
+# due entity of one kind from a batch, and is buffered like the notify_* tasks.
+
+def _escalation_message(kind, entity_ids):
+    return f"Escalation: {len(entity_ids)} past deadline ({EscalationKind(kind).label}): {', '.join(entity_ids)}"
+
+@shared_task(bind=True, ignore_result=True)
+def escalate_delay_task(self, kind, requirement_ids):
+    queue_notification(ENGINEER, _escalation_message(kind, requirement_ids), notification_id=self.request.id)
+
+@shared_task(bind=True, ignore_result=True)
+def escalate_inspection_task(self, kind, entity_ids):
+    queue_notification(INSPECTION_MANAGER, _escalation_message(kind, entity_ids), notification_id=self.request.id)
+
+@shared_task(bind=True, ignore_result=True)
+def escalate_shipping_task(self, kind, shipment_ids):
+    queue_notification(SALES, _escalation_message(kind, shipment_ids), notification_id=self.request.id)
+
+ESCALATION_TASKS = {
+    EscalationKind.FEEDBACK: escalate_delay_task,
+    EscalationKind.MATERIAL_INSPECTION: escalate_inspection_task,
+    EscalationKind.WIDGET_INSPECTION: escalate_inspection_task,
+    EscalationKind.SHIPPING: escalate_shipping_task,
+}
+
+@shared_task(ignore_result=True)
+def fire_escalations_task():
+    return fire_due_escalations(ESCALATION_TASKS)
+
+# Upstream feeds (etl.py); each run tells the team that owns the target what changed
+
+FEED_NOTIFY_TASKS = {
+    'material': notify_warehouse_task,
+    'requirement': notify_procurement_task,
+    'installation_requirement': notify_warehouse_task,
+}
 
 @shared_task
-def send_notification_task(recipient_id, message):
-    time.sleep(1)  # Simulate sending notification
-    print(f"Notification sent to {recipient_id}: {message}")
\ No newline at end of file
+def run_feed_task(name):
+    result = run_feed(name, FEED_NOTIFY_TASKS)
+    if not result['skipped']:
+        print(f"Feed {name}: {result['rows_read']} rows at {result['rows_per_second']} rows/s, "
+              f"peak memory {result['peak_memory_bytes']} bytes")
+    return result
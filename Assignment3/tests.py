@@ -1,12 +1,57 @@
 
-from django.test import TestCase
-from rest_framework.test import APIClient
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from .models import (
     Material, Requirement, InstallationRequirement, Widget, Shipment,
-    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder
+    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder, DemandReport, Notification, TaskOutbox,
+    InventoryPosition, OrderProgress, StatusTransition, TransitionEntity, Escalation, EscalationKind,
+    FeedRowState, FeedRun, FeedRunStatus, DemandDay
 )
+from .notifications import flush_notifications, notification_stats
+from .inventory import InsufficientQuantity, _position_cache, inventory_positions, issue_material, rebuild_inventory_positions
+from .outbox import enqueue_task, relay_outbox
+from .tasks import ESCALATION_TASKS, FEED_NOTIFY_TASKS, escalate_delay_task, notify_shipping_task, notify_warehouse_task
+from . import reports
+from .reports import build_demand_report, demand_rows, fill_demand_buckets
+from .history import dwell_rows, record_transition
+from .escalations import fire_due_escalations
+from .instrumentation import registry
+from .sqlite_tuned.base import DatabaseWrapper as TunedDatabaseWrapper
+from .write_queue import WriteQueue
+from .keys import uuid7
+from .etl import feed_key, mock_http_feed, openpyxl, run_feed
+from .schedules import feed_schedule
+from .retention import enable_incremental_vacuum, incremental_vacuum, prune_rows, prune_task_results
+from .pagination import KeysetPagination
+from .views import (
+    CustomerOrderViewSet, FeedRunViewSet, InspectionViewSet, InstallationRequirementViewSet, InventoryRecordViewSet,
+    MaintenanceRecordViewSet, MaterialViewSet, RequirementViewSet, ShipmentViewSet, StatusTransitionViewSet, WidgetViewSet
+)
+from .progress import order_progress
+from .routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, replica_reads, snapshot_sqlite
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.db.models import Q, Sum
+import base64
+import datetime
+import gzip
+import json
+import os
+import pstats
+import sqlite3
+import tempfile
+import threading
+import time
 import uuid
-from unittest.mock import patch
+from unittest import skipIf
+from unittest.mock import ANY, patch
 
 class MMSTestCase(TestCase):
     def setUp(self):
@@ -68,7 +113,7 @@ class MMSTestCase(TestCase):
         )
 
     # Material Tests
-    @patch('apps.views.notify_warehouse_task.delay')
+    @patch('apps.views.notify_warehouse_task.apply_async')
     def test_create_material_arrival(self, mock_notify):
         response = self.client.post(
             '/api/materials/arrival/',
@@ -77,7 +122,8 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data['status'], "Received")
-        mock_notify.assert_called_once_with("Inspection task assigned for material arrival.")
+        relay_outbox()
+        mock_notify.assert_called_once_with(args=["Inspection task assigned for material arrival."], kwargs={}, task_id=ANY)
 
     def test_update_material_storage(self):
         response = self.client.put(
@@ -88,8 +134,15 @@ class MMSTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         material = Material.objects.get(material_id=self.material.material_id)
         self.assertEqual(material.status, "Stored")
+        # Moving it again adds a record; the earlier locations are kept
+        locations = list(InventoryRecord.objects.filter(material_id=material).order_by('created_at').values_list('location', flat=True))
+        self.client.put(f'/api/materials/{self.material.material_id}/store/', {"location": "Aisle 9"}, format='json')
+        self.assertEqual(
+            list(InventoryRecord.objects.filter(material_id=material).order_by('created_at').values_list('location', flat=True)),
+            locations + ["Aisle 9"],
+        )
 
-    @patch('apps.views.notify_fabrication_task.delay')
+    @patch('apps.views.notify_fabrication_task.apply_async')
     def test_issue_material(self, mock_notify):
         response = self.client.post(
             '/api/materials/issue/',
@@ -100,14 +153,15 @@ class MMSTestCase(TestCase):
         material = Material.objects.get(material_id=self.material.material_id)
         self.assertEqual(material.status, "Issued")
         self.assertEqual(material.quantity, 50)
-        mock_notify.assert_called_once_with(f"Material {self.material.material_id} issued for fabrication.")
+        relay_outbox()
+        mock_notify.assert_called_once_with(args=[f"Material {self.material.material_id} issued for fabrication."], kwargs={}, task_id=ANY)
 
     def test_delete_material(self):
         response = self.client.delete(f'/api/materials/{self.material.material_id}/')
         self.assertEqual(response.status_code, 204)
         self.assertFalse(Material.objects.filter(material_id=self.material.material_id).exists())
 
-    @patch('apps.views.generate_demand_report_task.delay')
+    @patch('apps.views.generate_demand_report_task.apply_async')
     def test_generate_material_demand_report(self, mock_task):
         response = self.client.post(
             '/api/materials/report/',
@@ -116,10 +170,11 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['status'], "Generating")
+        relay_outbox()
         mock_task.assert_called_once()
 
     # Requirement Tests
-    @patch('apps.views.notify_procurement_task.delay')
+    @patch('apps.views.notify_procurement_task.apply_async')
     def test_submit_requirement(self, mock_notify):
         response = self.client.post(
             '/api/requirements/',
@@ -132,9 +187,10 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data['status'], "Draft")
+        relay_outbox()
         mock_notify.assert_called_once()
 
-    @patch('apps.views.notify_engineer_task.delay')
+    @patch('apps.views.notify_engineer_task.apply_async')
     def test_provide_requirement_feedback(self, mock_notify):
         response = self.client.post(
             f'/api/requirements/{self.requirement.req_id}/feedback/',
@@ -143,9 +199,10 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['status'], "Feedback")
+        relay_outbox()
         mock_notify.assert_called_once()
 
-    @patch('apps.views.notify_fabrication_task.delay')
+    @patch('apps.views.notify_fabrication_task.apply_async')
     def test_finalize_requirement(self, mock_notify):
         self.requirement.status = "Feedback"
         self.requirement.save()
@@ -160,10 +217,11 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['status'], "Finalized")
+        relay_outbox()
         mock_notify.assert_called_once()
 
     # InstallationRequirement Tests
-    @patch('apps.views.notify_warehouse_task.delay')
+    @patch('apps.views.notify_warehouse_task.apply_async')
     def test_submit_installation_requirement(self, mock_notify):
         response = self.client.post(
             '/api/installation_requirements/',
@@ -171,6 +229,7 @@ class MMSTestCase(TestCase):
             format='json'
         )
         self.assertEqual(response.status_code, 201)
+        relay_outbox()
         mock_notify.assert_called_once()
 
     def test_update_installation_requirement(self):
@@ -213,7 +272,7 @@ class MMSTestCase(TestCase):
         self.assertEqual(updated.status, "Inspected")
 
     # Shipment Tests
-    @patch('apps.views.notify_shipping_task.delay')
+    @patch('apps.views.notify_shipping_task.apply_async')
     def test_prepare_shipment(self, mock_notify):
         self.widget.status = "Inspected"
         self.widget.save()
@@ -224,9 +283,10 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data['status'], "Shipped")
+        relay_outbox()
         mock_notify.assert_called_once()
 
-    @patch('apps.views.notify_shipping_task.delay')
+    @patch('apps.views.notify_shipping_task.apply_async')
     def test_confirm_shipment_delivery(self, mock_notify):
         response = self.client.post(
             '/api/shipments/confirm/',
@@ -236,10 +296,11 @@ class MMSTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         updated = Shipment.objects.get(shipment_id=self.shipment.shipment_id)
         self.assertEqual(updated.status, "Delivered")
+        relay_outbox()
         mock_notify.assert_called_once()
 
     # Inspection Tests
-    @patch('apps.views.notify_warehouse_task.delay')
+    @patch('apps.views.notify_warehouse_task.apply_async')
     def test_material_inspection_pass(self, mock_notify):
         self.material.status = "Received"
         self.material.save()
@@ -257,9 +318,10 @@ class MMSTestCase(TestCase):
         self.assertEqual(response.status_code, 201)
         material = Material.objects.get(material_id=self.material.material_id)
         self.assertEqual(material.status, "Stored")
+        relay_outbox()
         mock_notify.assert_called_once()
 
-    @patch('apps.views.notify_procurement_task.delay')
+    @patch('apps.views.notify_procurement_task.apply_async')
     def test_flag_material_defects(self, mock_notify):
         response = self.client.post(
             f'/api/inspections/{self.inspection.inspection_id}/flag/',
@@ -268,6 +330,7 @@ class MMSTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['status'], "Notified")
+        relay_outbox()
         mock_notify.assert_called_once()
 
     # MaintenanceRecord Tests
@@ -346,4 +409,1465 @@ class MMSTestCase(TestCase):
         response = self.client.get(f'/api/orders/{self.customer_order.order_id}/progress/')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['progress_percentage'], 75)
-        self.assertEqual(response.data['status'], "Shipped")
\ No newline at end of file
+        self.assertEqual(response.data['status'], "Shipped")
+
+class DemandReportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.steel = Material.objects.create(type="steel", quantity=100)
+        self.pipe = Material.objects.create(type="pipe", quantity=40)
+        Requirement.objects.create(material_id=self.steel, quantity=10, delivery_date="2025-06-02")
+        Requirement.objects.create(material_id=self.steel, quantity=5, delivery_date="2025-06-02")
+        Requirement.objects.create(material_id=self.pipe, quantity=7, delivery_date="2025-06-04")
+        InstallationRequirement.objects.create(material_id=self.steel, quantity=3, fab_date="2025-06-09")
+
+    def _report(self, start_date, end_date, bucket="day"):
+        report = DemandReport.objects.create(start_date=start_date, end_date=end_date, bucket=bucket)
+        build_demand_report(report.report_id)
+        return list(report.rows.order_by('period', 'material_type').values(
+            'period', 'material_type', 'requirement_quantity', 'installation_quantity'))
+
+    def test_daily_report_aggregates_by_type(self):
+        rows = self._report(datetime.date(2025, 6, 1), datetime.date(2025, 6, 30))
+        self.assertEqual(rows, [
+            {"period": datetime.date(2025, 6, 2), "material_type": "steel", "requirement_quantity": 15, "installation_quantity": 0},
+            {"period": datetime.date(2025, 6, 4), "material_type": "pipe", "requirement_quantity": 7, "installation_quantity": 0},
+            {"period": datetime.date(2025, 6, 9), "material_type": "steel", "requirement_quantity": 0, "installation_quantity": 3},
+        ])
+
+    def test_weekly_report_buckets_by_week(self):
+        rows = self._report(datetime.date(2025, 6, 1), datetime.date(2025, 6, 30), bucket="week")
+        self.assertEqual([(r['period'], r['material_type']) for r in rows], [
+            (datetime.date(2025, 6, 2), "pipe"),
+            (datetime.date(2025, 6, 2), "steel"),
+            (datetime.date(2025, 6, 9), "steel"),
+        ])
+
+    def test_overlapping_reports_reuse_and_invalidate_buckets(self):
+        self._report(datetime.date(2025, 6, 1), datetime.date(2025, 6, 10))
+        self.assertEqual(fill_demand_buckets(datetime.date(2025, 6, 5), datetime.date(2025, 6, 12)), 2)
+        Requirement.objects.create(material_id=self.steel, quantity=20, delivery_date="2025-06-02")
+        rows = self._report(datetime.date(2025, 6, 2), datetime.date(2025, 6, 2))
+        self.assertEqual(rows[0]['requirement_quantity'], 35)
+
+    def test_write_between_read_and_store_is_not_lost(self):
+        read_totals = reports._read_totals
+        calls = []
+
+        def read_then_write(days):
+            result = read_totals(days)
+            calls.append(days)
+            if len(calls) == 1:
+                # Saved after the sums were read, before the buckets are stored
+                Requirement.objects.create(material_id=self.steel, quantity=20, delivery_date="2025-06-02")
+            return result
+
+        with patch('apps.reports._read_totals', side_effect=read_then_write):
+            rows = self._report(datetime.date(2025, 6, 1), datetime.date(2025, 6, 3))
+        self.assertEqual(rows[0]['requirement_quantity'], 35)
+        # Only the day written to was read again
+        self.assertEqual(calls[1], [datetime.date(2025, 6, 2)])
+        self.assertEqual(set(DemandDay.objects.filter(ready=True).values_list('day', flat=True)), {
+            datetime.date(2025, 6, 1), datetime.date(2025, 6, 2), datetime.date(2025, 6, 3),
+        })
+
+    @patch('apps.views.generate_demand_report_task.apply_async')
+    def test_poll_demand_report(self, mock_task):
+        response = self.client.post(
+            '/api/materials/report/',
+            {"start_date": "2025-06-01", "end_date": "2025-06-30"},
+            format='json'
+        )
+        report_id = response.data['report_id']
+        response = self.client.get(f'/api/materials/report/{report_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b"".join(response.streaming_content))['status'], "Generating")
+        build_demand_report(report_id)
+        response = self.client.get(f'/api/materials/report/{report_id}/')
+        body = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(body['status'], "Generated")
+        self.assertEqual(body['materials_needed'][0]['quantity'], 15)
+
+    def test_poll_unknown_report(self):
+        response = self.client.get(f'/api/materials/report/{uuid.uuid4()}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkIngestTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.material = Material.objects.create(type="steel", quantity=100)
+
+    @patch('apps.views.notify_warehouse_task.apply_async')
+    def test_bulk_create_materials(self, mock_notify):
+        response = self.client.post(
+            '/api/materials/bulk/',
+            [{"type": "pipe", "quantity": 10}, {"type": "valve", "quantity": 4}],
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Material.objects.count(), 3)
+        relay_outbox()
+        mock_notify.assert_called_once()
+
+    @patch('apps.views.notify_procurement_task.apply_async')
+    def test_bulk_requirements_report_row_errors(self, mock_notify):
+        response = self.client.post(
+            '/api/requirements/bulk/',
+            [
+                {"material_id": str(self.material.material_id), "quantity": 10, "delivery_date": "2025-06-01"},
+                {"material_id": str(uuid.uuid4()), "quantity": 5, "delivery_date": "2025-06-01"},
+                {"material_id": str(self.material.material_id), "delivery_date": "2025-06-02"},
+            ],
+            format='json'
+        )
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('material_id', response.data['errors'][0]['errors'])
+        self.assertIn('quantity', response.data['errors'][1]['errors'])
+        self.assertEqual(Requirement.objects.get().status, "Draft")
+        relay_outbox()
+        mock_notify.assert_called_once_with(args=["1 new requirements created."], kwargs={}, task_id=ANY)
+
+    @patch('apps.views.notify_warehouse_task.apply_async')
+    def test_bulk_installation_requirements_ndjson(self, mock_notify):
+        lines = [
+            json.dumps({"material_id": str(self.material.material_id), "quantity": n, "fab_date": "2025-06-15"})
+            for n in range(1, 4)
+        ]
+        response = self.client.post(
+            '/api/installation_requirements/bulk/',
+            "\n".join(lines) + "\n",
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(InstallationRequirement.objects.count(), 3)
+        relay_outbox()
+        mock_notify.assert_called_once()
+
+    @patch('apps.views.MaterialViewSet.bulk_chunk_size', 2)
+    def test_bulk_failed_chunk_is_reported_and_later_chunks_stored(self):
+        payload = [{"type": "pipe", "quantity": n} for n in (1, 2, 3, 4, 5)] + [{"quantity": "many"}]
+        with patch('apps.views.schedule_created', side_effect=[None, RuntimeError("crash"), None]):
+            response = self.client.post('/api/materials/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        # The second chunk rolled back with its side effects; the others are stored
+        stored = dict(Material.objects.filter(type="pipe").values_list('quantity', 'material_id'))
+        self.assertEqual(sorted(stored), [1, 2, 5])
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['ids'], [str(stored[n]) for n in (1, 2, 5)])
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3, 5])
+        self.assertEqual(response.data['errors'][0]['errors']['non_field_errors'], ["Not stored: RuntimeError: crash"])
+        self.assertEqual(InventoryPosition.objects.values_list('quantity', 'material_count').get(material_type="pipe"), (8, 3))
+        self.assertEqual(sorted(TaskOutbox.objects.values_list('args', flat=True)), [
+            ["Inspection tasks assigned for 1 material arrivals."],
+            ["Inspection tasks assigned for 2 material arrivals."],
+        ])
+
+    def test_bulk_rejects_invalid_batch(self):
+        response = self.client.post('/api/materials/bulk/', [{"quantity": "many"}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.material = Material.objects.create(type="steel", quantity=100)
+        Material.objects.create(type="pipe", quantity=25)
+        InventoryRecord.objects.create(material_id=self.material, location="Aisle 5", last_checked="2025-06-01")
+
+    def test_export_materials_ndjson(self):
+        response = self.client.get('/api/materials/export/?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(row['type'] for row in rows), ["pipe", "steel"])
+        self.assertEqual(set(rows[0]), {'material_id', 'type', 'quantity', 'status', 'created_at'})
+
+    def test_export_inventory_csv(self):
+        response = self.client.get('/api/inventory/export/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "inv_id,material_id,location,last_checked,created_at")
+        self.assertIn(f"{self.material.material_id},Aisle 5,2025-06-01", lines[1])
+
+
+class PaginationFilterTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for n in range(5):
+            Material.objects.create(type="steel", quantity=n, status="Stored" if n % 2 else "Received")
+
+    def test_keyset_pages_cover_every_row_once(self):
+        seen = []
+        url = '/api/materials/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['material_id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/materials/?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+        # Well-formed cursor whose key is not a UUID
+        cursor = base64.urlsafe_b64encode(b"2025-06-01T00:00:00+00:00|not-a-uuid").decode('ascii')
+        self.assertEqual(self.client.get(f'/api/materials/?cursor={cursor}').status_code, 404)
+
+    def test_filter_by_status(self):
+        response = self.client.get('/api/materials/?status=Stored')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['status'] for row in response.data['results']}, {"Stored"})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_filter_requirements_by_material_and_date(self):
+        material = Material.objects.first()
+        Requirement.objects.create(material_id=material, quantity=1, delivery_date="2025-06-01")
+        Requirement.objects.create(material_id=material, quantity=2, delivery_date="2025-07-01")
+        response = self.client.get(
+            f'/api/requirements/?material_id={material.material_id}&delivery_after=2025-06-15'
+        )
+        self.assertEqual([row['quantity'] for row in response.data['results']], [2])
+
+    def test_filter_by_created_day(self):
+        first, last = Material.objects.order_by('created_at')[:1].get(), Material.objects.order_by('-created_at')[:1].get()
+        Material.objects.filter(pk=first.pk).update(created_at=timezone.make_aware(datetime.datetime(2025, 6, 1, 23, 59)))
+        Material.objects.filter(pk=last.pk).update(created_at=timezone.make_aware(datetime.datetime(2025, 6, 2)))
+        response = self.client.get('/api/materials/?created_after=2025-06-01&created_before=2025-06-01')
+        self.assertEqual([row['material_id'] for row in response.data['results']], [str(first.pk)])
+        response = self.client.get('/api/materials/?created_after=2025-06-02&created_before=2025-06-02')
+        self.assertEqual([row['material_id'] for row in response.data['results']], [str(last.pk)])
+        self.assertEqual(self.client.get('/api/materials/?created_after=June').status_code, 400)
+
+    def test_invalid_filter_value(self):
+        response = self.client.get('/api/requirements/?material_id=not-a-uuid')
+        self.assertEqual(response.status_code, 400)
+
+
+
+class QueryPlanTestCase(TestCase):
+    # Loads a synthetic dataset (MMS_PLAN_ROWS rows per table) and checks with
+    # EXPLAIN QUERY PLAN that hot endpoint queries never fall back to a table scan
+    rows = int(os.environ.get('MMS_PLAN_ROWS', 2000))
+
+    @classmethod
+    def setUpTestData(cls):
+        start = datetime.date(2025, 1, 1)
+        materials = Material.objects.bulk_create([
+            Material(type=f"type-{n % 50}", quantity=n, status=["Received", "Stored", "Issued"][n % 3])
+            for n in range(cls.rows)
+        ])
+        widgets = Widget.objects.bulk_create([Widget(material_id=m) for m in materials[:cls.rows // 4]])
+        Requirement.objects.bulk_create([
+            Requirement(material_id=materials[n], quantity=n, delivery_date=start + datetime.timedelta(days=n % 365))
+            for n in range(cls.rows)
+        ])
+        InstallationRequirement.objects.bulk_create([
+            InstallationRequirement(material_id=materials[n], quantity=n, fab_date=start + datetime.timedelta(days=n % 365))
+            for n in range(cls.rows)
+        ])
+        Shipment.objects.bulk_create([
+            Shipment(widget_id=widgets[n % len(widgets)], tracking_id=f"T{n}", customer_id=f"C{n % 100}")
+            for n in range(cls.rows)
+        ])
+        Inspection.objects.bulk_create([
+            Inspection(material_id=materials[n], result="Pass" if n % 4 else "Fail") for n in range(cls.rows)
+        ])
+        InventoryRecord.objects.bulk_create([
+            InventoryRecord(material_id=materials[n], location=f"Aisle {n % 20}", last_checked=start)
+            for n in range(cls.rows)
+        ])
+        CustomerOrder.objects.bulk_create([
+            CustomerOrder(widget_id=widgets[n % len(widgets)], customer_id=f"C{n % 100}", status="Shipped")
+            for n in range(cls.rows)
+        ])
+        fill_demand_buckets(start, start + datetime.timedelta(days=364))
+        moment = timezone.make_aware(datetime.datetime(2025, 1, 1))
+        StatusTransition.objects.bulk_create([
+            StatusTransition(
+                entity_type=TransitionEntity.MATERIAL, entity_id=materials[n % cls.rows].material_id,
+                from_status=["Received", "Stored"][n % 2], to_status=["Stored", "Issued"][n % 2],
+                dwell_seconds=n, created_at=moment + datetime.timedelta(minutes=n),
+            )
+            for n in range(cls.rows * 2)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.material = materials[cls.rows // 2]
+
+    def assertIndexed(self, queryset, sorted_by_index=False, filtered=False):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            if " SCAN " in f" {line} " and "USING" not in line:
+                self.fail(f"Full table scan in plan:\n{plan}")
+            # Walking a whole index while filtering each row is a scan too
+            if filtered and " SCAN " in f" {line} ":
+                self.fail(f"Filtered query scans instead of searching:\n{plan}")
+        if filtered:
+            self.assertIn("SEARCH", plan)
+        if sorted_by_index:
+            self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+
+    def _list(self, viewset, params=None, after=None):
+        # The query a list request runs: the view's filter backend, then KeysetPagination
+        params = dict(params or {})
+        if after is not None:
+            params['cursor'] = KeysetPagination().cursor_value((after.created_at, after.pk))
+        request = Request(APIRequestFactory().get('/', params))
+        view = viewset(request=request, format_kwarg=None, action='list')
+        return view.paginator.page_queryset(view.filter_queryset(view.get_queryset()), request)
+
+    def test_list_pages_seek_the_keyset_index(self):
+        for viewset in [MaterialViewSet, RequirementViewSet, InstallationRequirementViewSet, WidgetViewSet, ShipmentViewSet,
+                        InspectionViewSet, MaintenanceRecordViewSet, InventoryRecordViewSet, CustomerOrderViewSet]:
+            self.assertIndexed(self._list(viewset), sorted_by_index=True)
+        self.assertIndexed(self._list(MaterialViewSet, after=self.material), sorted_by_index=True, filtered=True)
+
+    def test_filtered_pages(self):
+        self.assertIndexed(self._list(MaterialViewSet, {'status': "Stored"}), sorted_by_index=True, filtered=True)
+        self.assertIndexed(self._list(MaterialViewSet, {'status': "Stored"}, after=self.material), sorted_by_index=True, filtered=True)
+        self.assertIndexed(self._list(RequirementViewSet, {'status': "Draft"}), sorted_by_index=True, filtered=True)
+        self.assertIndexed(self._list(ShipmentViewSet, {'status': "Prepared"}), sorted_by_index=True, filtered=True)
+        self.assertIndexed(self._list(InspectionViewSet, {'result': "Pass"}), sorted_by_index=True, filtered=True)
+        self.assertIndexed(self._list(CustomerOrderViewSet, {'status': "Shipped"}), sorted_by_index=True, filtered=True)
+        self.assertIndexed(self._list(
+            RequirementViewSet, {'material_id': self.material.material_id, 'delivery_after': "2025-03-01"}), filtered=True)
+
+    def test_created_day_filters(self):
+        # Each bound on its own must seek the index; together one could hide the other
+        for days in [{'created_after': "2025-01-01"}, {'created_before': "2025-01-02"}]:
+            for viewset in [MaterialViewSet, RequirementViewSet, ShipmentViewSet, InspectionViewSet,
+                            CustomerOrderViewSet, FeedRunViewSet]:
+                with self.subTest(viewset=viewset.__name__, days=days):
+                    self.assertIndexed(self._list(viewset, days), sorted_by_index=True, filtered=True)
+            self.assertIndexed(self._list(StatusTransitionViewSet, {'entity': "material", **days}), filtered=True)
+
+    def test_lookups(self):
+        shipment = Shipment.objects.first()
+        self.assertIndexed(Shipment.objects.filter(shipment_id=shipment.shipment_id))
+        self.assertIndexed(Shipment.objects.filter(tracking_id="T10"))
+        self.assertIndexed(Shipment.objects.filter(customer_id="C5", status="Prepared"))
+        self.assertIndexed(CustomerOrder.objects.filter(customer_id="C5", status="Shipped"))
+        self.assertIndexed(InventoryRecord.objects.filter(location="Aisle 5"))
+        self.assertIndexed(InventoryRecord.objects.filter(last_checked__lte=datetime.date(2025, 1, 1)))
+        self.assertIndexed(Material.objects.filter(type="type-3", status="Stored"))
+        # Cascades from a material seek the composite index; the FK has no index of its own
+        self.assertIndexed(Requirement.objects.filter(material_id=self.material), filtered=True)
+
+    def test_demand_report_queries(self):
+        window = (datetime.date(2025, 6, 1), datetime.date(2025, 6, 30))
+        self.assertIndexed(
+            Requirement.objects.filter(delivery_date__range=window)
+            .values('delivery_date', 'material_id__type').annotate(total=Sum('quantity')).order_by()
+        )
+        self.assertIndexed(
+            InstallationRequirement.objects.filter(fab_date__range=window)
+            .values('fab_date', 'material_id__type').annotate(total=Sum('quantity')).order_by()
+        )
+        self.assertIndexed(demand_rows(*window))
+        self.assertIndexed(demand_rows(*window, bucket="week"))
+
+    def test_transition_queries(self):
+        window = (timezone.make_aware(datetime.datetime(2025, 1, 2)), timezone.make_aware(datetime.datetime(2025, 1, 3)))
+        self.assertIndexed(dwell_rows(TransitionEntity.MATERIAL, *window))
+        self.assertIn("COVERING INDEX", dwell_rows(TransitionEntity.MATERIAL, *window).explain())
+        self.assertIndexed(dwell_rows(TransitionEntity.MATERIAL, *window, from_status="Received", to_status="Stored"))
+        self.assertIndexed(
+            StatusTransition.objects.filter(entity_type=TransitionEntity.MATERIAL, entity_id=self.material.material_id)
+            .order_by('-created_at')[:1],
+            sorted_by_index=True,
+        )
+
+
+class QueryBudgetTestCase(TestCase):
+    # Query count per endpoint must not grow with the number of rows returned
+    budgets = {
+        '/api/materials/': 1,
+        '/api/requirements/': 1,
+        '/api/requirements/?expand=material': 1,
+        '/api/installation_requirements/?expand=material': 1,
+        '/api/widgets/?expand=material': 1,
+        '/api/shipments/': 1,
+        '/api/shipments/?expand=material,widget': 1,
+        '/api/inspections/?expand=material,widget': 1,
+        '/api/maintenance/?expand=material': 1,
+        '/api/inventory/?expand=material': 1,
+        '/api/orders/?expand=material,widget': 1,
+    }
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _load(self, count):
+        for n in range(count):
+            material = Material.objects.create(type="steel", quantity=n)
+            widget = Widget.objects.create(material_id=material)
+            Requirement.objects.create(material_id=material, quantity=n, delivery_date="2025-06-01")
+            InstallationRequirement.objects.create(material_id=material, quantity=n, fab_date="2025-06-01")
+            Shipment.objects.create(material_id=material, widget_id=widget, tracking_id=f"T{n}", customer_id="C1")
+            Inspection.objects.create(material_id=material, widget_id=widget, result="Pass")
+            MaintenanceRecord.objects.create(material_id=material, date="2025-06-01", condition="good")
+            InventoryRecord.objects.create(material_id=material, location="Aisle 5", last_checked="2025-06-01")
+            CustomerOrder.objects.create(material_id=material, widget_id=widget, customer_id="C1", status="Shipped")
+
+    def test_list_query_budget_is_constant(self):
+        for count in (2, 20):
+            self._load(count)
+            for url, budget in self.budgets.items():
+                with self.subTest(url=url, rows=count), self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_expand_nests_related_objects(self):
+        self._load(1)
+        response = self.client.get('/api/orders/?expand=widget')
+        order = response.data['results'][0]
+        self.assertEqual(order['widget_id']['status'], "Fabricated")
+        self.assertEqual(str(order['material_id']), str(Material.objects.get().material_id))
+
+    def test_expand_rejects_unknown_field(self):
+        response = self.client.get('/api/widgets/?expand=widget')
+        self.assertEqual(response.status_code, 400)
+
+    @patch('apps.views.notify_warehouse_task.apply_async')
+    def test_inspection_create_query_budget(self, mock_notify):
+        material = Material.objects.create(type="steel", quantity=1)
+        # material lookup, inspection insert, status update and outbox insert, the
+        # savepoint pair around perform_create, and inventory position upkeep: the
+        # prior material state, its location and two position upserts (one new row),
+        # then the status transition: the material's last transition and the insert,
+        # and cancelling the material's inspection deadline
+        with self.assertNumQueries(16):
+            response = self.client.post(
+                '/api/inspections/',
+                {"material_id": str(material.material_id), "result": "Pass", "defects": ""},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+
+
+
+@override_settings(MMS_NOTIFICATION_SEND_LATENCY=0)
+class NotificationPipelineTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_notify_tasks_buffer_without_delivering(self):
+        notify_warehouse_task("Inspection task assigned for material arrival.")
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, "Warehouse")
+        self.assertIsNone(notification.delivered_at)
+
+    def test_flush_coalesces_one_digest_per_recipient(self):
+        for n in range(3):
+            notify_warehouse_task(f"Material {n} arrived.")
+        notify_shipping_task("Shipment prepared.")
+        with patch('builtins.print'):
+            result = flush_notifications(window=0)
+        self.assertEqual(result['digests'], 2)
+        self.assertEqual(result['delivered'], 4)
+        self.assertFalse(Notification.objects.filter(delivered_at=None).exists())
+        self.assertEqual(Notification.objects.filter(recipient="Warehouse").values('digest_id').distinct().count(), 1)
+
+    def test_flush_waits_for_window(self):
+        notify_warehouse_task("Material arrived.")
+        self.assertEqual(flush_notifications(window=60)['digests'], 0)
+        self.assertEqual(notification_stats()['queue_depth'], 1)
+
+    @override_settings(MMS_NOTIFICATION_SENDER='apps.tests.failing_sender')
+    def test_failed_digest_is_retried(self):
+        notify_shipping_task("Shipment prepared.")
+        result = flush_notifications(window=0)
+        self.assertEqual(result['failed_digests'], 1)
+        notification = Notification.objects.get()
+        self.assertIsNone(notification.digest_id)
+        self.assertIsNone(notification.delivered_at)
+
+    def test_claim_left_by_a_crashed_flush_is_released(self):
+        notify_shipping_task("Shipment prepared.")
+        with patch('apps.notifications._deliver', side_effect=RuntimeError("worker killed")), self.assertRaises(RuntimeError):
+            flush_notifications(window=0)
+        self.assertIsNotNone(Notification.objects.get().digest_id)
+        # Still claimed: another flush leaves it alone until the claim times out
+        self.assertEqual(flush_notifications(window=0)['digests'], 0)
+        with patch('builtins.print'):
+            result = flush_notifications(window=0, now=timezone.now() + datetime.timedelta(minutes=11))
+        self.assertEqual(result['delivered'], 1)
+        self.assertIsNotNone(Notification.objects.get().delivered_at)
+
+    def test_stats_endpoint(self):
+        notify_warehouse_task("Material arrived.")
+        notify_warehouse_task("Material arrived.")
+        response = self.client.get('/api/notifications/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['queue_depth_by_recipient'], {"Warehouse": 2})
+        self.assertEqual(response.data['counters']['queued'], 2)
+
+
+async def failing_sender(recipient, messages):
+    raise ConnectionError("gateway unavailable")
+
+
+class TaskOutboxTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.material = Material.objects.create(type="steel", quantity=100)
+
+    def test_write_enqueues_without_touching_broker(self):
+        with patch('apps.views.notify_fabrication_task.apply_async') as mock_send:
+            response = self.client.post(
+                '/api/materials/issue/',
+                {"material_id": str(self.material.material_id), "quantity": 10},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            mock_send.assert_not_called()
+        outbox = TaskOutbox.objects.get()
+        self.assertEqual(outbox.task_name, "apps.tasks.notify_fabrication_task")
+
+    def test_rolled_back_write_leaves_no_task(self):
+        try:
+            with transaction.atomic():
+                enqueue_task(notify_warehouse_task, "Material arrived.")
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        self.assertFalse(TaskOutbox.objects.exists())
+
+    def test_relay_keeps_rows_when_broker_fails(self):
+        enqueue_task(notify_warehouse_task, "first")
+        enqueue_task(notify_warehouse_task, "second")
+        with patch('apps.views.notify_warehouse_task.apply_async', side_effect=ConnectionError("broker down")):
+            result = relay_outbox()
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(TaskOutbox.objects.count(), 2)
+        with patch('apps.views.notify_warehouse_task.apply_async') as mock_send:
+            self.assertEqual(relay_outbox()['dispatched'], 2)
+        self.assertEqual([c.kwargs['args'] for c in mock_send.call_args_list], [["first"], ["second"]])
+        self.assertFalse(TaskOutbox.objects.exists())
+
+    @override_settings(MMS_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failing_row_does_not_block_later_rows(self):
+        TaskOutbox.objects.create(task_name="apps.tasks.removed_task", args=[])
+        enqueue_task(notify_warehouse_task, "after")
+        with patch('apps.views.notify_warehouse_task.apply_async') as mock_send:
+            self.assertEqual(relay_outbox(), {"dispatched": 1, "failed": 1, "dead": 0, "skipped": False})
+            mock_send.assert_called_once_with(args=["after"], kwargs={}, task_id=ANY)
+            self.assertEqual(relay_outbox(), {"dispatched": 0, "failed": 1, "dead": 1, "skipped": False})
+            # Dead-lettered: kept for inspection, never sent again
+            self.assertEqual(relay_outbox(), {"dispatched": 0, "failed": 0, "dead": 0, "skipped": False})
+        row = TaskOutbox.objects.get()
+        self.assertEqual(row.attempts, 2)
+        self.assertIsNotNone(row.dead_at)
+
+    def test_redelivered_task_is_buffered_once(self):
+        task_id = str(uuid.uuid4())
+        for _ in range(2):
+            notify_warehouse_task.apply(args=["Material arrived."], task_id=task_id)
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class IssueMaterialTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.steel = Material.objects.create(type="steel", quantity=100, status="Stored")
+        self.pipe = Material.objects.create(type="pipe", quantity=10, status="Stored")
+
+    def test_issue_rejects_over_issue(self):
+        response = self.client.post(
+            '/api/materials/issue/',
+            {"material_id": str(self.pipe.material_id), "quantity": 11},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.pipe.refresh_from_db()
+        self.assertEqual(self.pipe.quantity, 10)
+        self.assertEqual(self.pipe.status, "Stored")
+
+    def test_issue_validates_input(self):
+        for payload in [{"material_id": str(self.pipe.material_id), "quantity": -1},
+                        {"material_id": str(self.pipe.material_id), "quantity": "lots"}]:
+            self.assertEqual(self.client.post('/api/materials/issue/', payload, format='json').status_code, 400)
+        response = self.client.post('/api/materials/issue/', {"material_id": "nope", "quantity": 1}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_issue_batch_is_all_or_nothing(self):
+        response = self.client.post('/api/materials/issue_batch/', {"items": [
+            {"material_id": str(self.steel.material_id), "quantity": 40},
+            {"material_id": str(self.pipe.material_id), "quantity": 6},
+            {"material_id": str(self.pipe.material_id), "quantity": 6},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['material_id'], str(self.pipe.material_id))
+        self.steel.refresh_from_db()
+        self.assertEqual(self.steel.quantity, 100)
+        self.assertFalse(TaskOutbox.objects.exists())
+
+    def test_issue_batch(self):
+        response = self.client.post('/api/materials/issue_batch/', {"items": [
+            {"material_id": str(self.steel.material_id), "quantity": 40},
+            {"material_id": str(self.pipe.material_id), "quantity": 10},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(row['quantity'] for row in response.data['issued']), [0, 60])
+        self.assertEqual(TaskOutbox.objects.count(), 1)
+
+
+class ConcurrentIssueTestCase(TransactionTestCase):
+    # Threads race to issue from one material; the conditional update must never over-issue
+    threads = 8
+    attempts = 25
+
+    def test_concurrent_issue_never_over_issues(self):
+        material = Material.objects.create(type="steel", quantity=100)
+        issued = []
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(self.attempts):
+                    while True:
+                        try:
+                            issue_material(material.material_id, 1)
+                            issued.append(1)
+                        except InsufficientQuantity:
+                            pass
+                        except OperationalError as exc:
+                            # The shared-cache test database reports lock contention
+                            # immediately instead of waiting like a file database
+                            if 'locked' not in str(exc):
+                                raise
+                            time.sleep(0.001)
+                            continue
+                        break
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+        material.refresh_from_db()
+        self.assertEqual(len(issued), 100)
+        self.assertEqual(material.quantity, 0)
+
+
+class InventoryPositionTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Clearing the shared cache resets the version, so drop entries cached by earlier tests too
+        cache.clear()
+        _position_cache.clear()
+
+    def _positions(self, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            pass
+        response = self.client.get('/api/inventory/positions/', params)
+        self.assertEqual(response.status_code, 200)
+        return {(p['material_type'], p['status'], p['location']): p['quantity'] for p in response.data['positions']}
+
+    def _snapshot(self):
+        return set(InventoryPosition.objects.filter(material_count__gt=0).values_list(
+            'material_type', 'status', 'location', 'quantity', 'material_count'))
+
+    def test_positions_follow_material_lifecycle(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/materials/arrival/', {"material_type": "steel", "quantity": 200}, format='json')
+        material_id = response.data['material_id']
+        self.assertEqual(self._positions(), {("steel", "Received", ""): 200})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/materials/{material_id}/store/', {"location": "Aisle 5"}, format='json')
+        self.assertEqual(self._positions(location="Aisle 5"), {("steel", "Stored", "Aisle 5"): 200})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/materials/issue/', {"material_id": material_id, "quantity": 50}, format='json')
+        self.assertEqual(self._positions(), {("steel", "Issued", "Aisle 5"): 150})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/inspections/', {"material_id": material_id, "result": "Fail"}, format='json')
+        self.assertEqual(self._positions(type="steel"), {("steel", "Flagged", "Aisle 5"): 150})
+
+    def test_incremental_positions_match_rebuild(self):
+        steel = Material.objects.create(type="steel", quantity=100, status="Stored")
+        pipe = Material.objects.create(type="pipe", quantity=30)
+        InventoryRecord.objects.create(material_id=steel, location="Aisle 5", last_checked="2025-06-01")
+        record = InventoryRecord.objects.create(material_id=pipe, location="Aisle 6", last_checked="2025-06-01")
+        issue_material(steel.material_id, 40)
+        record.location = "Yard"
+        record.save()
+        pipe.quantity = 25
+        pipe.save()
+        Material.objects.create(type="valve", quantity=3).delete()
+        self.client.post('/api/materials/bulk/', [{"type": "pipe", "quantity": 5}], format='json')
+        incremental = self._snapshot()
+        rebuild_inventory_positions()
+        self.assertEqual(incremental, self._snapshot())
+
+    def test_deleting_several_records_moves_the_material_once(self):
+        def positions():
+            return set(InventoryPosition.objects.exclude(quantity=0, material_count=0).values_list(
+                'material_type', 'status', 'location', 'quantity', 'material_count'))
+        steel = Material.objects.create(type="steel", quantity=42)
+        pipe = Material.objects.create(type="pipe", quantity=7)
+        for material in (steel, pipe):
+            InventoryRecord.objects.create(material_id=material, location="Aisle 5", last_checked="2025-06-01")
+            InventoryRecord.objects.create(material_id=material, location="Aisle 9", last_checked="2025-06-02")
+        InventoryRecord.objects.filter(material_id=pipe).delete()
+        self.assertIn(("pipe", "Received", "", 7, 1), positions())
+        steel.delete()
+        incremental = positions()
+        self.assertEqual(incremental, {("pipe", "Received", "", 7, 1)})
+        rebuild_inventory_positions()
+        self.assertEqual(incremental, positions())
+
+    def test_reads_are_cached_until_a_write_commits(self):
+        Material.objects.create(type="steel", quantity=10)
+        self.assertEqual(self._positions(), {("steel", "Received", ""): 10})
+        with self.assertNumQueries(0):
+            inventory_positions()
+        with self.captureOnCommitCallbacks(execute=True):
+            Material.objects.create(type="steel", quantity=5)
+        self.assertEqual(self._positions(), {("steel", "Received", ""): 15})
+
+
+class OrderProgressTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.material = Material.objects.create(type="steel", quantity=100)
+        self.widget = Widget.objects.create(material_id=self.material)
+        self.order = CustomerOrder.objects.create(widget_id=self.widget, customer_id="C1", status="Pending")
+
+    def _progress(self, order):
+        return OrderProgress.objects.values_list('stage', 'percentage').get(order=order)
+
+    def test_progress_follows_the_lifecycle_chain(self):
+        self.assertEqual(self._progress(self.order), ("Fabricated", 25))
+        self.client.post('/api/inspections/', {"widget_id": str(self.widget.widget_id), "result": "Pass"}, format='json')
+        self.assertEqual(self._progress(self.order), ("Inspected", 50))
+        shipment = Shipment.objects.create(widget_id=self.widget, tracking_id="T1", customer_id="C1", status="Prepared")
+        self.assertEqual(self._progress(self.order), ("Prepared", 60))
+        shipment.status = "Shipped"
+        shipment.save()
+        self.assertEqual(self._progress(self.order), ("Shipped", 75))
+        self.client.post('/api/shipments/confirm/', {"shipment_id": str(shipment.shipment_id), "delivered": True}, format='json')
+        self.assertEqual(self._progress(self.order), ("Delivered", 90))
+        self.client.post('/api/orders/confirm/', {"order_id": str(self.order.order_id), "received": True}, format='json')
+        self.assertEqual(self._progress(self.order), ("Received", 100))
+
+    def test_orders_without_a_widget_or_after_widget_delete(self):
+        bare = CustomerOrder.objects.create(customer_id="C2", status="Pending")
+        self.assertEqual(self._progress(bare), ("Ordered", 0))
+        self.widget.delete()
+        self.assertEqual(self._progress(self.order), ("Ordered", 0))
+
+    def test_bulk_progress_in_one_query(self):
+        other = CustomerOrder.objects.create(customer_id="C2", status="Received")
+        missing = uuid.uuid4()
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/orders/progress/', {"ids": f"{self.order.order_id},{other.order_id},{missing}"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['order_id'], row['progress_percentage'], row['status']) for row in response.data['orders']],
+            [(str(self.order.order_id), 25, "Pending"), (str(other.order_id), 100, "Received")],
+        )
+        self.assertEqual(response.data['not_found'], [str(missing)])
+
+    def test_bulk_progress_computes_orders_missing_from_the_table(self):
+        OrderProgress.objects.all().delete()
+        response = self.client.get('/api/orders/progress/', {"ids": str(self.order.order_id)})
+        self.assertEqual(response.data['orders'][0]['stage'], "Fabricated")
+        self.assertTrue(OrderProgress.objects.filter(order=self.order).exists())
+
+    def test_bulk_progress_rejects_bad_ids(self):
+        self.assertEqual(self.client.get('/api/orders/progress/').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/progress/', {"ids": "not-a-uuid"}).status_code, 400)
+        with override_settings(MMS_ORDER_PROGRESS_MAX_IDS=1):
+            response = self.client.get('/api/orders/progress/', {"ids": f"{uuid.uuid4()},{uuid.uuid4()}"})
+        self.assertEqual(response.status_code, 400)
+
+
+class StatusTransitionTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _history(self, entity_id):
+        return list(
+            StatusTransition.objects.filter(entity_id=entity_id)
+            .order_by('created_at', 'id')
+            .values_list('from_status', 'to_status')
+        )
+
+    def test_status_changes_are_logged(self):
+        response = self.client.post('/api/materials/arrival/', {"material_type": "steel", "quantity": 10}, format='json')
+        material_id = response.data['material_id']
+        self.client.put(f'/api/materials/{material_id}/store/', {"location": "Aisle 5"}, format='json')
+        self.client.post('/api/materials/issue/', {"material_id": material_id, "quantity": 4}, format='json')
+        self.client.post('/api/materials/issue/', {"material_id": material_id, "quantity": 1}, format='json')
+        self.assertEqual(
+            self._history(material_id),
+            [("", "Received"), ("Received", "Stored"), ("Stored", "Issued")],
+        )
+        self.assertFalse(StatusTransition.objects.filter(entity_id=material_id, from_status="Received", dwell_seconds__isnull=True).exists())
+
+        widget = Widget.objects.create(material_id=Material.objects.get(material_id=material_id))
+        order = CustomerOrder.objects.create(widget_id=widget, customer_id="C1", status="Pending")
+        self.client.post('/api/inspections/', {"widget_id": str(widget.widget_id), "result": "Pass"}, format='json')
+        self.client.post('/api/orders/confirm/', {"order_id": str(order.order_id), "received": True}, format='json')
+        self.assertEqual(self._history(widget.widget_id), [("", "Fabricated"), ("Fabricated", "Ready for Shipping")])
+        self.assertEqual(self._history(order.order_id), [("", "Pending"), ("Pending", "Received")])
+
+    def test_log_is_append_only(self):
+        transition = record_transition(TransitionEntity.ORDER, uuid.uuid4(), "", "Pending")
+        transition.to_status = "Received"
+        with self.assertRaises(ValueError):
+            transition.save()
+
+    def test_dwell_endpoint_aggregates_a_window(self):
+        day = timezone.make_aware(datetime.datetime(2025, 6, 2, 8))
+        for hours, entered in ((2, day), (4, day), (10, day - datetime.timedelta(days=30))):
+            entity_id = uuid.uuid4()
+            record_transition(TransitionEntity.MATERIAL, entity_id, "", "Received", at=entered)
+            record_transition(TransitionEntity.MATERIAL, entity_id, "Received", "Stored", at=entered + datetime.timedelta(hours=hours))
+        response = self.client.get('/api/transitions/dwell/', {"entity": "material", "start": "2025-06-01", "end": "2025-06-30"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['statuses'], [
+            {"status": "Received", "transitions": 2, "avg_hours": 3.0, "min_hours": 2.0, "max_hours": 4.0},
+        ])
+        response = self.client.get('/api/transitions/dwell/', {
+            "entity": "material", "start": "2025-05-01", "end": "2025-06-30", "to_status": "Stored",
+        })
+        self.assertEqual(response.data['statuses'][0]['transitions'], 3)
+        self.assertEqual(self.client.get('/api/transitions/dwell/', {"entity": "pallet"}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/transitions/dwell/', {"entity": "material", "start": "2025-07-01", "end": "2025-06-01"}).status_code,
+            400,
+        )
+        response = self.client.get('/api/transitions/', {"entity": "material", "to_status": "Stored"})
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class EscalationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.material = Material.objects.create(type="steel", quantity=100, status="Stored")
+
+    def _pending(self):
+        return set(Escalation.objects.filter(fired_at=None).values_list('kind', 'entity_id'))
+
+    def test_deadlines_are_scheduled_and_cancelled_with_status(self):
+        response = self.client.post('/api/requirements/', {
+            "material_id": str(self.material.material_id), "quantity": 50, "delivery_date": "2025-06-01",
+        }, format='json')
+        requirement = Requirement.objects.get(req_id=response.data['req_id'])
+        escalation = Escalation.objects.get(kind=EscalationKind.FEEDBACK, entity_id=requirement.req_id)
+        self.assertEqual(escalation.due_at, requirement.created_at + datetime.timedelta(hours=24))
+        self.client.post(f'/api/requirements/{requirement.req_id}/feedback/', {"availability": "limited", "lead_time": "2 weeks"}, format='json')
+        self.assertEqual(self._pending(), set())
+
+        material_id = self.client.post('/api/materials/arrival/', {"material_type": "steel", "quantity": 10}, format='json').data['material_id']
+        widget = Widget.objects.create(material_id=self.material)
+        self.assertEqual(self._pending(), {
+            (EscalationKind.MATERIAL_INSPECTION, uuid.UUID(material_id)),
+            (EscalationKind.WIDGET_INSPECTION, widget.widget_id),
+        })
+        self.client.post('/api/inspections/', {"material_id": material_id, "result": "Pass"}, format='json')
+        self.client.post('/api/inspections/', {"widget_id": str(widget.widget_id), "result": "Pass"}, format='json')
+        self.assertEqual(self._pending(), set())
+
+        shipment_id = self.client.post('/api/shipments/', {
+            "widget_id": str(widget.widget_id), "tracking_id": "T1", "customer_id": "C1",
+        }, format='json').data['shipment_id']
+        self.assertEqual(self._pending(), {(EscalationKind.SHIPPING, uuid.UUID(shipment_id))})
+        self.client.post('/api/shipments/confirm/', {"shipment_id": shipment_id, "delivered": True}, format='json')
+        self.assertEqual(self._pending(), set())
+
+    def test_bulk_create_and_delete(self):
+        self.client.post('/api/requirements/bulk/', [
+            {"material_id": str(self.material.material_id), "quantity": n, "delivery_date": "2025-06-01"} for n in (1, 2)
+        ], format='json')
+        self.assertEqual(Escalation.objects.filter(kind=EscalationKind.FEEDBACK).count(), 2)
+        Requirement.objects.first().delete()
+        self.assertEqual(Escalation.objects.filter(kind=EscalationKind.FEEDBACK).count(), 1)
+
+    def test_fire_only_due_rows_in_batches(self):
+        requirements = [
+            Requirement.objects.create(material_id=self.material, quantity=n, delivery_date="2025-06-01") for n in range(5)
+        ]
+        Material.objects.create(type="steel", quantity=1)
+        now = timezone.now()
+        # Nothing due: one probe of the due_at index, whatever the number of open deadlines
+        with self.assertNumQueries(1):
+            self.assertEqual(fire_due_escalations(ESCALATION_TASKS, now=now)['fired'], 0)
+        # Only the 12 hour inspection deadline is due
+        result = fire_due_escalations(ESCALATION_TASKS, now=now + datetime.timedelta(hours=13))
+        self.assertEqual((result['fired'], result['batches']), (1, 1))
+        self.assertEqual(TaskOutbox.objects.get().task_name, 'apps.tasks.escalate_inspection_task')
+        result = fire_due_escalations(ESCALATION_TASKS, now=now + datetime.timedelta(hours=25), batch_size=2)
+        self.assertEqual((result['fired'], result['batches']), (5, 3))
+        fired = TaskOutbox.objects.filter(task_name='apps.tasks.escalate_delay_task')
+        self.assertEqual(
+            sorted(entity_id for row in fired for entity_id in row.args[1]),
+            sorted(str(requirement.req_id) for requirement in requirements),
+        )
+        # Fired rows leave the due index and are not sent again
+        self.assertEqual(fire_due_escalations(ESCALATION_TASKS, now=now + datetime.timedelta(hours=48))['fired'], 0)
+
+    def test_rows_claimed_by_another_worker_are_not_fired_again(self):
+        requirements = [
+            Requirement.objects.create(material_id=self.material, quantity=n, delivery_date="2025-06-01") for n in range(3)
+        ]
+        # Another worker, outside this process's cache lock, fires one row between our select and claim
+        def rival_claim():
+            Escalation.objects.filter(entity_id=requirements[0].req_id).update(fired_at=timezone.now(), claim_id=uuid.uuid4())
+            return uuid.uuid4()
+        with patch('apps.escalations.new_id', side_effect=rival_claim):
+            result = fire_due_escalations(ESCALATION_TASKS, now=timezone.now() + datetime.timedelta(hours=25))
+        self.assertEqual(result['fired'], 2)
+        self.assertEqual(
+            sorted(TaskOutbox.objects.get(task_name='apps.tasks.escalate_delay_task').args[1]),
+            sorted(str(requirement.req_id) for requirement in requirements[1:]),
+        )
+
+    def test_escalate_task_notifies_engineer(self):
+        escalate_delay_task(EscalationKind.FEEDBACK, ["r1", "r2"])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, "Engineer")
+        self.assertIn("r1, r2", notification.message)
+
+
+INSTRUMENTED_MIDDLEWARE = ['apps.instrumentation.InstrumentationMiddleware']
+
+@override_settings(MMS_INSTRUMENTATION=True, MIDDLEWARE=INSTRUMENTED_MIDDLEWARE)
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        registry.reset()
+        self.material = Material.objects.create(type="steel", quantity=100, status="Stored")
+
+    def _metrics(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_metrics_cover_latency_queries_and_stages(self):
+        response = self.client.post('/api/materials/issue/', {"material_id": str(self.material.material_id), "quantity": 5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        metrics = self._metrics()
+        self.assertIn('mms_request_duration_seconds_count{method="POST",view="material-issue",status="200"} 1', metrics)
+        self.assertIn('mms_request_duration_seconds_bucket{method="POST",view="material-issue",status="200",le="+Inf"} 1', metrics)
+        self.assertIn('mms_request_db_queries_count{method="POST",view="material-issue"} 1', metrics)
+        for name in ('db', 'serializer', 'enqueue'):
+            self.assertIn(f'mms_request_stage_calls_total{{method="POST",view="material-issue",stage="{name}"}}', metrics)
+        self.assertIn('mms_request_stage_calls_total{method="POST",view="material-issue",stage="enqueue"} 1', metrics)
+
+    def test_query_histogram_matches_the_request(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/materials/')
+        metrics = self._metrics()
+        self.assertIn('mms_request_db_queries_bucket{method="GET",view="material-list",le="0"} 0', metrics)
+        self.assertIn('mms_request_db_queries_bucket{method="GET",view="material-list",le="1"} 1', metrics)
+
+    def test_slow_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with override_settings(MMS_PROFILE_SAMPLE_RATE=1.0, MMS_PROFILE_SLOW_MS=0, MMS_PROFILE_DIR=profile_dir):
+                client = APIClient()
+                client.get('/api/materials/')
+            files = os.listdir(profile_dir)
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].endswith('-GET-material-list.prof'))
+            self.assertGreater(pstats.Stats(os.path.join(profile_dir, files[0])).total_calls, 0)
+        self.assertIn('mms_profiles_total 1', self._metrics())
+
+    def test_metrics_need_an_allowed_address(self):
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.7').status_code, 403)
+        with override_settings(MMS_METRICS_ALLOWED_IPS=['203.0.113.7']):
+            self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.7').status_code, 200)
+
+    @override_settings(MMS_INSTRUMENTATION=False)
+    def test_disabled_records_nothing(self):
+        client = APIClient()
+        client.get('/api/materials/')
+        self.assertEqual(client.get('/api/metrics/').status_code, 404)
+        self.assertEqual(registry.durations, {})
+
+
+class TunedSQLiteTestCase(TestCase):
+    def _wrapper(self, path, **options):
+        settings_dict = {**connection.settings_dict, 'ENGINE': 'apps.sqlite_tuned', 'NAME': path, 'OPTIONS': options}
+        return TunedDatabaseWrapper(settings_dict, alias='tuned')
+
+    def _pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connections_get_wal_and_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self._wrapper(os.path.join(directory, 'mms.db'), pragmas={'cache_size': -1000})
+            try:
+                self.assertEqual(self._pragma(wrapper, 'journal_mode'), 'wal')
+                self.assertEqual(self._pragma(wrapper, 'synchronous'), 1)
+                self.assertEqual(self._pragma(wrapper, 'busy_timeout'), 5000)
+                self.assertEqual(self._pragma(wrapper, 'cache_size'), -1000)
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+            wrapper = self._wrapper(os.path.join(directory, 'mms.db'), transaction_mode='DEFERRED')
+            try:
+                self.assertEqual(self._pragma(wrapper, 'journal_mode'), 'wal')
+                self.assertEqual(wrapper.transaction_mode, 'DEFERRED')
+            finally:
+                wrapper.close()
+
+
+class WriteQueueTestCase(TransactionTestCase):
+    def setUp(self):
+        self.queue = WriteQueue()
+
+    def tearDown(self):
+        self.queue.close()
+
+    def test_queued_writes_commit_together_and_fail_alone(self):
+        material = Material.objects.create(type="steel", quantity=10)
+        gate = threading.Event()
+        results, errors = [], []
+
+        def submit(fn, *args):
+            try:
+                results.append(self.queue.submit(fn, *args))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        def hold():
+            started.set()
+            gate.wait()
+
+        # Hold the writer on a first write so the rest queue up behind it
+        started = threading.Event()
+        blocker = threading.Thread(target=submit, args=(hold,))
+        blocker.start()
+        started.wait()
+        clients = [threading.Thread(target=submit, args=(issue_material, material.material_id, 3)) for _ in range(4)]
+        for client in clients:
+            client.start()
+        while self.queue._queue.qsize() < 4:
+            time.sleep(0.001)
+        gate.set()
+        for thread in [blocker, *clients]:
+            thread.join()
+        material.refresh_from_db()
+        # Three issues fit in the stock; the fourth fails in its own savepoint
+        self.assertEqual(material.quantity, 1)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], InsufficientQuantity)
+        self.assertEqual((self.queue.writes, self.queue.batches), (5, 2))
+
+
+    def test_writer_survives_a_write_that_escapes_its_savepoint(self):
+        def interrupted():
+            raise SystemExit("worker shutting down")
+        with self.assertRaises(SystemExit):
+            self.queue.submit(interrupted)
+        # The caller was told, and the writer still takes the next write
+        material = self.queue.submit(Material.objects.create, type="steel", quantity=1)
+        self.assertTrue(Material.objects.filter(pk=material.pk).exists())
+        self.assertTrue(self.queue._thread.is_alive())
+
+@patch('apps.routers.replica_fresh', return_value=True)
+@patch('apps.routers.replica_alias', return_value='replica')
+class ReplicaRoutingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_leave_the_replica_after_a_write(self, *mocks):
+        self.assertEqual(self.router.db_for_read(Material), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Material), 'replica')
+            self.assertEqual(self.router.db_for_write(Material), 'default')
+            self.assertEqual(self.router.db_for_read(Material), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'apps'))
+
+    def test_stale_replica_falls_back_to_primary(self, alias, fresh):
+        fresh.return_value = False
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Material), 'default')
+
+    def test_read_then_write_paths_read_the_primary(self, *mocks):
+        seen = []
+        row = {'order_id': 1, 'status': 'Ordered', 'stage': None, 'percentage': None}
+        with patch('apps.progress.CustomerOrder') as orders, \
+                patch('apps.progress.refresh_order_progress', side_effect=lambda **kwargs: seen.append(self.router.db_for_read(OrderProgress))):
+            orders.objects.filter.return_value.values.return_value = [row]
+            with replica_reads():
+                order_progress([1])
+        # Progress missing on the replica is computed from the primary
+        self.assertEqual(seen, ['default'])
+
+    def test_middleware_routes_safe_requests_and_pins_after_writes(self, *mocks):
+        factory = RequestFactory()
+
+        def view(request):
+            read_from = self.router.db_for_read(Material)
+            if request.method == 'GET' and 'write' in request.GET:
+                self.router.db_for_write(Material)
+            return HttpResponse(f"{read_from},{self.router.db_for_read(Material)}")
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(factory.get('/api/materials/'))
+        self.assertEqual(response.content, b"replica,replica")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(middleware(factory.post('/api/materials/')).content, b"default,default")
+        response = middleware(factory.get('/api/orders/progress/', {'write': 1}))
+        self.assertEqual(response.content, b"replica,default")
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = factory.get('/api/materials/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(middleware(request).content, b"default,default")
+
+        # Streamed exports are read after the middleware returns
+        def export(request):
+            return StreamingHttpResponse(self.router.db_for_read(Material) for _ in range(2))
+        self.assertEqual(b"".join(ReplicaRoutingMiddleware(export)(factory.get('/')).streaming_content), b"replicareplica")
+
+    def test_snapshot_copies_the_database(self, *mocks):
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'mms.db'), os.path.join(directory, 'replica.db')
+            db = sqlite3.connect(source)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("CREATE TABLE stock (quantity INTEGER)")
+            db.execute("INSERT INTO stock VALUES (5)")
+            db.commit()
+            snapshot_sqlite(source, target)
+            db.close()
+            replica = sqlite3.connect(target)
+            self.assertEqual(replica.execute("SELECT quantity FROM stock").fetchall(), [(5,)])
+            replica.close()
+
+
+@patch('apps.routers.replica_lag', return_value=30)
+@patch('apps.routers.replica_fresh', return_value=True)
+@patch('apps.routers.replica_alias', return_value='replica')
+class DemandReplicaReadTestCase(TransactionTestCase):
+    def test_sums_read_from_replica_and_rewritten_days_from_primary(self, *mocks):
+        steel = Material.objects.create(type="steel", quantity=100)
+        Requirement.objects.create(material_id=steel, quantity=10, delivery_date="2025-06-02")
+        report = DemandReport.objects.create(start_date=datetime.date(2025, 6, 1), end_date=datetime.date(2025, 6, 3))
+        read_totals = reports._read_totals
+        seen = []
+
+        def read_then_write(days):
+            seen.append(ReplicaRouter().db_for_read(Requirement))
+            result = read_totals(days)
+            if len(seen) == 1:
+                Requirement.objects.create(material_id=steel, quantity=5, delivery_date="2025-06-02")
+            return result
+
+        before = timezone.now()
+        with patch('apps.reports._read_totals', side_effect=read_then_write):
+            build_demand_report(report.report_id)
+        # The day written after the snapshot is read again on the primary
+        self.assertEqual(seen, ['replica', 'default'])
+        report.refresh_from_db()
+        self.assertEqual(report.rows.get().requirement_quantity, 15)
+        lag = datetime.timedelta(seconds=30)
+        self.assertTrue(before - lag <= report.data_as_of <= timezone.now() - lag)
+
+
+class RetentionTestCase(TestCase):
+    def test_prune_deletes_in_chunks_and_archives(self):
+        delivered = timezone.now() - datetime.timedelta(days=2)
+        Notification.objects.bulk_create(
+            [Notification(recipient="Warehouse", message=f"old {n}", delivered_at=delivered) for n in range(5)]
+            + [Notification(recipient="Warehouse", message="pending")]
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, 'notifications.ndjson.gz')
+            result = prune_rows(Notification.objects.exclude(delivered_at=None), batch_size=2, pause=0, archive_path=archive)
+            self.assertEqual(result, {"deleted": 5, "batches": 3})
+            with gzip.open(archive, 'rt') as archive_file:
+                rows = [json.loads(line) for line in archive_file]
+        self.assertEqual(sorted(row['message'] for row in rows), [f"old {n}" for n in range(5)])
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ["pending"])
+
+    def test_prune_runs_cascades_and_signals(self):
+        scrap = [Material.objects.create(type="scrap", quantity=n + 1, status="Stored") for n in range(3)]
+        InventoryRecord.objects.create(material_id=scrap[0], location="Yard", last_checked="2025-06-01")
+        result = prune_rows(Material.objects.filter(type="scrap"), batch_size=2, pause=0)
+        self.assertEqual(result, {"deleted": 3, "batches": 2})
+        self.assertFalse(InventoryRecord.objects.exists())
+        # Positions are kept by the delete signals, so they match a full rebuild
+        self.assertFalse(InventoryPosition.objects.filter(material_type="scrap", material_count__gt=0).exists())
+
+    @patch('apps.retention.TaskResult', None)
+    def test_prune_task_results_needs_the_result_backend(self):
+        self.assertTrue(prune_task_results()["skipped"])
+
+    def test_incremental_vacuum_releases_free_pages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {**connection.settings_dict, 'NAME': os.path.join(directory, 'mms.db'), 'OPTIONS': {}}
+            # A plain sqlite3 file has no auto_vacuum until it is rebuilt once
+            plain = TunedDatabaseWrapper({**settings_dict, 'OPTIONS': {'pragmas': {'auto_vacuum': 'NONE'}}}, alias='default')
+            with patch('apps.retention.connections', {'default': plain}):
+                with plain.cursor() as cursor:
+                    cursor.execute("CREATE TABLE result (payload BLOB)")
+                    cursor.executemany("INSERT INTO result VALUES (%s)", [(b"x" * 4000,) for _ in range(200)])
+                    cursor.execute("DELETE FROM result")
+                result = incremental_vacuum()
+                self.assertTrue(result["skipped"])
+                self.assertGreater(result["free_pages"], 0)
+                enable_incremental_vacuum()
+            plain.close()
+
+            tuned = TunedDatabaseWrapper(settings_dict, alias='default')
+            with patch('apps.retention.connections', {'default': tuned}):
+                with tuned.cursor() as cursor:
+                    cursor.executemany("INSERT INTO result VALUES (%s)", [(b"x" * 4000,) for _ in range(200)])
+                    cursor.execute("DELETE FROM result")
+                first = incremental_vacuum(max_pages=50, step=20)
+                self.assertFalse(first["skipped"])
+                self.assertEqual(first["released_pages"], 50)
+                rest = incremental_vacuum(max_pages=10000)
+                self.assertEqual(rest["free_pages"], 0)
+                self.assertEqual(first["free_pages"], rest["released_pages"])
+            tuned.close()
+
+
+class KeyTestCase(TestCase):
+    def test_uuid7_is_time_ordered(self):
+        before = int(time.time() * 1000)
+        keys = [uuid7() for _ in range(5000)]
+        self.assertEqual({(key.version, key.variant) for key in keys}, {(7, uuid.RFC_4122)})
+        # Strictly increasing, also as the hex text SQLite stores
+        self.assertEqual(sorted(set(key.hex for key in keys)), [key.hex for key in keys])
+        self.assertLessEqual(before, keys[0].int >> 80)
+        self.assertLessEqual(keys[-1].int >> 80, int(time.time() * 1000) + 2)
+
+    def test_time_ordered_keys_are_opt_in(self):
+        self.assertEqual(Material.objects.create(type="steel", quantity=1).material_id.version, 4)
+        with override_settings(MMS_TIME_ORDERED_KEYS=True):
+            created = [Material.objects.create(type="steel", quantity=n).material_id for n in range(20)]
+        self.assertEqual({key.version for key in created}, {7})
+        self.assertEqual(list(Material.objects.filter(material_id__in=created).order_by('pk').values_list('pk', flat=True)), created)
+
+
+class ETLTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with (gzip.open if name.endswith('.gz') else open)(path, 'wt', newline='') as output_file:
+            output_file.write(text)
+        return path
+
+    def _feeds(self, materials, requirements=None):
+        feeds = {
+            'materials': {
+                'source': {'type': 'csv', 'path': materials},
+                'target': 'material',
+                'columns': {'Tag': 'external_id', 'Kind': 'type', 'Qty': 'quantity'},
+                'chunk_size': 2,
+                'every': 600,
+            },
+        }
+        if requirements:
+            feeds['requirements'] = {
+                'source': {'type': 'csv', 'path': requirements},
+                'target': 'requirement',
+                'columns': {'Line': 'external_id', 'Tag': 'material_ref', 'Qty': 'quantity', 'Need By': 'delivery_date'},
+            }
+        return override_settings(MMS_ETL_FEEDS=feeds)
+
+    def _position(self, material_type, status):
+        return InventoryPosition.objects.filter(material_type=material_type, status=status).values_list('quantity', 'material_count').first()
+
+    def test_csv_feeds_upsert_idempotently(self):
+        materials = self._write('materials.csv.gz', "Tag,Kind,Qty,Ignored\nM1,steel,10,x\nM2, steel ,20,x\nM3,pipe,5,x\nM4,steel,lots,x\n")
+        requirements = self._write('requirements.csv', "Line,Tag,Qty,Need By\nR1,M1,4,2025-07-01\nR2,M2,6,2025-07-02\nR3,M9,1,2025-07-03\n")
+        with self._feeds(materials, requirements):
+            result = run_feed('materials', FEED_NOTIFY_TASKS)
+            self.assertEqual((result['rows_read'], result['created'], result['rejected']), (4, 3, 1))
+            run = FeedRun.objects.get(run_id=result['run_id'])
+            self.assertEqual(run.status, FeedRunStatus.SUCCEEDED)
+            self.assertEqual(run.errors, [{"line": 5, "errors": {"quantity": ["A valid integer is required."]}}])
+            self.assertIsNotNone(run.rows_per_second)
+            self.assertEqual(Material.objects.get(pk=feed_key('material', 'M2')).type, "steel")
+            self.assertEqual(self._position("steel", "Received"), (30, 2))
+            self.assertTrue(Escalation.objects.filter(entity_id=feed_key('material', 'M1')).exists())
+            self.assertEqual(TaskOutbox.objects.get().args, ["Feed materials: 3 created, 0 updated, 1 rejected."])
+
+            result = run_feed('requirements')
+            self.assertEqual((result['created'], result['rejected']), (2, 1))
+            self.assertEqual(Requirement.objects.get(pk=feed_key('requirement', 'R1')).material_id_id, feed_key('material', 'M1'))
+
+            # Re-running unchanged files writes nothing
+            self.assertEqual(run_feed('materials', FEED_NOTIFY_TASKS)['unchanged'], 3)
+            self.assertEqual(run_feed('requirements')['unchanged'], 2)
+            self.assertEqual((Material.objects.count(), Requirement.objects.count(), TaskOutbox.objects.count()), (3, 2, 1))
+
+            # Upstream changes update the row but leave MMS's own workflow status alone
+            material = Material.objects.get(pk=feed_key('material', 'M1'))
+            material.status = "Inspected"
+            material.save()
+            self._write('materials.csv.gz', "Tag,Kind,Qty\nM1,steel,12\nM2,steel,20\nM3,pipe,5\n")
+            result = run_feed('materials')
+            self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 1, 2))
+            material.refresh_from_db()
+            self.assertEqual((material.status, material.quantity), ("Inspected", 12))
+            self.assertEqual(self._position("steel", "Inspected"), (12, 1))
+            self.assertEqual(self._position("steel", "Received"), (20, 1))
+
+    def test_rerun_keeps_stock_issued_in_mms(self):
+        materials = self._write('materials.csv', "Tag,Kind,Qty\nM1,steel,100\n")
+        with self._feeds(materials):
+            run_feed('materials')
+            material_id = feed_key('material', 'M1')
+            issue_material(material_id, 30)
+            # The unchanged file is skipped; it does not put the issued stock back
+            self.assertEqual(run_feed('materials')['unchanged'], 1)
+            material = Material.objects.get(pk=material_id)
+            self.assertEqual((material.status, material.quantity), ("Issued", 70))
+
+            # Upstream changes still apply, except the quantity MMS now owns
+            self._write('materials.csv', "Tag,Kind,Qty\nM1,pipe,120\n")
+            self.assertEqual(run_feed('materials')['updated'], 1)
+            material.refresh_from_db()
+            self.assertEqual((material.type, material.quantity), ("pipe", 70))
+            self.assertEqual(self._position("pipe", "Issued"), (70, 1))
+            self.assertEqual(self._position("steel", "Issued"), (0, 0))
+
+    def test_type_change_through_feed_refreshes_demand(self):
+        materials = self._write('materials.csv', "Tag,Kind,Qty\nM1,steel,10\n")
+        requirements = self._write('requirements.csv', "Line,Tag,Qty,Need By\nR1,M1,4,2025-07-01\n")
+        window = (datetime.date(2025, 7, 1), datetime.date(2025, 7, 31))
+
+        def report_types():
+            report = DemandReport.objects.create(start_date=window[0], end_date=window[1])
+            build_demand_report(report.report_id)
+            return list(report.rows.values_list('material_type', 'requirement_quantity'))
+
+        with self._feeds(materials, requirements):
+            run_feed('materials')
+            run_feed('requirements')
+            self.assertEqual(report_types(), [("steel", 4)])
+            # bulk_create sends no pre_save, so the feed itself must drop the cached buckets
+            self._write('materials.csv', "Tag,Kind,Qty\nM1,pipe,10\n")
+            run_feed('materials')
+            self.assertEqual(report_types(), [("pipe", 4)])
+
+    def test_http_source(self):
+        self._write('materials.ndjson', '{"tag": "M1", "type": "steel", "quantity": 3}\nnot json\n\n{"tag": "M2", "type": "pipe", "quantity": 1}\n')
+        with mock_http_feed(self.directory) as base_url:
+            feeds = {'materials': {
+                'source': {'type': 'http', 'url': base_url + 'materials.ndjson'},
+                'target': 'material',
+                'columns': {'tag': 'external_id', 'type': 'type', 'quantity': 'quantity'},
+            }}
+            with override_settings(MMS_ETL_FEEDS=feeds):
+                result = run_feed('materials')
+        self.assertEqual((result['created'], result['rejected']), (2, 1))
+        self.assertEqual(FeedRun.objects.get().errors[0]['line'], 2)
+
+    @skipIf(openpyxl is None, "openpyxl is not installed")
+    def test_excel_source(self):
+        Material.objects.bulk_create([Material(material_id=feed_key('material', tag), type="steel", quantity=1) for tag in ("M1", "M2")])
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["Line", "Tag", "Qty", "Fab Date"])
+        workbook.active.append(["I1", "M1", 2, datetime.datetime(2025, 8, 1)])
+        workbook.active.append([None, None, None, None])
+        workbook.active.append(["I2", "M2", 1, datetime.datetime(2025, 8, 2)])
+        path = os.path.join(self.directory, 'installation.xlsx')
+        workbook.save(path)
+        feeds = {'installation': {
+            'source': {'type': 'excel', 'path': path},
+            'target': 'installation_requirement',
+            'columns': {'Line': 'external_id', 'Tag': 'material_ref', 'Qty': 'quantity', 'Fab Date': 'fab_date'},
+        }}
+        with override_settings(MMS_ETL_FEEDS=feeds):
+            self.assertEqual(run_feed('installation')['created'], 2)
+        self.assertEqual(
+            InstallationRequirement.objects.get(pk=feed_key('installation_requirement', 'I2')).fab_date,
+            datetime.date(2025, 8, 2),
+        )
+
+    def test_changed_rows_cost_the_same_queries_at_any_count(self):
+        queries = []
+        for count in (2, 8):
+            Material.objects.all().delete()
+            FeedRowState.objects.all().delete()
+            rows = [{"external_id": n, "type": "steel", "quantity": 1} for n in range(count)]
+            feeds = {'materials': {'source': {'type': 'generated'}, 'target': 'material', 'chunk_size': 100}}
+            with override_settings(MMS_ETL_FEEDS=feeds):
+                with patch('apps.etl.build_source', return_value=iter(enumerate(rows, 1))):
+                    run_feed('materials')
+                changed = [{**row, "quantity": 2} for row in rows]
+                with patch('apps.etl.build_source', return_value=iter(enumerate(changed, 1))), \
+                        CaptureQueriesContext(connection) as captured:
+                    self.assertEqual(run_feed('materials')['updated'], count)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_rows_are_written_while_the_source_is_read(self):
+        stored = []
+        def source():
+            for n in range(50):
+                stored.append(Material.objects.count())
+                yield n + 1, {"external_id": n, "type": "steel", "quantity": 1}
+        feeds = {'materials': {'source': {'type': 'generated'}, 'target': 'material', 'chunk_size': 10}}
+        with override_settings(MMS_ETL_FEEDS=feeds), patch('apps.etl.build_source', return_value=source()):
+            result = run_feed('materials')
+        # Each chunk is stored before the next one is read, so memory holds one chunk
+        self.assertEqual(stored, [n // 10 * 10 for n in range(50)])
+        self.assertEqual(result['created'], 50)
+        self.assertGreater(result['peak_memory_bytes'], 0)
+
+    def test_failed_and_overlapping_runs(self):
+        with override_settings(MMS_ETL_FEEDS={'missing': {'source': {'type': 'csv', 'path': '/nonexistent.csv'}, 'target': 'material'}}):
+            with self.assertRaises(FileNotFoundError):
+                run_feed('missing')
+            self.assertEqual(FeedRun.objects.get().status, FeedRunStatus.FAILED)
+            cache.add('mms:etl:missing:lock', 1)
+            try:
+                self.assertTrue(run_feed('missing')['skipped'])
+            finally:
+                cache.delete('mms:etl:missing:lock')
+            with self.assertRaises(ImproperlyConfigured):
+                run_feed('unknown')
+
+    @patch('apps.views.run_feed_task.apply_async')
+    def test_schedule_and_endpoints(self, mock_run):
+        materials = self._write('materials.csv', "Tag,Kind,Qty\nM1,steel,10\n")
+        with self._feeds(materials):
+            self.assertEqual(feed_schedule(settings.MMS_ETL_FEEDS), {
+                'feed-materials': {'task': 'apps.tasks.run_feed_task', 'schedule': 600.0, 'args': ('materials',)},
+            })
+            self.assertEqual(self.client.post('/api/feed-runs/trigger/', {"feed": "other"}, format='json').status_code, 400)
+            response = self.client.post('/api/feed-runs/trigger/', {"feed": "materials"}, format='json')
+            self.assertEqual(response.status_code, 202)
+            relay_outbox()
+            mock_run.assert_called_once_with(args=["materials"], kwargs={}, task_id=ANY)
+            run_feed('materials')
+        response = self.client.get('/api/feed-runs/', {'feed': 'materials'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(run['status'], run['created']) for run in response.data['results']], [("Succeeded", 1)])
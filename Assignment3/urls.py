@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .instrumentation import metrics_view
 from .views import (
     MaterialViewSet, RequirementViewSet, InstallationRequirementViewSet,
     WidgetViewSet, ShipmentViewSet, InspectionViewSet,
     MaintenanceRecordViewSet, InventoryRecordViewSet,
-    CustomerOrderViewSet, NotificationViewSet
+    CustomerOrderViewSet, NotificationViewSet, StatusTransitionViewSet, FeedRunViewSet
 )
 
 router = DefaultRouter()
@@ -17,8 +18,11 @@ router.register(r'inspections', InspectionViewSet)
 router.register(r'maintenance', MaintenanceRecordViewSet)
 router.register(r'inventory', InventoryRecordViewSet)
 router.register(r'orders', CustomerOrderViewSet)
+router.register(r'transitions', StatusTransitionViewSet)
+router.register(r'feed-runs', FeedRunViewSet)
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
 urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,23 +1,73 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import (
     Material, Requirement, InstallationRequirement, Widget, Shipment,
-    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder
+    Inspection, MaintenanceRecord, InventoryRecord, CustomerOrder,
+    DemandReport, ReportBucket, StatusTransition, TransitionEntity, EscalationKind, FeedRun
 )
 from .serializers import (
     MaterialSerializer, RequirementSerializer, InstallationRequirementSerializer,
     WidgetSerializer, ShipmentSerializer, InspectionSerializer,
-    MaintenanceRecordSerializer, InventoryRecordSerializer, CustomerOrderSerializer
+    MaintenanceRecordSerializer, InventoryRecordSerializer, CustomerOrderSerializer,
+    BulkMaterialSerializer, BulkRequirementSerializer, BulkInstallationRequirementSerializer,
+    StatusTransitionSerializer, FeedRunSerializer
 )
-from .tasks import notify_procurement_task, notify_engineer_task, notify_fabrication_task, notify_warehouse_task, notify_shipping_task, generate_demand_report_task, send_notification_task
+from .escalations import schedule_created
+from .etl import get_feeds
+from .filters import QueryParamFilterBackend
+from .history import dwell_stats, record_created
+from .inventory import (
+    InsufficientQuantity, apply_position_deltas, inventory_positions,
+    issue_material, issue_materials, parse_quantity
+)
+from .mixins import BulkCreateMixin, ExpandMixin, ExportMixin
+from .notifications import notification_stats
+from .outbox import enqueue_task
+from .pagination import KeysetPagination
+from .progress import order_progress
+from .reports import invalidate_demand_days, stream_demand_report
+from .tasks import notify_procurement_task, notify_engineer_task, notify_fabrication_task, notify_warehouse_task, notify_shipping_task, generate_demand_report_task, send_notification_task, run_feed_task
+from .write_queue import run_write
+import datetime
 import uuid
 
-class MaterialViewSet(viewsets.ModelViewSet):
+# Entity names accepted by the transition endpoints
+ENTITY_TYPES = {entity.label: entity.value for entity in TransitionEntity}
+
+class MaterialViewSet(BulkCreateMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'status': 'status',
+        'type': 'type',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
+    bulk_serializer_class = BulkMaterialSerializer
+
+    def perform_bulk_create(self, instances):
+        # bulk_create skips the post_save signal that maintains inventory positions
+        deltas = defaultdict(lambda: [0, 0])
+        for instance in instances:
+            deltas[(instance.type, instance.status, "")][0] += instance.quantity
+            deltas[(instance.type, instance.status, "")][1] += 1
+        apply_position_deltas(deltas)
+        record_created(TransitionEntity.MATERIAL, instances, 'material_id')
+        schedule_created(EscalationKind.MATERIAL_INSPECTION, instances, 'material_id')
+        enqueue_task(notify_warehouse_task, f"Inspection tasks assigned for {len(instances)} material arrivals.")
 
     @action(detail=False, methods=['post'])
+    @transaction.atomic
     def arrival(self, request):
         # Map material_type to type for serializer compatibility
         data = request.data.copy()  # Create a mutable copy of the request data
@@ -27,57 +77,129 @@ class MaterialViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             serializer.save(status="Received")
             # Trigger Celery task for inspection
-            notify_warehouse_task.delay("Inspection task assigned for material arrival.")
+            enqueue_task(notify_warehouse_task, "Inspection task assigned for material arrival.")
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['put'])
+    @transaction.atomic
     def store(self, request, pk=None):
         material = self.get_object()
         location = request.data.get('location')
         if location:
+            # A new inventory record per move: the latest one locates the stock and
+            # the earlier ones keep where it has been
+            InventoryRecord.objects.create(material_id=material, location=location, last_checked=timezone.localdate())
             material.status = "Stored"
-            material.save()
+            material.save(update_fields=['status'])
             serializer = self.get_serializer(material)
-            return Response(serializer.data)
+            return Response({**serializer.data, "location": location})
         return Response({"error": "Location required"}, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def _issue_one(material_id, quantity):
+        issue_material(material_id, quantity)
+        enqueue_task(notify_fabrication_task, f"Material {material_id} issued for fabrication.")
+
+    @staticmethod
+    def _issue_many(items):
+        material_ids = issue_materials(items)
+        enqueue_task(notify_fabrication_task, f"{len(material_ids)} materials issued for fabrication.")
+        return material_ids
+
     @action(detail=False, methods=['post'])
     def issue(self, request):
         material_id = request.data.get('material_id')
-        quantity = request.data.get('quantity')
+        quantity = parse_quantity(request.data.get('quantity'))
+        if quantity is None:
+            return Response({"error": "Quantity must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            material = Material.objects.get(material_id=material_id)
-            if material.quantity >= quantity:
-                material.status = "Issued"
-                material.quantity -= quantity
-                material.save()
-                serializer = self.get_serializer(material)
-                notify_fabrication_task.delay(f"Material {material_id} issued for fabrication.")
-                return Response(serializer.data)
+            # One unit of work, run on the serialized writer when MMS_SQLITE_WRITE_QUEUE is on
+            run_write(self._issue_one, material_id, quantity)
+        except InsufficientQuantity:
             return Response({"error": "Insufficient quantity"}, status=status.HTTP_400_BAD_REQUEST)
-        except Material.DoesNotExist:
+        except (Material.DoesNotExist, ValidationError):
             return Response({"error": "Material not found"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.get_serializer(Material.objects.get(material_id=material_id))
+        return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
+    def issue_batch(self, request):
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Items required"}, status=status.HTTP_400_BAD_REQUEST)
+        parsed = []
+        for index, item in enumerate(items):
+            quantity = parse_quantity(item.get('quantity')) if isinstance(item, dict) else None
+            if quantity is None or not item.get('material_id'):
+                return Response({"error": "Each item needs a material_id and a positive integer quantity", "index": index}, status=status.HTTP_400_BAD_REQUEST)
+            parsed.append((item['material_id'], quantity))
+        try:
+            material_ids = run_write(self._issue_many, parsed)
+        except InsufficientQuantity as exc:
+            return Response({"error": "Insufficient quantity", "material_id": str(exc.material_id)}, status=status.HTTP_400_BAD_REQUEST)
+        except (Material.DoesNotExist, ValidationError):
+            return Response({"error": "Material not found"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.get_serializer(Material.objects.filter(material_id__in=material_ids), many=True)
+        return Response({"issued": serializer.data})
+
+    @action(detail=False, methods=['post'])
+    @transaction.atomic
     def report(self, request):
         start_date = request.data.get('start_date')
         end_date = request.data.get('end_date')
+        bucket = request.data.get('bucket', ReportBucket.DAY)
         if start_date and end_date:
-            report_id = str(uuid.uuid4())
-            generate_demand_report_task.delay(report_id, start_date, end_date)
+            try:
+                start, end = parse_date(str(start_date)), parse_date(str(end_date))
+            except ValueError:
+                start = end = None
+            if not start or not end or start > end:
+                return Response({"error": "Invalid date range"}, status=status.HTTP_400_BAD_REQUEST)
+            if bucket not in ReportBucket.values:
+                return Response({"error": "Bucket must be one of: " + ", ".join(ReportBucket.values)}, status=status.HTTP_400_BAD_REQUEST)
+            report = DemandReport.objects.create(start_date=start, end_date=end, bucket=bucket)
+            report_id = str(report.report_id)
+            enqueue_task(generate_demand_report_task, report_id, start_date, end_date)
             return Response({"report_id": report_id, "status": "Generating"})
         return Response({"error": "Start and end dates required"}, status=status.HTTP_400_BAD_REQUEST)
 
-class RequirementViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], url_path=r'report/(?P<report_id>[^/.]+)')
+    def report_status(self, request, report_id=None):
+        try:
+            report = DemandReport.objects.get(report_id=report_id)
+        except (DemandReport.DoesNotExist, ValueError, ValidationError):
+            return Response({"error": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
+        return StreamingHttpResponse(stream_demand_report(report), content_type='application/json')
+
+class RequirementViewSet(BulkCreateMixin, ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Requirement.objects.all()
     serializer_class = RequirementSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'status': 'status',
+        'material_id': 'material_id',
+        'delivery_after': 'delivery_date__gte',
+        'delivery_before': 'delivery_date__lte',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
+    bulk_serializer_class = BulkRequirementSerializer
+
+    def perform_bulk_create(self, instances):
+        # bulk_create skips the post_save signals that keep demand buckets and deadlines fresh
+        invalidate_demand_days({instance.delivery_date for instance in instances})
+        schedule_created(EscalationKind.FEEDBACK, instances, 'req_id')
+        enqueue_task(notify_procurement_task, f"{len(instances)} new requirements created.")
 
+    @transaction.atomic
     def perform_create(self, serializer):
         instance = serializer.save(status="Draft")
-        notify_procurement_task.delay(f"New requirement {instance.req_id} created.")
+        enqueue_task(notify_procurement_task, f"New requirement {instance.req_id} created.")
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def feedback(self, request, pk=None):
         requirement = self.get_object()
         availability = request.data.get('availability')
@@ -86,35 +208,64 @@ class RequirementViewSet(viewsets.ModelViewSet):
             requirement.status = "Feedback"
             requirement.save()
             serializer = self.get_serializer(requirement)
-            notify_engineer_task.delay(f"Feedback received for requirement {requirement.req_id}.")
+            enqueue_task(notify_engineer_task, f"Feedback received for requirement {requirement.req_id}.")
             return Response(serializer.data)
         return Response({"error": "Availability and lead_time required"}, status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         instance = serializer.save(status="Finalized")
-        notify_fabrication_task.delay(f"Requirement {instance.req_id} finalized.")
+        enqueue_task(notify_fabrication_task, f"Requirement {instance.req_id} finalized.")
 
-class InstallationRequirementViewSet(viewsets.ModelViewSet):
+class InstallationRequirementViewSet(BulkCreateMixin, ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = InstallationRequirement.objects.all()
     serializer_class = InstallationRequirementSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'material_id': 'material_id',
+        'fab_after': 'fab_date__gte',
+        'fab_before': 'fab_date__lte',
+    }
+    bulk_serializer_class = BulkInstallationRequirementSerializer
 
+    def perform_bulk_create(self, instances):
+        invalidate_demand_days({instance.fab_date for instance in instances})
+        enqueue_task(notify_warehouse_task, f"{len(instances)} installation requirements created for fabrication.")
+
+    @transaction.atomic
     def perform_create(self, serializer):
         instance = serializer.save()
-        notify_warehouse_task.delay(f"Installation requirement {instance.inst_req_id} created for fabrication.")
+        enqueue_task(notify_warehouse_task, f"Installation requirement {instance.inst_req_id} created for fabrication.")
 
-class WidgetViewSet(viewsets.ModelViewSet):
+class WidgetViewSet(ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Widget.objects.all()
     serializer_class = WidgetSerializer
+    pagination_class = KeysetPagination
 
-class ShipmentViewSet(viewsets.ModelViewSet):
+class ShipmentViewSet(ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Shipment.objects.all()
     serializer_class = ShipmentSerializer
+    pagination_class = KeysetPagination
+    expandable_fields = {'material': 'material_id', 'widget': 'widget_id'}
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'status': 'status',
+        'material_id': 'material_id',
+        'widget_id': 'widget_id',
+        'customer_id': 'customer_id',
+        'tracking_id': 'tracking_id',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
 
+    @transaction.atomic
     def perform_create(self, serializer):
         instance = serializer.save(status="Shipped")
-        notify_shipping_task.delay(f"Shipment {instance.shipment_id} prepared.")
+        enqueue_task(notify_shipping_task, f"Shipment {instance.shipment_id} prepared.")
 
     @action(detail=False, methods=['post'])
+    @transaction.atomic
     def confirm(self, request):
         shipment_id = request.data.get('shipment_id')
         delivered = request.data.get('delivered')
@@ -124,54 +275,94 @@ class ShipmentViewSet(viewsets.ModelViewSet):
                 shipment.status = "Delivered"
                 shipment.save()
                 serializer = self.get_serializer(shipment)
-                notify_shipping_task.delay(f"Shipment {shipment_id} delivered.")
+                enqueue_task(notify_shipping_task, f"Shipment {shipment_id} delivered.")
                 return Response(serializer.data)
             return Response({"error": "Delivered status required"}, status=status.HTTP_400_BAD_REQUEST)
         except Shipment.DoesNotExist:
             return Response({"error": "Shipment not found"}, status=status.HTTP_404_NOT_FOUND)
 
-class InspectionViewSet(viewsets.ModelViewSet):
+class InspectionViewSet(ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Inspection.objects.all()
     serializer_class = InspectionSerializer
+    pagination_class = KeysetPagination
+    expandable_fields = {'material': 'material_id', 'widget': 'widget_id'}
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'result': 'result',
+        'material_id': 'material_id',
+        'widget_id': 'widget_id',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
 
+    @transaction.atomic
     def perform_create(self, serializer):
         instance = serializer.save()
+        # The related rows were already loaded while validating the payload
         if instance.material_id:
             material = instance.material_id
             material.status = "Stored" if instance.result == "Pass" else "Flagged"
-            material.save()
-            notify_warehouse_task.delay(f"Inspection {instance.inspection_id} completed for material.")
+            material.save(update_fields=['status'])
+            enqueue_task(notify_warehouse_task, f"Inspection {instance.inspection_id} completed for material.")
         elif instance.widget_id:
             widget = instance.widget_id
             widget.status = "Ready for Shipping" if instance.result == "Pass" else "Flagged"
-            widget.save()
-            notify_shipping_task.delay(f"Inspection {instance.inspection_id} completed for widget.")
+            widget.save(update_fields=['status'])
+            enqueue_task(notify_shipping_task, f"Inspection {instance.inspection_id} completed for widget.")
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def flag(self, request, pk=None):
         inspection = self.get_object()
         defects = request.data.get('defects')
         if defects:
             if inspection.material_id:
-                notify_procurement_task.delay(f"Material flagged with defects: {defects}")
+                enqueue_task(notify_procurement_task, f"Material flagged with defects: {defects}")
             elif inspection.widget_id:
-                notify_fabrication_task.delay(f"Widget flagged with defects: {defects}")
+                enqueue_task(notify_fabrication_task, f"Widget flagged with defects: {defects}")
             return Response({"status": "Notified"})
         return Response({"error": "Defects required"}, status=status.HTTP_400_BAD_REQUEST)
 
-class MaintenanceRecordViewSet(viewsets.ModelViewSet):
+class MaintenanceRecordViewSet(ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = MaintenanceRecord.objects.all()
     serializer_class = MaintenanceRecordSerializer
+    pagination_class = KeysetPagination
 
-class InventoryRecordViewSet(viewsets.ModelViewSet):
+class InventoryRecordViewSet(ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = InventoryRecord.objects.all()
     serializer_class = InventoryRecordSerializer
+    pagination_class = KeysetPagination
+
+    @action(detail=False, methods=['get'])
+    def positions(self, request):
+        # Served from the maintained InventoryPosition table through an in-process cache
+        positions = inventory_positions(
+            material_type=request.query_params.get('type'),
+            status=request.query_params.get('status'),
+            location=request.query_params.get('location'),
+        )
+        return Response({
+            "positions": positions,
+            "total_quantity": sum(position['quantity'] for position in positions),
+        })
 
-class CustomerOrderViewSet(viewsets.ModelViewSet):
+class CustomerOrderViewSet(ExpandMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = CustomerOrder.objects.all()
     serializer_class = CustomerOrderSerializer
+    pagination_class = KeysetPagination
+    expandable_fields = {'material': 'material_id', 'widget': 'widget_id'}
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'status': 'status',
+        'customer_id': 'customer_id',
+        'material_id': 'material_id',
+        'widget_id': 'widget_id',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
 
     @action(detail=False, methods=['post'])
+    @transaction.atomic
     def confirm(self, request):
         order_id = request.data.get('order_id')
         received = request.data.get('received')
@@ -189,16 +380,126 @@ class CustomerOrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def progress(self, request, pk=None):
         order = self.get_object()
-        progress = 75 if order.status == "Shipped" else 100 if order.status == "Received" else 50
-        return Response({"order_id": str(order.order_id), "progress_percentage": progress, "status": order.status})
+        progress = order_progress([order.pk])[order.pk]
+        return Response({
+            "order_id": str(order.order_id),
+            "progress_percentage": progress['percentage'],
+            "stage": progress['stage'],
+            "status": progress['status'],
+        })
+
+    @action(detail=False, methods=['get'], url_path='progress', url_name='progress-bulk')
+    def progress_bulk(self, request):
+        # Many orders in one query: ?ids=<uuid>,<uuid>,... (or repeated ids=)
+        raw_ids = [value.strip() for param in request.query_params.getlist('ids') for value in param.split(',')]
+        raw_ids = [value for value in raw_ids if value]
+        if not raw_ids:
+            return Response({"error": "ids required"}, status=status.HTTP_400_BAD_REQUEST)
+        max_ids = getattr(settings, 'MMS_ORDER_PROGRESS_MAX_IDS', 1000)
+        if len(raw_ids) > max_ids:
+            return Response({"error": f"At most {max_ids} ids per request"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order_ids = list(dict.fromkeys(uuid.UUID(value) for value in raw_ids))
+        except ValueError:
+            return Response({"error": "Invalid order id"}, status=status.HTTP_400_BAD_REQUEST)
+        progress = order_progress(order_ids)
+        return Response({
+            "orders": [
+                {
+                    "order_id": str(order_id),
+                    "progress_percentage": progress[order_id]['percentage'],
+                    "stage": progress[order_id]['stage'],
+                    "status": progress[order_id]['status'],
+                }
+                for order_id in order_ids if order_id in progress
+            ],
+            "not_found": [str(order_id) for order_id in order_ids if order_id not in progress],
+        })
+
+class StatusTransitionViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
+    # Append-only status history; entries are written by signals and the issue path
+    queryset = StatusTransition.objects.all()
+    serializer_class = StatusTransitionSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'entity_id': 'entity_id',
+        'from_status': 'from_status',
+        'to_status': 'to_status',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        entity = self.request.query_params.get('entity')
+        if entity:
+            entity_type = ENTITY_TYPES.get(entity)
+            # An unknown entity name matches nothing rather than everything
+            queryset = queryset.filter(entity_type=entity_type) if entity_type else queryset.none()
+        return queryset
+
+    def get_export_fields(self):
+        # Exports stay on raw columns; entity_type is the compact integer code
+        return ['id', 'entity_type', 'entity_id', 'from_status', 'to_status', 'dwell_seconds', 'created_at']
+
+    @action(detail=False, methods=['get'])
+    def dwell(self, request):
+        # ?entity=material&start=2025-06-01&end=2025-06-30[&from_status=Received&to_status=Stored]
+        entity_type = ENTITY_TYPES.get(request.query_params.get('entity'))
+        if not entity_type:
+            return Response({"error": f"entity must be one of {', '.join(ENTITY_TYPES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = parse_date(request.query_params['end']) if request.query_params.get('end') else timezone.localdate()
+            start = parse_date(request.query_params['start']) if request.query_params.get('start') else end - datetime.timedelta(days=30)
+        except ValueError:
+            start = end = None
+        if not start or not end or start > end:
+            return Response({"error": "Invalid date range"}, status=status.HTTP_400_BAD_REQUEST)
+        window_start = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+        window_end = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min))
+        statuses = dwell_stats(
+            entity_type, window_start, window_end,
+            from_status=request.query_params.get('from_status'),
+            to_status=request.query_params.get('to_status'),
+        )
+        return Response({"entity": request.query_params['entity'], "start": start, "end": end, "statuses": statuses})
+
+class FeedRunViewSet(viewsets.ReadOnlyModelViewSet):
+    # Run history of the upstream feeds configured in MMS_ETL_FEEDS
+    queryset = FeedRun.objects.all()
+    serializer_class = FeedRunSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_fields = {
+        'feed': 'feed',
+        'status': 'status',
+        'created_after': 'created_at__from_day',
+        'created_before': 'created_at__through_day',
+    }
+
+    @action(detail=False, methods=['post'])
+    @transaction.atomic
+    def trigger(self, request):
+        # Runs a feed now instead of waiting for its beat entry, e.g. after a manual upload
+        feed = request.data.get('feed')
+        if feed not in get_feeds():
+            return Response({"error": "Unknown feed"}, status=status.HTTP_400_BAD_REQUEST)
+        enqueue_task(run_feed_task, feed)
+        return Response({"feed": feed, "status": "Queued"}, status=status.HTTP_202_ACCEPTED)
 
 class NotificationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'])
+    @transaction.atomic
     def notify(self, request):
         recipient_id = request.data.get('recipient_id')
         message = request.data.get('message')
         if recipient_id and message:
             notification_id = str(uuid.uuid4())
-            send_notification_task.delay(recipient_id, message)
+            enqueue_task(send_notification_task, recipient_id, message)
             return Response({"notification_id": notification_id, "status": "Sent"})
-        return Response({"error": "Recipient ID and message required"}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({"error": "Recipient ID and message required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        return Response(notification_stats())
\ No newline at end of file
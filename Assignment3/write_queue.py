@@ -0,0 +1,122 @@
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import connections, transaction
+
+# SQLite has one writer at a time. Rather than have every worker thread take the
+# lock in turn (and sleep in busy_timeout when it loses), writes submitted here
+# run on one thread per process. Whatever is queued while a batch commits goes
+# into the next batch: one transaction and one WAL sync for many writes, each in
+# its own savepoint so a failing write rolls back alone. Enable with
+# MMS_SQLITE_WRITE_QUEUE = True; otherwise run_write is a plain atomic block.
+
+DEFAULT_MAX_BATCH = 64
+
+class WriteQueue:
+    def __init__(self, using='default', max_batch=DEFAULT_MAX_BATCH):
+        self.using = using
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self.batches = 0
+        self.writes = 0
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._closed = False
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        # Starts the writer, or a new one if the last died, so queued calls never wait forever
+        with self._thread_lock:
+            if not self._closed and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name=f'mms-writer-{self.using}', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        # Runs fn(*args, **kwargs) on the writer and returns its result or raises its error.
+        # Inside an open transaction the caller may already hold the write lock, so
+        # handing off would deadlock; such calls (and the writer's own) run inline.
+        if threading.current_thread() is self._thread or connections[self.using].in_atomic_block:
+            with transaction.atomic(using=self.using):
+                return fn(*args, **kwargs)
+        future = Future()
+        self._queue.put((contextvars.copy_context(), fn, args, kwargs, future))
+        self._ensure_thread()
+        return future.result()
+
+    def close(self):
+        with self._thread_lock:
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _take_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        try:
+            while (batch := self._take_batch()) is not None:
+                self._commit(batch)
+        finally:
+            connections.close_all()
+
+    def _commit(self, batch):
+        done = []
+        try:
+            with transaction.atomic(using=self.using):
+                for context, fn, args, kwargs, future in batch:
+                    try:
+                        with transaction.atomic(using=self.using):
+                            done.append((future, context.run(fn, *args, **kwargs), None))
+                    except Exception as exc:
+                        done.append((future, None, exc))
+        except BaseException as exc:
+            # The commit failed, or a write raised past its savepoint (SystemExit,
+            # KeyboardInterrupt): nothing in the batch was written. Failing the
+            # futures here keeps callers from waiting on a batch that never ends,
+            # and the writer goes on with the next batch.
+            for _, _, _, _, future in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        # Callers hear back once their batch has committed; with synchronous=NORMAL
+        # the last commits can still be lost to a power failure, as for any write
+        for future, result, error in done:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_write_queue(using='default'):
+    # One queue per database and process; a forked worker starts its own thread
+    key = (using, os.getpid())
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = WriteQueue(using, getattr(settings, 'MMS_SQLITE_WRITE_BATCH', DEFAULT_MAX_BATCH))
+        return _queues[key]
+
+def run_write(fn, *args, **kwargs):
+    # Entry point for views: fn holds one unit of work (reads, checks and writes)
+    if getattr(settings, 'MMS_SQLITE_WRITE_QUEUE', False):
+        return get_write_queue().submit(fn, *args, **kwargs)
+    with transaction.atomic():
+        return fn(*args, **kwargs)